@@ -0,0 +1,143 @@
+"""
+Adaptive Frame Sampler
+Decides which frames are worth running recognition on, instead of a fixed
+"every Nth frame" stride:
+- Cheap motion score: mean absolute difference of tiny (64px wide) blurred
+  grayscale frames, against the previous frame and the last recognized frame
+- Motion, scene changes and newly appeared faces raise the rate (up to
+  1 / min_interval); a static scene drops to one heartbeat every idle_interval
+- A token bucket caps the compute spent: 'budget' embeddings per second,
+  charged by the number of faces each recognition pass embeds
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class AdaptiveSampler:
+    """
+    Motion-driven recognition scheduler with an embeddings-per-second budget
+    """
+
+    def __init__(self, budget=5.0, min_interval=0.1, idle_interval=5.0, motion_threshold=4.0,
+                 scene_threshold=12.0, hot_seconds=2.0, width=64):
+        """
+        Args:
+            budget: Embeddings per second the recognizer may spend (token refill rate)
+            min_interval: Shortest gap between recognized frames (seconds)
+            idle_interval: Heartbeat gap when the scene is static (seconds)
+            motion_threshold: Mean abs diff (0-255) vs the previous frame that counts as motion
+            scene_threshold: Mean abs diff vs the last recognized frame that counts as a new scene
+            hot_seconds: How long motion / new faces keep the rate high
+            width: Width of the downscaled frame used for differencing
+        """
+        self.budget = float(budget)
+        self.min_interval = min_interval
+        self.idle_interval = idle_interval
+        self.motion_threshold = motion_threshold
+        self.scene_threshold = scene_threshold
+        self.hot_seconds = hot_seconds
+        self.width = width
+
+        self._lock = threading.Lock()
+        self._tokens = self.budget       # start with one second worth of budget
+        self._last_time = None
+        self._last_processed = None      # time of the last recognized frame
+        self._hot_until = 0.0
+        self._prev_small = None
+        self._ref_small = None           # small frame at the last recognition
+        self._expected_faces = 1.0       # running estimate of embeddings per pass
+        self._last_faces = 0
+
+        self.frames = 0
+        self.processed = 0
+        self.motion_triggers = 0
+        self.budget_skips = 0
+        self.last_motion = 0.0
+
+    def _small(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height = max(1, int(gray.shape[0] * self.width / gray.shape[1]))
+        small = cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    @staticmethod
+    def _diff(a, b):
+        if a is None or b is None:
+            return 0.0   # nothing to compare against yet
+        if a.shape != b.shape:
+            return 255.0
+        return float(np.mean(cv2.absdiff(a, b)))
+
+    def should_process(self, frame, now=None):
+        """
+        Decide whether to run recognition on this frame
+
+        Args:
+            frame: BGR (or grayscale) frame
+            now: Timestamp in seconds (video time for files; default time.monotonic())
+
+        Returns:
+            True if the frame should be recognized (its cost is charged right away)
+        """
+        now = time.monotonic() if now is None else now
+        small = self._small(frame)
+        with self._lock:
+            self.frames += 1
+            if self._last_time is not None:
+                elapsed = max(0.0, now - self._last_time)
+                self._tokens = min(self.budget, self._tokens + elapsed * self.budget)
+            self._last_time = now
+
+            motion = self._diff(small, self._prev_small)
+            scene = self._diff(small, self._ref_small)
+            self._prev_small = small
+            self.last_motion = motion
+            if motion >= self.motion_threshold or scene >= self.scene_threshold:
+                if now >= self._hot_until:
+                    self.motion_triggers += 1
+                self._hot_until = now + self.hot_seconds
+
+            since = float('inf') if self._last_processed is None else now - self._last_processed
+            wanted = since >= (self.min_interval if now < self._hot_until else self.idle_interval)
+            if not wanted:
+                return False
+
+            cost = max(1.0, self._expected_faces)
+            if self._tokens < cost and self._last_processed is not None:
+                self.budget_skips += 1
+                return False
+            self._tokens -= cost
+            self._last_processed = now
+            self._ref_small = small
+            self.processed += 1
+            return True
+
+    def record(self, faces, now=None):
+        """
+        Report how many faces the recognition pass embedded
+
+        Corrects the charged cost (a pass costs at least one embedding, for
+        detection) and keeps the rate high when new faces appear
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._tokens -= max(1.0, faces) - max(1.0, self._expected_faces)
+            self._expected_faces = 0.7 * self._expected_faces + 0.3 * faces
+            if faces > self._last_faces:
+                self._hot_until = now + self.hot_seconds
+            self._last_faces = faces
+
+    def stats(self):
+        """Counters for end-of-session reporting"""
+        with self._lock:
+            return {
+                'frames': self.frames,
+                'processed': self.processed,
+                'processed_pct': round(self.processed / self.frames * 100, 1) if self.frames else 0.0,
+                'motion_triggers': self.motion_triggers,
+                'budget_skips': self.budget_skips,
+                'expected_faces': round(self._expected_faces, 2),
+            }
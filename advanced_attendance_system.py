@@ -15,115 +15,24 @@ from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk
 import pandas as pd
 import time
-from deepface import DeepFace
+import threading
+from collections import deque
+from facenet_embedder import get_embedder
+from face_gallery import FaceGallery
+from ann_index import INDEX_FILENAME, insert_into_saved_index
+from threaded_capture import ThreadedCamera
+from recognition_pipeline import RecognitionWorker, FaceMatcher
+from face_tracker import FaceTracker
+from attendance_store import get_ledger
+from embedding_store import EmbeddingStore
+from face_alignment import FaceAligner, align_largest_face
+from face_quality import QualityGate, BestCropKeeper
+from face_detector import create_detector, default_budget_ms
+from calibrate_threshold import load_threshold
+from camera_probe import open_best_camera
 
-# ==================== Robust Camera Utilities (Windows-friendly) ====================
-def _fourcc_str(value: float) -> str:
-    try:
-        v = int(value)
-        return "".join([chr((v >> 8 * i) & 0xFF) for i in range(4)])
-    except Exception:
-        return ""  # unknown
+DAILY_HEADER = ['ID', 'Name', 'Department', 'Date', 'Time', 'Status']
 
-def try_open_camera(index: int,
-                    backend: int,
-                    codec: str | None,
-                    width: int,
-                    height: int,
-                    fps: int,
-                    warmup_frames: int) -> tuple[cv2.VideoCapture | None, dict | None]:
-    """Attempt to open a camera with specific backend/codec/resolution and ensure frames aren't black.
-    Returns (cap, meta) on success, (None, None) on failure.
-    meta contains backend_name, codec, width, height, fps, brightness.
-    """
-    backend_names = {
-        getattr(cv2, 'CAP_MSMF', -1): 'MSMF',
-        getattr(cv2, 'CAP_DSHOW', -1): 'DSHOW',
-        getattr(cv2, 'CAP_ANY', -1): 'ANY'
-    }
-
-    cap = cv2.VideoCapture(index, backend)
-    if not cap.isOpened():
-        return None, None
-
-    # Apply settings
-    try:
-        cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
-    except Exception:
-        pass
-
-    if codec:
-        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*codec))
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-    cap.set(cv2.CAP_PROP_FPS, fps)
-
-    # Warmup and measure brightness
-    ok = 0
-    brightness_sum = 0.0
-    for _ in range(max(10, warmup_frames)):
-        ret, fr = cap.read()
-        if not ret or fr is None or fr.size == 0:
-            continue
-        ok += 1
-        brightness_sum += float(fr.mean())
-
-    if ok == 0:
-        cap.release()
-        return None, None
-
-    avg_brightness = brightness_sum / ok
-    # Heuristic: treat as black if average brightness is near 0
-    if avg_brightness < 5.0:
-        cap.release()
-        return None, None
-
-    meta = {
-        'backend': backend_names.get(backend, str(backend)),
-        'codec': codec or 'DEFAULT',
-        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-        'fps': int(cap.get(cv2.CAP_PROP_FPS) or 0),
-        'brightness': avg_brightness,
-    }
-    return cap, meta
-
-def open_best_camera(status_cb=None) -> tuple[cv2.VideoCapture | None, dict | None]:
-    """Try several backend/codec/resolution combos and return the first non-black feed.
-    status_cb: optional callable(str) to report progress.
-    """
-    def say(msg: str):
-        if status_cb:
-            status_cb(msg)
-        else:
-            print(msg)
-
-    msmf = getattr(cv2, 'CAP_MSMF', 1400)
-    dshow = getattr(cv2, 'CAP_DSHOW', 700)
-    anyb = getattr(cv2, 'CAP_ANY', 0)
-
-    combos = [
-        # backend, codec, warmup_frames
-        (msmf, None, 60),         # MSMF default
-        (msmf, 'YUYV', 60),       # MSMF YUYV
-        (msmf, 'MJPG', 40),       # MSMF MJPEG
-        (dshow, 'MJPG', 30),      # DSHOW MJPEG (common fix on Windows)
-        (dshow, None, 30),        # DSHOW default
-        (anyb, None, 30),         # Any
-    ]
-    resolutions = [(1280, 720), (640, 480)]
-    fps_list = [30, 25]
-
-    for backend, codec, warmup in combos:
-        for (w, h) in resolutions:
-            for fps in fps_list:
-                say(f"Trying backend={backend} codec={codec or 'DEFAULT'} {w}x{h}@{fps}...")
-                cap, meta = try_open_camera(0, backend, codec, w, h, fps, warmup)
-                if cap is not None:
-                    say(f"✓ Selected: {meta}")
-                    return cap, meta
-    say("✗ No working camera combination found (all black/failed)")
-    return None, None
 
 class AdvancedFaceAttendanceSystem:
     def __init__(self, root):
@@ -135,11 +44,23 @@ class AdvancedFaceAttendanceSystem:
         # Initialize face recognition components
         self.recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Live detector (FACE_DETECTOR_BACKEND: haar/dnn/yunet, FACE_DETECTOR_BUDGET_MS); boxes come back in full-resolution coordinates
+        self.face_detector = create_detector(cascade=self.face_cascade, scale=0.5, budget_ms=default_budget_ms())
+        # Warp each face to the FaceNet 160x160 template (eye/nose/mouth landmarks) before embedding
+        self.face_aligner = FaceAligner()
+        self.align_faces = True
+        self._frame_landmarks = {}
+        # Blurred/dark/tiny faces are skipped before embedding; best crop kept per track
+        self.quality_gate = QualityGate()
+        self.best_crops = BestCropKeeper()
         
         # FaceNet settings
         self.use_facenet = True  # Use FaceNet for recognition
         self.facenet_model = "Facenet"  # High accuracy model
-        self.facenet_threshold = 10.0  # Distance threshold for recognition (higher = more lenient)
+        # Cosine similarity needed to mark attendance: calibrated for FACE_TARGET_FAR when
+        # calibrate_threshold.py has been run, else the recommended 85%
+        self.facenet_threshold = load_threshold(default=0.85)
+        self.embedder = get_embedder(self.facenet_model)  # In-memory embeddings (no temp files)
         
         # File paths
         self.model_file = "face_model.yml"
@@ -159,10 +80,16 @@ class AdvancedFaceAttendanceSystem:
         self.student_lookup_by_name = {}
         self.names = []
         self.facenet_encodings = {}  # Store FaceNet encodings {name: encoding}
+        self.gallery = FaceGallery()  # Normalized matrix of the encodings above
+        self.gallery_index = None  # ANN backend for very large galleries ("ivf"); None = exact scan
+        self.enroll_samples = 8    # Best preview frames embedded per enrolment (robust centroid + templates)
+        self.max_templates = 5     # Templates kept per student (None = all inliers)
         self.current_video = None
+        self.pipeline = None  # RecognitionWorker while recognition is running
         self.recognition_active = False
         self._last_unknown_saved_at = 0.0
-        self.last_recognition_results = {}  # Cache recognition results {face_id: (name, confidence)}
+        self.tracker = FaceTracker(refresh_interval=2.0)  # re-embed a tracked face every 2s
+        self.matcher = None  # FaceMatcher (per-track match cache) while recognition is running
         
         # Setup UI
         self.setup_ui()
@@ -300,7 +227,7 @@ class AdvancedFaceAttendanceSystem:
         Label(adjust_frame, text="Adjust Threshold:", bg='#34495E', fg='white', 
               font=("Arial", 10, "bold")).grid(row=0, column=0, sticky=W, pady=5)
         
-        self.threshold_var = StringVar(value="85")
+        self.threshold_var = StringVar(value=f"{self.facenet_threshold * 100:.0f}")
         threshold_entry = Entry(adjust_frame, textvariable=self.threshold_var, 
                                font=("Arial", 12, "bold"), width=8, justify=CENTER,
                                bg='white', fg='black', relief=RIDGE, bd=2)
@@ -436,8 +363,17 @@ class AdvancedFaceAttendanceSystem:
         self.status_label.config(text=f"Status: {message}", bg=color)
         self.root.update()
     
+    def call_ui(self, callback, *args, **kwargs):
+        """Run a Tk call now if on the main thread, else queue it for the render loop"""
+        if threading.current_thread() is threading.main_thread() or self.pipeline is None:
+            return callback(*args, **kwargs)
+        self.pipeline.post(callback, *args, **kwargs)
+    
     def update_info(self, message):
         """Update info display"""
+        if threading.current_thread() is not threading.main_thread() and self.pipeline is not None:
+            self.pipeline.post(self.update_info, message)
+            return
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.info_text.insert(END, f"[{timestamp}] {message}\n")
         self.info_text.see(END)
@@ -497,6 +433,11 @@ class AdvancedFaceAttendanceSystem:
         
         photo_captured = False
         frame_count = 0
+        # Best-quality frame of the last second: SPACE saves it instead of a blurred instant
+        best_frames = BestCropKeeper(max_age=1.0)
+        # Recent good frames (>= 0.2s apart); the best of them become the student's templates
+        samples = deque(maxlen=2 * self.enroll_samples)
+        last_sample_at = 0.0
         
         while True:
             ret, frame = cap.read()
@@ -521,9 +462,24 @@ class AdvancedFaceAttendanceSystem:
             # Keep the color frame for display
             display_frame = frame.copy()
             
-            # Detect faces (use grayscale only for detection, not display)
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+            # Detect faces with the live detector (its landmarks align the enrolment crops)
+            detections = self.face_detector.detect_faces(frame)
+            faces = [d.box for d in detections]
+            
+            if len(faces) > 0:
+                largest = max(detections, key=lambda d: d.box[2] * d.box[3])
+                quality = self.quality_gate.assess(frame, [largest.box],
+                                                   {largest.box: largest.landmarks})
+                if quality.passed[0]:
+                    best_frames.offer(0, quality.score[0], lambda: frame)
+                    if time.time() - last_sample_at >= 0.2:
+                        last_sample_at = time.time()
+                        # Aligned exactly like live probes (FaceMatcher)
+                        samples.append((float(quality.score[0]),
+                                        self.face_aligner.align(frame, largest.box, largest.landmarks)))
+                else:
+                    cv2.putText(display_frame, f"Hold still: {quality.reasons[0].replace('_', ' ')}", (10, 120),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 165, 255), 2)
             
             # Draw rectangles around faces on the COLOR frame
             for (x, y, w, h) in faces:
@@ -555,6 +511,11 @@ class AdvancedFaceAttendanceSystem:
                     # Save the COLOR photo with MAXIMUM QUALITY
                     photo_filename = f"{self.images_folder}/{student_id}_{student_name}.jpg"
                     
+                    # Sharpest well-exposed frame of the last second (current frame if none passed)
+                    best = best_frames.best(0)
+                    if best is not None:
+                        frame = best
+                    
                     # Save with 100% JPEG quality (no compression)
                     cv2.imwrite(photo_filename, frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
                     
@@ -569,17 +530,27 @@ class AdvancedFaceAttendanceSystem:
                     if self.use_facenet:
                         self.update_info("Generating FaceNet encoding...")
                         try:
-                            embedding = DeepFace.represent(
-                                img_path=photo_filename,
-                                model_name=self.facenet_model,
-                                enforce_detection=False
-                            )
+                            # Saved photo + the best recent preview frames -> robust centroid and templates,
+                            # all aligned to the FaceNet template and embedded like live probes
+                            best_samples = sorted(samples, key=lambda s: s[0], reverse=True)[:self.enroll_samples]
+                            crops = [align_largest_face(self.face_detector, self.face_aligner, frame)]
+                            crops += [crop for _, crop in best_samples]
+                            embeddings = self.embedder.embed_batch(crops)
+                            if all(e is None for e in embeddings):
+                                raise ValueError("no face could be embedded")
+                            # Packed store used at startup (pkl kept for older tools)
+                            enrolled = EmbeddingStore(self.images_folder, model_name=self.facenet_model).enroll(
+                                student_id, student_name, embeddings, max_templates=self.max_templates)
                             
                             # Save encoding
                             encoding_file = f"{self.images_folder}/{student_id}_{student_name}_encoding.pkl"
                             with open(encoding_file, 'wb') as f:
-                                pickle.dump(embedding[0]['embedding'], f)
-                            self.update_info("FaceNet encoding saved!")
+                                pickle.dump(enrolled.centroid.tolist(), f)
+                            # Keep a persisted ANN index (if any) in sync without a rebuild
+                            insert_into_saved_index(os.path.join(self.images_folder, INDEX_FILENAME),
+                                                    student_name, enrolled.centroid)
+                            self.update_info(f"FaceNet encoding saved! ({enrolled.inliers} samples, "
+                                             f"{enrolled.rejected} outliers dropped, {len(enrolled.templates)} templates)")
                         except Exception as e:
                             self.update_info(f"Warning: Could not generate FaceNet encoding: {str(e)}")
                     
@@ -704,45 +675,56 @@ class AdvancedFaceAttendanceSystem:
         
         self.names = names
         
+        # FaceNet gallery: photos of students not in the embedding store yet are embedded
+        # in a process pool, so a large intake scales with the CPU count
+        if self.use_facenet:
+            self.update_info("Embedding new student photos for FaceNet...")
+            try:
+                from bulk_enroll import enroll_folder
+                summary = enroll_folder(self.images_folder, self.images_folder, model_name=self.facenet_model,
+                                        max_templates=self.max_templates, skip_enrolled=True)
+                self.update_info(f"FaceNet: {summary['students']} new students from {summary['embedded']}/"
+                                 f"{summary['images']} photos in {summary['seconds']:.1f}s "
+                                 f"({summary['skipped']} photos already enrolled)")
+            except Exception as e:
+                self.update_info(f"Warning: FaceNet enrolment skipped: {str(e)}")
+        
         self.update_info(f"Training complete! {len(faces_data)} faces trained.")
         self.update_status("Training complete!", '#27AE60')
         messagebox.showinfo("Success", f"Model trained with {len(faces_data)} faces!")
     
     def load_facenet_encodings(self):
-        """Load all FaceNet encodings from pickle files"""
+        """Load all FaceNet encodings from the packed embedding store"""
         self.facenet_encodings = {}
         
         if not os.path.exists(self.images_folder):
             messagebox.showerror("Error", "Student images folder not found!")
             return False
-            
-        encoding_files = [f for f in os.listdir(self.images_folder) if f.endswith('_encoding.pkl')]
         
-        if len(encoding_files) == 0:
-            messagebox.showerror("Error", "No FaceNet encodings found! Please capture student photos first.")
+        # One memory-mapped matrix + manifest instead of one pickle per student
+        store = EmbeddingStore(self.images_folder, model_name=self.facenet_model)
+        try:
+            migrated = store.ensure()
+            if migrated:
+                self.update_info(f"Migrated {migrated} encoding files into {store.matrix_path}")
+            ids, names, matrix = store.load()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load embedding store: {e}")
             return False
         
-        self.update_info(f"Found {len(encoding_files)} encoding files")
-        
-        for encoding_file in encoding_files:
-            try:
-                # Extract student name from filename (format: ID_NAME_encoding.pkl)
-                base_name = encoding_file.replace('_encoding.pkl', '')
-                parts = base_name.split('_', 1)  # Split only on first underscore
-                
-                if len(parts) >= 2:
-                    student_name = parts[1]  # Second part is the name
-                else:
-                    student_name = parts[0]  # Fallback to first part
-                    
-                with open(f"{self.images_folder}/{encoding_file}", 'rb') as f:
-                    encoding = pickle.load(f)
-                    self.facenet_encodings[student_name] = encoding
-                    
-                self.update_info(f"✓ Loaded encoding for: {student_name}")
-            except Exception as e:
-                self.update_info(f"⚠ Could not load {encoding_file}: {str(e)}")
+        if len(names) == 0:
+            messagebox.showerror("Error", "No FaceNet encodings found! Please capture student photos first.")
+            return False
         
+        self.facenet_encodings = {name: matrix[i] for i, name in enumerate(names)}
+        self.gallery = FaceGallery.from_matrix(names, matrix, index=self.gallery_index)
+        _, template_names, templates = store.load_templates()
+        self.gallery.attach_templates(template_names, templates)
+        if self.gallery_index:
+            status = self.gallery.attach_index_file(os.path.join(self.images_folder, INDEX_FILENAME))
+            self.update_info(f"ANN index ({self.gallery_index}) {status}")
+        if template_names:
+            self.update_info(f"{len(template_names)} templates for near-threshold matches")
         self.update_info(f"Total encodings loaded: {len(self.facenet_encodings)}")
         self.update_info(f"Names: {list(self.facenet_encodings.keys())}")
         return len(self.facenet_encodings) > 0
@@ -774,34 +756,55 @@ class AdvancedFaceAttendanceSystem:
         self.update_info("Starting face recognition...")
 
         # Use the same robust camera selector for recognition stream
-        self.current_video, meta = open_best_camera(lambda s: self.update_info(s))
-        if self.current_video is None:
+        cap, meta = open_best_camera(lambda s: self.update_info(s))
+        if cap is None:
             messagebox.showerror("Error", "Camera opened but sent only black frames. Close other apps using camera and try again.")
             return
+        # Grab frames on a background thread; the loop below always gets the newest one
+        # and never waits for it (read_timeout=0), so the Tk thread is not blocked
+        self.current_video = ThreadedCamera(cap, read_timeout=0).start()
         print(f"Recognition camera selected: {meta}")
         self.update_info("Camera ready - recognizing faces...")
         
         self.recognition_active = True
         self.marked_today = set()
-        
+        self.tracker = FaceTracker(refresh_interval=self.tracker.refresh_interval)
+        self.best_crops.clear()
+        self.matcher = FaceMatcher(self.embedder, self.tracker,
+                                   aligner=self.face_aligner if self.align_faces else None,
+                                   quality_gate=self.quality_gate, best_crops=self.best_crops)
+        
+        # Detection/embedding/attendance run on the worker; the Tk loop only renders
+        self.pipeline = RecognitionWorker(self.process_frame).start()
         self.recognize_faces()
     
-    def recognize_faces(self):
-        """Recognize faces from video stream"""
-        if not self.recognition_active or self.current_video is None:
-            return
-        
-        ret, frame = self.current_video.read()
+    def process_frame(self, frame):
+        """
+        Recognition worker step: detect, embed, match and mark attendance.
+        Runs off the Tk thread; UI calls are posted back through the pipeline.
         
-        if not ret:
-            self.stop_recognition()
-            return
+        Returns:
+            List of {'box', 'name', 'confidence', 'color'} for the render step
+        """
+        results = []
         
         # Convert to grayscale for detection only
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        # Detect faces (downscaled detection, full-resolution boxes)
+        detections = self.face_detector.detect_faces(frame)
+        faces = [d.box for d in detections]
+        # Landmarks (YuNet) keyed by box for the alignment step
+        self._frame_landmarks = {d.box: d.landmarks for d in detections if d.landmarks is not None}
+        
+        # Embed and match (in one batch) only faces whose track is new or due for refresh
+        face_matches = {}
+        if self.use_facenet and len(faces) > 0:
+            try:
+                face_matches = self.matcher.match_tracked_faces(frame, faces, self.gallery, self.facenet_threshold,
+                                                                self._frame_landmarks)
+            except Exception as e:
+                self.update_info(f"⚠ Recognition error: {str(e)}")
         
         # Process each face
         for (x, y, w, h) in faces:
@@ -812,62 +815,19 @@ class AdvancedFaceAttendanceSystem:
             if self.use_facenet:
                 # FaceNet recognition
                 try:
-                    # Extract face region from color frame with padding for better recognition
-                    padding = 20
-                    y1 = max(0, y - padding)
-                    y2 = min(frame.shape[0], y + h + padding)
-                    x1 = max(0, x - padding)
-                    x2 = min(frame.shape[1], x + w + padding)
-                    
-                    face_img = frame[y1:y2, x1:x2]
-                    
-                    # Skip if face is too small
-                    if face_img.shape[0] < 50 or face_img.shape[1] < 50:
-                        name = "Face Too Small"
-                        confidence_display = 0.0
+                    # Faces too small, not embeddable or still waiting for a good frame have
+                    # no match yet: drawn as Unknown, no snapshot
+                    match = face_matches.get((int(x), int(y), int(w), int(h)))
+                    if match is None:
+                        results.append({'box': (int(x), int(y), int(w), int(h)), 'name': name,
+                                        'confidence': confidence_display, 'color': color})
                         continue
                     
-                    # Save temporarily for FaceNet processing
-                    temp_face_path = "temp_face.jpg"
-                    cv2.imwrite(temp_face_path, face_img)
-                    
-                    # Generate FaceNet embedding for detected face
-                    embedding = DeepFace.represent(
-                        img_path=temp_face_path,
-                        model_name=self.facenet_model,
-                        enforce_detection=False
-                    )
-                    
-                    detected_encoding = np.array(embedding[0]['embedding'])
-                    
-                    # Compare with all stored encodings
-                    min_distance = float('inf')
-                    recognized_name = "Unknown"
-                    best_similarity = -1
+                    recognized_name = match.name
+                    best_similarity = match.similarity
                     
-                    self.update_info(f"🔍 Comparing against {len(self.facenet_encodings)} students...")
-                    
-                    for student_name, stored_encoding in self.facenet_encodings.items():
-                        # Normalize encodings for better comparison
-                        stored_enc_array = np.array(stored_encoding)
-                        
-                        # Calculate both Euclidean distance and Cosine similarity
-                        euclidean_distance = np.linalg.norm(detected_encoding - stored_enc_array)
-                        
-                        # Cosine similarity (better for face recognition)
-                        cosine_similarity = np.dot(detected_encoding, stored_enc_array) / (
-                            np.linalg.norm(detected_encoding) * np.linalg.norm(stored_enc_array)
-                        )
-                        
-                        # Log comparisons above 30%
-                        if cosine_similarity > 0.30:
-                            self.update_info(f"   {student_name}: {cosine_similarity*100:.1f}%")
-                        
-                        # Use cosine similarity (higher is better)
-                        if cosine_similarity > best_similarity:
-                            best_similarity = cosine_similarity
-                            min_distance = euclidean_distance
-                            recognized_name = student_name
+                    self.update_info(f"🔍 Compared against {len(self.facenet_encodings)} students "
+                                     f"(runner-up: {match.runner_up} at {match.runner_up_similarity*100:.1f}%)")
                     
                     self.update_info(f"🎯 Best match: {recognized_name} at {best_similarity*100:.1f}%")
                     
@@ -884,7 +844,7 @@ class AdvancedFaceAttendanceSystem:
                         if name not in self.marked_today:
                             self.mark_attendance(name)
                             self.marked_today.add(name)
-                            messagebox.showinfo("✓ Attendance Marked",
+                            self.call_ui(messagebox.showinfo, "✓ Attendance Marked",
                                 f"Attendance marked for:\n\n{name}\n\nMatch: {confidence_display:.1f}%\n\n✓ HIGH ACCURACY (≥{self.facenet_threshold*100:.0f}%)")
                     else:
                         name = f"Unknown ({best_similarity*100:.1f}%)"
@@ -900,18 +860,17 @@ class AdvancedFaceAttendanceSystem:
                             self._last_unknown_saved_at = now_ts
                             try:
                                 ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                                unknown_img = frame[max(0, y-20):min(frame.shape[0], y+h+20),
-                                                    max(0, x-20):min(frame.shape[1], x+w+20)]
+                                # Sharpest crop seen for this track, else the current one
+                                unknown_img = self.matcher.best_crop((x, y, w, h))
+                                if unknown_img is None:
+                                    unknown_img = frame[max(0, y-20):min(frame.shape[0], y+h+20),
+                                                        max(0, x-20):min(frame.shape[1], x+w+20)]
                                 if unknown_img.size > 0:
                                     save_path = os.path.join(self.unknown_faces_folder, f"unknown_{ts}.jpg")
                                     cv2.imwrite(save_path, unknown_img, [cv2.IMWRITE_JPEG_QUALITY, 95])
                                     self.update_info(f"Saved unknown face: {save_path}")
                             except Exception as e:
                                 self.update_info(f"Could not save unknown face: {e}")
-                    
-                    # Clean up temp file
-                    if os.path.exists(temp_face_path):
-                        os.remove(temp_face_path)
                         
                 except Exception as e:
                     name = "Error"
@@ -957,12 +916,44 @@ class AdvancedFaceAttendanceSystem:
                     name = "Error"
                     confidence_display = 0.0
             
+            results.append({'box': (int(x), int(y), int(w), int(h)), 'name': name,
+                            'confidence': confidence_display, 'color': color})
+        
+        return results
+    
+    def recognize_faces(self):
+        """Render loop: show the newest frame with the latest recognition results"""
+        if not self.recognition_active or self.current_video is None:
+            return
+        
+        ret, frame = self.current_video.read()
+        
+        if not ret:
+            if not self.current_video.isOpened():
+                self.stop_recognition()
+                return
+            # No new frame yet: keep the last one on screen and check again shortly
+            self.pipeline.drain_events()
+            self.root.after(10, self.recognize_faces)
+            return
+        
+        # Recognition runs at its own pace on the worker thread
+        self.pipeline.submit(frame)
+        self.pipeline.drain_events()
+        faces, _ = self.pipeline.latest()
+        frame = frame.copy()  # the worker may still be reading the submitted frame
+        
+        for face in faces:
+            x, y, w, h = face['box']
+            name = face['name']
+            color = face['color']
+            
             # Draw rectangle and label
             cv2.rectangle(frame, (x, y), (x+w, y+h), color, 3)
             cv2.rectangle(frame, (x, y-40), (x+w, y), color, cv2.FILLED)
             
             # Display name and confidence
-            cv2.putText(frame, f"{name} ({confidence_display:.1f}%)", (x+6, y-10), 
+            cv2.putText(frame, f"{name} ({face['confidence']:.1f}%)", (x+6, y-10), 
                        cv2.FONT_HERSHEY_DUPLEX, 0.7, (255, 255, 255), 2)
             
             # Add "PRESENT" badge if attendance was marked
@@ -1007,7 +998,14 @@ class AdvancedFaceAttendanceSystem:
         """Stop face recognition"""
         self.recognition_active = False
         
+        if self.pipeline:
+            self.pipeline.stop()
+            print(f"Recognition stats: {self.pipeline.stats()}")
+            print(f"Tracker stats: {self.tracker.stats()}")
+            self.pipeline = None
+        
         if self.current_video:
+            print(f"Capture stats: {self.current_video.stats()}")
             self.current_video.release()
             self.current_video = None
         
@@ -1023,22 +1021,10 @@ class AdvancedFaceAttendanceSystem:
         today = date.today().strftime("%Y-%m-%d")
         attendance_file = f"{self.attendance_folder}/attendance_{today}.csv"
         
-        # Create file if doesn't exist
-        if not os.path.exists(attendance_file):
-            with open(attendance_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', 'Name', 'Department', 'Date', 'Time', 'Status'])
-        
-        # Check if already marked
-        try:
-            with open(attendance_file, 'r') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    # Name might be col 1 if header extended; find by presence
-                    if len(row) > 1 and name == row[1]:
-                        return False  # Already marked
-        except:
-            pass
+        # Day ledger: file indexed once, duplicate check by (Date, Name) is a set lookup
+        ledger = get_ledger(attendance_file, header=DAILY_HEADER, key_columns=(3, 1))
+        if (today, name) in ledger:
+            return False  # Already marked
         
         # Lookup student details by name (case-insensitive)
         sid = ''
@@ -1050,9 +1036,8 @@ class AdvancedFaceAttendanceSystem:
                 dept = rec.get('Department', '')
 
         # Mark attendance
-        with open(attendance_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([sid, name, dept, today, datetime.now().strftime("%H:%M:%S"), "Present"])
+        if not ledger.mark([sid, name, dept, today, datetime.now().strftime("%H:%M:%S"), "Present"]):
+            return False
         
         self.update_info(f"✓ Attendance marked: {name}")
         return True
@@ -0,0 +1,256 @@
+"""
+Approximate Nearest-Neighbour Index for Large FaceNet Galleries
+- ExactIndex: dense matrix scan (reference / small galleries)
+- IVFIndex: inverted-file index with k-means coarse quantization, pure NumPy
+Backends are registered in INDEX_BACKENDS so other index types can be plugged in.
+All vectors are expected to be L2-normalized (scores are cosine similarities).
+"""
+import os
+
+import numpy as np
+
+INDEX_FILENAME = "facenet_ann_index.npz"  # saved next to the *_encoding.pkl files
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores along the last axis, best first"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.intp)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class ExactIndex:
+    """Brute-force index: one matrix product against every vector"""
+
+    name = "exact"
+
+    def __init__(self):
+        self._data = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def data(self):
+        return self._data[:self._size]
+
+    def _append(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        needed = self._size + len(vectors)
+        if self._data.shape[0] < needed or self._data.shape[1] != vectors.shape[1]:
+            # Grow geometrically so repeated inserts stay amortized O(1)
+            capacity = max(needed, 2 * self._data.shape[0], 16)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._size:
+                grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        start = self._size
+        self._data[start:needed] = vectors
+        self._size = needed
+        return np.arange(start, needed)
+
+    def build(self, vectors):
+        """(Re)build the index from an (N, D) matrix"""
+        self._size = 0
+        self._append(vectors)
+
+    def add(self, vectors):
+        """Insert vectors; returns their row ids"""
+        return self._append(vectors)
+
+    def search(self, queries, k=5):
+        """
+        Search the index
+
+        Args:
+            queries: (B, D) normalized queries
+            k: Number of neighbours per query
+
+        Returns:
+            Tuple (ids (B, k), scores (B, k)), best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        scores = queries @ self.data.T
+        ids = _top_k(scores, k)
+        return ids, np.take_along_axis(scores, ids, axis=-1)
+
+    def _state(self):
+        return {}
+
+    def _load_state(self, state):
+        pass
+
+    def save(self, path, keys):
+        """Persist vectors, row keys (student names) and backend state to an .npz file"""
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, backend=np.array(self.name), data=self.data,
+                 keys=np.array(keys, dtype=object), **self._state())
+        os.replace(tmp_path, path)
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means centroid
+    and a query only scans the n_probe closest buckets.
+    """
+
+    name = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        """
+        Args:
+            n_lists: Number of coarse clusters (default ~sqrt(N))
+            n_probe: Clusters scanned per query (recall/latency trade-off)
+            n_iter: k-means iterations when building
+            seed: Random seed for centroid initialization
+        """
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self._lists = []   # row ids per cluster
+        self._blocks = []  # contiguous vectors per cluster (scanned without a gather)
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _train(self, vectors):
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample; 64 points per list is plenty for coarse quantization
+        sample = vectors
+        if len(vectors) > 64 * n_lists:
+            sample = vectors[rng.choice(len(vectors), 64 * n_lists, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            sums[empty] = centroids[empty]  # keep empty clusters where they were
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)  # spherical k-means
+        self.centroids = centroids.astype(np.float32)
+
+    def build(self, vectors):
+        super().build(vectors)
+        self._train(self.data)
+        labels = self._assign(self.data)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        self._set_lists([order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))])
+
+    def _set_lists(self, lists):
+        self._lists = lists
+        self._blocks = [self.data[ids] for ids in lists]
+
+    def add(self, vectors):
+        if self.centroids is None:
+            self.build(vectors)
+            return np.arange(len(self))
+        ids = self._append(vectors)
+        for row, label in zip(ids, self._assign(self.data[ids])):
+            self._lists[label] = np.append(self._lists[label], row)
+            self._blocks[label] = np.vstack([self._blocks[label], self.data[row]])
+        return ids
+
+    def search(self, queries, k=5):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = _top_k(queries @ self.centroids.T, n_probe)
+        all_ids = np.full((len(queries), k), -1, dtype=np.intp)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for b, query in enumerate(queries):
+            candidates = np.concatenate([self._lists[p] for p in probes[b]])
+            if len(candidates) == 0:
+                continue
+            scores = np.concatenate([self._blocks[p] @ query for p in probes[b]])
+            best = _top_k(scores, k)
+            all_ids[b, :len(best)] = candidates[best]
+            all_scores[b, :len(best)] = scores[best]
+        return all_ids, all_scores
+
+    def _state(self):
+        lengths = np.array([len(lst) for lst in self._lists], dtype=np.int64)
+        members = np.concatenate(self._lists) if self._lists else np.zeros(0, dtype=np.int64)
+        return {
+            'centroids': self.centroids,
+            'list_lengths': lengths,
+            'list_members': members,
+            'params': np.array([self.n_probe, self.n_iter, self.seed]),
+        }
+
+    def _load_state(self, state):
+        self.centroids = state['centroids']
+        self.n_lists = len(self.centroids)
+        self.n_probe, self.n_iter, self.seed = (int(v) for v in state['params'])
+        bounds = np.r_[0, np.cumsum(state['list_lengths'])]
+        members = state['list_members']
+        self._set_lists([members[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))])
+
+
+INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def create_index(backend="ivf", **kwargs):
+    """Create an empty index for a registered backend name"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}' (available: {', '.join(INDEX_BACKENDS)})")
+    return INDEX_BACKENDS[backend](**kwargs)
+
+
+def load_index(path):
+    """
+    Load a persisted index
+
+    Returns:
+        Tuple (index, keys) or (None, None) if the file is missing/unreadable
+    """
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with np.load(path, allow_pickle=True) as state:
+            index = create_index(str(state['backend']))
+            index._append(state['data'])  # restore rows without re-training
+            index._load_state(state)
+            return index, list(state['keys'])
+    except Exception as e:
+        print(f"⚠ Could not load ANN index {path}: {e}")
+        return None, None
+
+
+def insert_into_saved_index(path, key, embedding):
+    """
+    Incrementally add one enrolled embedding to a persisted index (no-op if none exists)
+
+    Args:
+        path: Index file path (e.g. student_images/facenet_ann_index.npz)
+        key: Row key, i.e. the student name used by the gallery
+        embedding: Raw FaceNet embedding
+
+    Returns:
+        True if the index was updated
+    """
+    index, keys = load_index(path)
+    if index is None:
+        return False
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    index.add(vector)
+    index.save(path, keys + [key])
+    return True
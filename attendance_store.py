@@ -0,0 +1,164 @@
+"""
+Append-Only Attendance Ledger
+Keeps the attendance CSV format on disk, but loads the file ONCE into an
+in-memory key set so duplicate checks are O(1), and appends through a file
+handle that stays open instead of reopening/re-scanning the CSV per mark.
+
+Ledgers are shared per path for the current day: on the first get_ledger()
+call of a new day the previous day's ledgers are closed and dropped, so a
+long-running process does not keep every past day's file and key set open.
+"""
+import atexit
+import csv
+import os
+import threading
+from datetime import date
+
+
+class AttendanceLedger:
+    """
+    One attendance CSV file with an in-memory index of already marked keys
+    """
+
+    def __init__(self, path, header=None, key_columns=(0,), flush_every=1, lineterminator='\r\n'):
+        """
+        Args:
+            path: CSV file path
+            header: Header row written when the file is created (None = no header)
+            key_columns: Column indexes forming the duplicate key, e.g. (date, student id)
+            flush_every: Flush the writer after this many rows (1 = every mark)
+            lineterminator: Row ending used by the file's existing writer
+        """
+        self.path = path
+        self.header = list(header) if header else None
+        self.key_columns = tuple(key_columns)
+        self.flush_every = max(1, flush_every)
+        self.lineterminator = lineterminator
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._pending = 0
+        self._load()
+
+    def _load(self):
+        """Build the key index from the existing file (single pass)"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', newline='') as f:
+                reader = csv.reader(f)
+                if self.header:
+                    next(reader, None)
+                for row in reader:
+                    if len(row) > max(self.key_columns):
+                        self._keys.add(self.key_of(row))
+        except Exception as e:
+            print(f"⚠ Could not index attendance file {self.path}: {e}")
+
+    def key_of(self, row):
+        return tuple(str(row[i]).strip() for i in self.key_columns)
+
+    def _open(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        needs_newline = False
+        if not is_new:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) not in (b'\n', b'\r')
+        self._file = open(self.path, 'a', newline='')
+        self._writer = csv.writer(self._file, lineterminator=self.lineterminator)
+        if is_new and self.header:
+            self._writer.writerow(self.header)
+        elif needs_newline:
+            self._file.write(self.lineterminator)  # older writers left the last row unterminated
+
+    def __contains__(self, key):
+        return tuple(str(k).strip() for k in key) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def mark(self, row):
+        """
+        Append a row unless its key was already recorded
+
+        Returns:
+            True if written, False if it was a duplicate
+        """
+        key = self.key_of(row)
+        with self._lock:
+            if key in self._keys:
+                return False
+            if self._file is None:
+                self._open()
+            self._writer.writerow(row)
+            self._keys.add(key)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+        return True
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+                self._pending = 0
+
+
+# Shared ledgers so every window/camera writing the same file shares one index
+_ledgers = {}
+_ledgers_day = None   # day the shared ledgers were opened on
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path, header=None, key_columns=(0,), flush_every=1, lineterminator='\r\n'):
+    """
+    Get or create the shared ledger for a CSV path (loaded once per day and process)
+
+    Raises:
+        ValueError: If the path is already open with a different header or key columns
+    """
+    global _ledgers_day
+    key = os.path.abspath(path)
+    header = list(header) if header else None
+    with _ledgers_lock:
+        today = date.today()
+        if today != _ledgers_day:
+            _close_locked()
+            _ledgers.clear()
+            _ledgers_day = today
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            ledger = _ledgers[key] = AttendanceLedger(path, header=header, key_columns=key_columns,
+                                                      flush_every=flush_every, lineterminator=lineterminator)
+        elif ledger.header != header or ledger.key_columns != tuple(key_columns):
+            raise ValueError(f"{path} is already open with header {ledger.header} and key columns "
+                             f"{ledger.key_columns}, not {header} / {tuple(key_columns)}")
+        return ledger
+
+
+def _close_locked():
+    for ledger in _ledgers.values():
+        ledger.close()
+
+
+def close_all():
+    """Flush and close every open ledger"""
+    with _ledgers_lock:
+        _close_locked()
+
+
+atexit.register(close_all)
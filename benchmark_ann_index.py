@@ -0,0 +1,97 @@
+"""
+ANN INDEX BENCHMARK
+Compares recall@1 and per-query latency of the IVF index against the exact
+matrix scan on a synthetic FaceNet-sized gallery (or the real enrolled one).
+
+Usage:
+  python benchmark_ann_index.py                      # 20k synthetic students
+  python benchmark_ann_index.py --size 100000 --probe 4 8 16
+  python benchmark_ann_index.py --real               # student_images embedding store (or *_encoding.pkl)
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+
+from ann_index import ExactIndex, IVFIndex
+from embedding_store import EmbeddingStore
+
+
+def synthetic_gallery(size, dim, seed):
+    """Clustered unit vectors roughly shaped like FaceNet embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 40), dim))
+    vectors = centers[rng.integers(0, len(centers), size)] + rng.normal(size=(size, dim)) * 0.6
+    return vectors.astype(np.float32)
+
+
+def real_gallery(folder="student_images"):
+    store = EmbeddingStore(folder)
+    if store.exists():
+        return np.array(store.load()[2], dtype=np.float32)
+    vectors = []
+    for f in os.listdir(folder):
+        if f.endswith('_encoding.pkl'):
+            with open(os.path.join(folder, f), 'rb') as fh:
+                vectors.append(np.asarray(pickle.load(fh), dtype=np.float32))
+    return np.stack(vectors) if vectors else np.zeros((0, 128), dtype=np.float32)
+
+
+def time_queries(index, queries, k):
+    start = time.perf_counter()
+    ids = [index.search(q[None, :], k)[0][0] for q in queries]
+    elapsed = time.perf_counter() - start
+    return np.array(ids), elapsed / len(queries) * 1000.0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark IVF index vs exact scan")
+    p.add_argument("--size", type=int, default=20000, help="Synthetic gallery size")
+    p.add_argument("--dim", type=int, default=128, help="Embedding dimension (FaceNet = 128)")
+    p.add_argument("--queries", type=int, default=500, help="Number of probe faces")
+    p.add_argument("--noise", type=float, default=0.5, help="Relative noise norm added to each probe")
+    p.add_argument("--lists", type=int, default=None, help="IVF clusters (default ~sqrt(N))")
+    p.add_argument("--probe", type=int, nargs="+", default=[2, 4, 8, 16], help="n_probe values to test")
+    p.add_argument("--real", action="store_true", help="Use the enrolled student_images gallery")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    gallery = real_gallery() if args.real else synthetic_gallery(args.size, args.dim, args.seed)
+    if len(gallery) == 0:
+        print("No embeddings found.")
+        return
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(gallery), args.queries)
+    noise = rng.normal(size=(args.queries, gallery.shape[1])).astype(np.float32)
+    queries = gallery[picks] + noise * (args.noise / np.sqrt(gallery.shape[1]))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print("=" * 60)
+    print(f"ANN INDEX BENCHMARK - {len(gallery)} embeddings x {gallery.shape[1]}d, {len(queries)} queries")
+    print("=" * 60)
+
+    exact = ExactIndex()
+    exact.build(gallery)
+    exact_ids, exact_ms = time_queries(exact, queries, 1)
+    print(f"{'exact':<16} recall@1=1.000  {exact_ms:8.3f} ms/query")
+
+    ivf = IVFIndex(n_lists=args.lists)
+    start = time.perf_counter()
+    ivf.build(gallery)
+    print(f"IVF build: {len(ivf.centroids)} lists in {time.perf_counter() - start:.2f}s")
+
+    for n_probe in args.probe:
+        ivf.n_probe = n_probe
+        ids, ms = time_queries(ivf, queries, 1)
+        recall = float(np.mean(ids[:, 0] == exact_ids[:, 0]))
+        print(f"{'ivf probe=' + str(n_probe):<16} recall@1={recall:.3f}  {ms:8.3f} ms/query  ({exact_ms / ms:5.1f}x)")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
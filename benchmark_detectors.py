@@ -0,0 +1,95 @@
+"""
+FACE DETECTOR BENCHMARK
+Compares the detector backends (haar, dnn, yunet) on the repo's sample
+images: every photo under images/<Name>/ and student_images/ shows exactly
+one person, so recall = photos with at least one face found.
+Reports median ms/frame, recall and average faces per image; backends whose
+model files are missing from models/ are listed as skipped.
+
+Usage:
+  python benchmark_detectors.py
+  python benchmark_detectors.py --backends haar yunet --scale 0.5 --repeats 5
+  python benchmark_detectors.py --folders my_photos --resize 1280
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import DETECTOR_BACKENDS, create_detector
+
+
+def sample_images(folders):
+    """Enrolment photos (one face each): images/<Name>/*.jpg and flat student_images/*.jpg"""
+    paths = []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for entry in sorted(os.listdir(folder)):
+            full = os.path.join(folder, entry)
+            if os.path.isdir(full):
+                paths += [os.path.join(full, f) for f in sorted(os.listdir(full))
+                          if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+            elif folder != "images" and entry.lower().endswith((".jpg", ".jpeg", ".png")):
+                paths.append(full)  # top-level images/ holds UI artwork, not faces
+    return paths
+
+
+def load_frames(paths, resize_width=None):
+    frames = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        if resize_width and img.shape[1] != resize_width:
+            factor = resize_width / img.shape[1]
+            img = cv2.resize(img, (resize_width, int(img.shape[0] * factor)))
+        frames.append((path, img))
+    return frames
+
+
+def run_backend(detector, frames, repeats):
+    times, found, faces = [], 0, 0
+    for _, frame in frames:
+        detector.detect_faces(frame)  # warm-up (first call allocates)
+        per_image = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            detections = detector.detect_faces(frame)
+            per_image.append(time.perf_counter() - start)
+        times.append(float(np.median(per_image)))
+        found += bool(detections)
+        faces += len(detections)
+    return float(np.median(times)) * 1000, found / len(frames), faces / len(frames)
+
+
+def main():
+    p = argparse.ArgumentParser(description="ms/frame and recall of the face detector backends")
+    p.add_argument("--backends", nargs="+", default=sorted(DETECTOR_BACKENDS), choices=sorted(DETECTOR_BACKENDS))
+    p.add_argument("--folders", nargs="+", default=["images", "student_images"], help="Folders with one-face photos")
+    p.add_argument("--scale", type=float, default=0.5, help="Detection scale for haar/yunet")
+    p.add_argument("--resize", type=int, default=None, help="Resize photos to this width first")
+    p.add_argument("--repeats", type=int, default=3, help="Timed runs per image (median reported)")
+    args = p.parse_args()
+
+    frames = load_frames(sample_images(args.folders), args.resize)
+    if not frames:
+        print("✗ No sample images found")
+        return
+    print(f"{len(frames)} sample images (one face each)")
+    print(f"{'backend':<8} {'ms/frame':>9} {'recall':>8} {'faces/img':>10}")
+    print("-" * 38)
+    for backend in args.backends:
+        try:
+            detector = create_detector(backend, scale=args.scale, fallback=False)
+        except Exception as e:
+            print(f"{backend:<8} skipped ({e})")
+            continue
+        ms, recall, per_image = run_backend(detector, frames, args.repeats)
+        print(f"{backend:<8} {ms:>9.1f} {recall * 100:>7.0f}% {per_image:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+ENHANCEMENT PROFILE BENCHMARK
+Reports ms/frame of the camera enhancement profiles on a 1280x720 frame:
+- legacy:   NLM denoise + sharpen on the full frame (old capture_frame)
+- off:      no enhancement
+- fast:     bilateral + sharpen on face ROIs only (live frames)
+- quality:  NLM + sharpen on face ROIs (what an enrolment still pays per face)
+
+Usage:
+  python benchmark_enhancement.py
+  python benchmark_enhancement.py --image classroom.jpg --faces 4 --repeats 10
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from optimized_camera import enhance_image, enhance_rois
+
+
+def synthetic_frame(width, height, seed=0):
+    """Noisy gradient frame roughly shaped like a webcam image"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(40, 200, width, dtype=np.float32)
+    y = np.linspace(0, 40, height, dtype=np.float32)[:, None]
+    base = (x[None, :] + y)[..., None].repeat(3, axis=2)
+    return np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+
+
+def face_boxes(width, height, count, size=160):
+    """Evenly spread face-sized boxes"""
+    step = width // (count + 1)
+    return [(step * (i + 1) - size // 2, height // 2 - size // 2, size, size) for i in range(count)]
+
+
+def time_ms(fn, frame, repeats):
+    fn(frame.copy())  # warm-up
+    times = []
+    for _ in range(repeats):
+        work = frame.copy()
+        start = time.perf_counter()
+        fn(work)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def main():
+    p = argparse.ArgumentParser(description="ms/frame of each camera enhancement profile")
+    p.add_argument("--image", default=None, help="Frame to use (default: synthetic noisy 1280x720)")
+    p.add_argument("--faces", type=int, default=2, help="Face ROIs per frame")
+    p.add_argument("--repeats", type=int, default=5, help="Timed runs per profile (median reported)")
+    args = p.parse_args()
+
+    frame = cv2.imread(args.image) if args.image else None
+    if frame is None:
+        frame = synthetic_frame(1280, 720)
+    height, width = frame.shape[:2]
+    boxes = face_boxes(width, height, args.faces)
+
+    cases = [
+        ("legacy (full-frame NLM)", lambda f: enhance_image(f, "quality")),
+        ("off", lambda f: enhance_rois(f, boxes, "off")),
+        ("fast (ROIs)", lambda f: enhance_rois(f, boxes, "fast")),
+        ("quality (ROIs)", lambda f: enhance_rois(f, boxes, "quality")),
+    ]
+
+    print(f"Frame {width}x{height}, {len(boxes)} face ROIs of {boxes[0][2]}px" if boxes else f"Frame {width}x{height}")
+    print(f"{'profile':<26} {'ms/frame':>10} {'max fps':>9}")
+    print("-" * 47)
+    for name, fn in cases:
+        ms = time_ms(fn, frame, args.repeats)
+        print(f"{name:<26} {ms:>10.2f} {1000 / max(ms, 1e-3):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+VIDEO PIPELINE BENCHMARK
+Cost per processed frame against the number of faces in the frame:
+- legacy:   detect, then DeepFace.represent on the whole frame once per face
+            (N faces = N+1 detection passes, every face gets face #1's identity)
+- per-face: detect once, crop every facial area, embed the crops in one
+            batch and match them with one matrix product
+
+Frames are synthesized by tiling one face photo N times on a canvas.
+
+Usage:
+  python benchmark_video_pipeline.py --face images/Alice/1.jpg
+  python benchmark_video_pipeline.py --faces 1 2 4 8 --repeats 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from facenet_embedder import get_embedder, crop_faces
+from face_gallery import FaceGallery
+
+
+def find_sample_face(folders=("images", "student_images")):
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for root, _, files in os.walk(folder):
+            for f in sorted(files):
+                if f.lower().endswith((".jpg", ".jpeg", ".png")):
+                    return os.path.join(root, f)
+    return None
+
+
+def tiled_frame(face, count, tile=200):
+    """Place 'count' copies of the face photo on a grid (one face per tile)"""
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    canvas = np.full((rows * tile, cols * tile, 3), 40, dtype=np.uint8)
+    face = cv2.resize(face, (tile - 20, tile - 20))
+    for i in range(count):
+        r, c = divmod(i, cols)
+        canvas[r * tile + 10:(r + 1) * tile - 10, c * tile + 10:(c + 1) * tile - 10] = face
+    return canvas
+
+
+def legacy_step(frame, embedder, gallery):
+    faces = embedder.deepface.extract_faces(img_path=frame, enforce_detection=False,
+                                            detector_backend=embedder.detector_backend)
+    results = []
+    for _ in faces:
+        emb = embedder.embed(frame)   # full frame, re-detected, first face only
+        if emb is not None:
+            results.append(gallery.match(emb))
+    return len(faces), results
+
+
+def per_face_step(frame, embedder, gallery):
+    boxes = embedder.detect(frame)
+    embeddings = embedder.embed_batch(crop_faces(frame, boxes)) if boxes else []
+    found = [emb for emb in embeddings if emb is not None]
+    return len(boxes), gallery.match_batch(found) if found else []
+
+
+def time_step(step, frame, embedder, gallery, repeats):
+    step(frame, embedder, gallery)  # warm-up (model build, first-call overhead)
+    times = []
+    detected = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        detected, _ = step(frame, embedder, gallery)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000, detected
+
+
+def main():
+    p = argparse.ArgumentParser(description="Per-frame cost of the video recognition step vs face count")
+    p.add_argument("--face", default=None, help="Face photo to tile (default: first image in images/ or student_images/)")
+    p.add_argument("--faces", type=int, nargs="+", default=[1, 2, 4, 8], help="Face counts to test")
+    p.add_argument("--repeats", type=int, default=5, help="Timed runs per configuration (median reported)")
+    p.add_argument("--gallery", type=int, default=500, help="Synthetic gallery size")
+    args = p.parse_args()
+
+    face_path = args.face or find_sample_face()
+    face = cv2.imread(face_path) if face_path else None
+    if face is None:
+        print("✗ No face photo found; pass --face path/to/photo.jpg")
+        sys.exit(1)
+
+    embedder = get_embedder("Facenet", detector_backend="opencv")
+    rng = np.random.default_rng(0)
+    gallery = FaceGallery.from_matrix([f"student_{i}" for i in range(args.gallery)],
+                                      rng.normal(size=(args.gallery, 128)).astype(np.float32))
+
+    print(f"Face photo: {face_path}")
+    print(f"{'faces':>5} {'detected':>8} {'legacy ms':>10} {'per-face ms':>12} {'speedup':>8}")
+    print("-" * 48)
+    for count in args.faces:
+        frame = tiled_frame(face, count)
+        legacy_ms, _ = time_step(legacy_step, frame, embedder, gallery, args.repeats)
+        per_face_ms, detected = time_step(per_face_step, frame, embedder, gallery, args.repeats)
+        print(f"{count:>5} {detected:>8} {legacy_ms:>10.1f} {per_face_ms:>12.1f} "
+              f"{legacy_ms / max(per_face_ms, 1e-6):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+BULK ENROLMENT
+Embeds a whole folder of student photos in parallel and writes the result to
+the packed embedding store (student_images/facenet_gallery.json).
+- Decoding, detection and FaceNet embedding run in a process pool
+- Faces are found with the live detector (FACE_DETECTOR_BACKEND) and aligned to
+  the FaceNet template, exactly like the probes of the recognition loops
+  (--no-align: DeepFace's own detector on the whole photo, as before)
+- Every worker builds/warms up the model once, before its first image
+- Results are collected in input order; progress shows rate and ETA
+- Images already embedded (same content) are served from the embedding cache
+- Several photos of one student give a robust centroid (outliers dropped) plus
+  up to --max-templates templates for near-threshold matches
+
+Supported layouts:
+  images/StudentName/*.jpg        -> one student per sub-folder
+  student_images/ID_Name.jpg      -> one photo per student (GUI capture naming)
+
+Usage:
+  python bulk_enroll.py --images intake/ --workers 8
+  python bulk_enroll.py --images images --store student_images --no-cache
+  python bulk_enroll.py --images intake/ --detector yunet
+  python bulk_enroll.py --images student_images --new-only
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, CACHE_FILENAME
+from embedding_store import EmbeddingStore
+from face_templates import DEFAULT_MAX_TEMPLATES, build_templates
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# A pool worker first has to load the model: below this many images per worker it is not worth it
+MIN_IMAGES_PER_WORKER = 8
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def _init_worker(model_name, detector_backend, align=False, pooled=True):
+    """Pool initializer: import DeepFace, build the model and run one warm-up pass"""
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import cv2
+    if pooled:
+        cv2.setNumThreads(1)  # parallelism comes from the pool, not from OpenCV threads
+    from deepface import DeepFace
+    DeepFace.build_model(model_name)
+    _worker.update(deepface=DeepFace, cv2=cv2, model_name=model_name, detector_backend=detector_backend,
+                   aligner=None)
+    if align:
+        from face_alignment import FaceAligner
+        from face_detector import create_detector
+        from facenet_embedder import get_embedder
+        embedder = get_embedder(model_name)  # in-process runs share the caller's model
+        embedder.embed_batch([np.zeros((160, 160, 3), dtype=np.uint8)])  # build + warm up the model
+        _worker.update(detector=create_detector(detector_backend, scale=1.0), aligner=FaceAligner(),
+                       embedder=embedder)
+        return
+    try:
+        DeepFace.represent(img_path=np.zeros((160, 160, 3), dtype=np.uint8), model_name=model_name,
+                           detector_backend="skip", enforce_detection=False)
+    except Exception:
+        pass
+
+
+def _embed_image(path):
+    """Worker task: decode + detect (+ align) + embed one image -> (embedding or None, error or None)"""
+    try:
+        image = _worker['cv2'].imread(path)
+        if image is None:
+            return None, "unreadable image"
+        if _worker['aligner'] is not None:
+            from face_alignment import align_largest_face
+            # Tight face crops (data/ samples) have no detectable face: use the whole photo,
+            # as DeepFace did with enforce_detection=False
+            crop = align_largest_face(_worker['detector'], _worker['aligner'], image, whole_image=True)
+            if crop is None:
+                return None, "no face found"
+            embedding = _worker['embedder'].embed_batch([crop])[0]
+            return (embedding, None) if embedding is not None else (None, "no face found")
+        result = _worker['deepface'].represent(img_path=image, model_name=_worker['model_name'],
+                                               detector_backend=_worker['detector_backend'],
+                                               enforce_detection=False)
+        if not result:
+            return None, "no face found"
+        return np.asarray(result[0]['embedding'], dtype=np.float32), None
+    except Exception as e:
+        return None, str(e)
+
+
+class Progress:
+    """Throttled progress line: count, percent, images/s and ETA"""
+
+    def __init__(self, total, label="Embedding", every=1.0):
+        self.total = total
+        self.label = label
+        self.every = every
+        self.done = 0
+        self.start = time.time()
+        self._last = 0.0
+
+    def update(self, n=1):
+        self.done += n
+        now = time.time()
+        if now - self._last < self.every and self.done < self.total:
+            return
+        self._last = now
+        elapsed = max(now - self.start, 1e-6)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        print(f"  [{self.done}/{self.total}] {self.done / max(self.total, 1) * 100:5.1f}%  "
+              f"{rate:6.1f} img/s  ETA {int(eta // 60)}m{int(eta % 60):02d}s", flush=True)
+
+
+def embed_images(paths, workers=None, model_name="Facenet", detector_backend="opencv",
+                 cache=None, chunksize=4, progress=True, align=False):
+    """
+    Embed many image files, fanning cache misses out over a process pool
+
+    Args:
+        paths: Image paths
+        workers: Pool size (default: CPU count); 1 runs in-process
+        model_name: DeepFace model
+        detector_backend: DeepFace detector backend, or with align=True the live detector
+                          backend ('haar'/'dnn'/'yunet', None = FACE_DETECTOR_BACKEND)
+        cache: Optional EmbeddingCache (hits skip the pool entirely); its detector name must
+               tell the two modes apart (see cache_detector_name)
+        chunksize: Images per task sent to a worker
+        progress: Print a progress line
+        align: Crop with the live detector + FaceAligner (the live probe preprocessing)
+               instead of running DeepFace's detector on the whole image
+
+    Returns:
+        List aligned with paths: float32 embedding or None
+    """
+    results = [None] * len(paths)
+    pending = []
+    for i, path in enumerate(paths):
+        if cache is not None:
+            found, embedding = cache.lookup(path)
+            if found:
+                results[i] = embedding
+                continue
+        pending.append(i)
+
+    if not pending:
+        return results
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending) // MIN_IMAGES_PER_WORKER))
+    tracker = Progress(len(pending)) if progress else None
+    if progress:
+        print(f"Embedding {len(pending)} images with {workers} worker(s) "
+              f"({len(paths) - len(pending)} cached)...")
+
+    def collect(outputs):
+        # map() yields in submission order, so results line up with 'pending'
+        for i, (embedding, error) in zip(pending, outputs):
+            results[i] = embedding
+            if error:
+                print(f"  ✗ {os.path.basename(paths[i])}: {error}")
+            # "No face" is a stable answer worth caching; read/model errors are retried next run
+            if cache is not None and error in (None, "no face found"):
+                cache.put(paths[i], embedding)
+            if tracker:
+                tracker.update()
+
+    if workers == 1:
+        _init_worker(model_name, detector_backend, align, pooled=False)
+        collect(map(_embed_image, (paths[i] for i in pending)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name, detector_backend, align)) as pool:
+            collect(pool.map(_embed_image, [paths[i] for i in pending], chunksize=chunksize))
+    return results
+
+
+def cache_detector_name(detector_backend, align):
+    """Detector name under which EmbeddingCache keeps the embeddings of one preprocessing mode"""
+    if not align:
+        return detector_backend
+    from face_detector import default_backend
+    return f"aligned-{detector_backend or default_backend()}"
+
+
+def discover_images(folder):
+    """
+    Find enrolment images
+
+    Returns:
+        List of (student_id, name, path)
+    """
+    items = []
+    for entry in sorted(os.listdir(folder)):
+        full = os.path.join(folder, entry)
+        if os.path.isdir(full):
+            for img_name in sorted(os.listdir(full)):
+                if img_name.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((entry, entry, os.path.join(full, img_name)))
+        elif entry.lower().endswith(IMAGE_EXTENSIONS):
+            stem = os.path.splitext(entry)[0]
+            parts = stem.split('_', 1)  # ID_Name.jpg, as saved by the GUI
+            student_id, name = (parts[0], parts[1]) if len(parts) == 2 else (stem, stem)
+            items.append((student_id, name, full))
+    return items
+
+
+def enroll_folder(images_folder, store_folder="student_images", workers=None, model_name="Facenet",
+                  detector_backend=None, align=True, use_cache=True, max_templates=DEFAULT_MAX_TEMPLATES,
+                  skip_enrolled=False, chunksize=4, progress=True):
+    """
+    Embed a folder of student photos in parallel and write one row per student
+    (robust centroid + templates) to the embedding store
+
+    Args:
+        images_folder: Photos (Name/*.jpg or ID_Name.jpg)
+        store_folder: Folder of the packed embedding store
+        workers, chunksize, progress: Process pool settings (see embed_images)
+        model_name: DeepFace model
+        detector_backend: Live detector for aligned crops (None = FACE_DETECTOR_BACKEND);
+                          with align=False the DeepFace detector backend (None = 'opencv')
+        align: Aligned live-detector crops (the live probe preprocessing)
+        use_cache: Reuse embeddings of unchanged photos (embedding cache in images_folder)
+        max_templates: Templates kept per student (None = every inlier)
+        skip_enrolled: Leave students already in the store untouched (new intake only)
+
+    Returns:
+        Dict with students, images, embedded, rejected (outlier photos), skipped, seconds
+    """
+    items = discover_images(images_folder)
+    store = EmbeddingStore(store_folder, model_name=model_name)
+    skipped = 0
+    if skip_enrolled and items:
+        store.ensure()
+        ids, names, _ = store.load()
+        enrolled = {(str(i), n) for i, n in zip(ids, names)}
+        kept = [item for item in items if (item[0], item[1]) not in enrolled]
+        skipped, items = len(items) - len(kept), kept
+    summary = {'students': 0, 'images': len(items), 'embedded': 0, 'rejected': 0, 'skipped': skipped,
+               'seconds': 0.0}
+    if not items:
+        return summary
+
+    detector_backend = detector_backend or (None if align else "opencv")
+    cache = None
+    if use_cache:
+        cache = EmbeddingCache(os.path.join(images_folder, CACHE_FILENAME), model_name,
+                               cache_detector_name(detector_backend, align))
+
+    start = time.time()
+    embeddings = embed_images([path for _, _, path in items], workers=workers, model_name=model_name,
+                              detector_backend=detector_backend, cache=cache, chunksize=chunksize,
+                              progress=progress, align=align)
+    summary['seconds'] = time.time() - start
+    summary['embedded'] = sum(e is not None for e in embeddings)
+
+    # One centroid row per student (outlier photos dropped) plus up to max_templates templates
+    per_student = {}
+    for (student_id, name, _), embedding in zip(items, embeddings):
+        if embedding is not None:
+            per_student.setdefault((student_id, name), []).append(embedding)
+    records = []
+    for (sid, name), vectors in per_student.items():
+        result = build_templates(vectors, max_templates=max_templates)
+        records.append((sid, name, result.centroid, result.templates if len(result.templates) > 1 else None))
+        summary['rejected'] += result.rejected
+
+    if records:
+        store.extend(records)
+    if cache is not None:
+        cache.save()
+        if progress:
+            print(cache.report())
+    summary['students'] = len(records)
+    return summary
+
+
+def main():
+    p = argparse.ArgumentParser(description="Bulk-enrol a folder of student photos into the embedding store")
+    p.add_argument("--images", required=True, help="Folder of photos (Name/*.jpg or ID_Name.jpg)")
+    p.add_argument("--store", default="student_images", help="Folder of the packed embedding store")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.add_argument("--chunksize", type=int, default=4, help="Images per worker task")
+    p.add_argument("--model", default="Facenet", help="DeepFace model")
+    p.add_argument("--detector", default=None,
+                   help="Live face detector used for alignment: haar/dnn/yunet (default: FACE_DETECTOR_BACKEND); "
+                        "with --no-align the DeepFace detector backend (default: opencv)")
+    p.add_argument("--no-align", action="store_true",
+                   help="Embed whole photos with DeepFace's detector instead of aligned live-detector crops")
+    p.add_argument("--no-cache", action="store_true", help="Ignore the embedding cache")
+    p.add_argument("--max-templates", type=int, default=DEFAULT_MAX_TEMPLATES,
+                   help="Templates kept per student (0 = every inlier)")
+    p.add_argument("--new-only", action="store_true", help="Skip students already in the store")
+    args = p.parse_args()
+
+    if not os.path.isdir(args.images):
+        print(f"✗ Folder not found: {args.images}")
+        sys.exit(1)
+
+    summary = enroll_folder(args.images, args.store, workers=args.workers, model_name=args.model,
+                            detector_backend=args.detector, align=not args.no_align,
+                            use_cache=not args.no_cache, max_templates=args.max_templates or None,
+                            skip_enrolled=args.new_only, chunksize=args.chunksize)
+    if not summary['images']:
+        print(f"✗ No images to enrol in {args.images}" + (f" ({summary['skipped']} already enrolled)"
+                                                          if summary['skipped'] else ""))
+        sys.exit(1)
+
+    elapsed = summary['seconds']
+    print("=" * 60)
+    print(f"✓ Enrolled {summary['students']} students from {summary['embedded']}/{summary['images']} images "
+          f"in {elapsed:.1f}s ({summary['images'] / max(elapsed, 1e-6):.1f} img/s)")
+    if summary['skipped']:
+        print(f"  {summary['skipped']} images of already enrolled students skipped")
+    if summary['rejected']:
+        print(f"  {summary['rejected']} outlier photos left out of the centroids")
+    print(f"  Store: {EmbeddingStore(args.store).matrix_path}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+THRESHOLD CALIBRATION
+Maps the cosine-similarity threshold to measured error rates instead of a
+guessed constant. Genuine and impostor score distributions are collected
+offline and stored as FAR/FRR curves (student_images/threshold_calibration.json):
+  FAR(t)  impostor probes scoring >= t against some OTHER student (false accept)
+  FRR(t)  genuine probes scoring <  t against their own student (false reject)
+
+Every score comes from FaceGallery.match_batch on a gallery built like the
+recognizers build it (centroid rows + attached templates). Near the threshold
+match_batch re-scores the best and runner-up identities against their
+templates, so a probe's score depends on the threshold it is judged at; each
+probe keeps its plain and its refined result and the curves apply the same
+template_margin rule at every threshold.
+
+Score sources:
+- the enrolled gallery (embedding store v2): every stored template against its
+  student's other templates + their centroid (genuine) and against a gallery
+  without its student (impostor)
+- --frames DIR: captured frames in DIR/<Name>/*.jpg, cut like live probes
+  (live detector -> FaceAligner -> embed_batch); enrolled names are genuine
+  against the full gallery and impostors against the gallery without them,
+  other names only count as impostors
+- --unknown DIR: face crops of people who are NOT enrolled (e.g. unknown_faces/)
+
+Recognizers call load_threshold(target_far) to get the threshold of the
+operating point (FACE_TARGET_FAR, default 0.1%), falling back to their old
+constant when no calibration exists.
+
+Usage:
+  python calibrate_threshold.py
+  python calibrate_threshold.py --frames captured_frames --unknown unknown_faces
+  python calibrate_threshold.py --show --target-far 0.01
+  python calibrate_threshold.py --frames captured_frames --detector yunet
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from face_gallery import FaceGallery
+
+CALIBRATION_FILE = "threshold_calibration.json"
+DEFAULT_FOLDER = "student_images"
+DEFAULT_TARGET_FAR = 0.001
+REPORTED_FARS = (0.1, 0.01, 0.001, 0.0001)
+THRESHOLD_STEP = 0.005
+TEMPLATE_MARGIN = 0.1   # FaceGallery.attach_templates default used by the recognizers
+
+_warned = set()
+
+
+def default_target_far():
+    """Operating point for this deployment (FACE_TARGET_FAR, default 0.001 = 0.1%)"""
+    try:
+        return float(os.environ.get("FACE_TARGET_FAR", DEFAULT_TARGET_FAR))
+    except ValueError:
+        return DEFAULT_TARGET_FAR
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors.reshape(len(vectors), -1) if len(vectors) else vectors.reshape(0, 0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True) if len(vectors) else np.zeros((0, 1))
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _accepted_scores(scores, threshold, margin):
+    """
+    Score each probe has when judged at threshold
+
+    scores: (n,) plain scores, or (n, 3) rows (centroid best score, plain score,
+    refined score) - the refined score counts when the centroid best score is
+    within margin of the threshold, as in FaceGallery.match_batch
+    """
+    if scores.ndim == 1:
+        return scores
+    near = np.abs(scores[:, 0] - threshold) <= margin
+    return np.where(near, scores[:, 2], scores[:, 1])
+
+
+def compute_curves(genuine, impostor, step=THRESHOLD_STEP, margin=TEMPLATE_MARGIN):
+    """
+    FAR/FRR over a grid of cosine thresholds
+
+    Args:
+        genuine: Scores of probes against their own identity ((n,) or (n, 3) score rows)
+        impostor: Best scores of probes against identities that are not theirs
+        margin: Template refinement margin of the gallery the rows come from
+
+    Returns:
+        Dict with thresholds, far, frr, eer and eer_threshold
+    """
+    genuine = np.asarray(genuine, dtype=np.float64)
+    impostor = np.asarray(impostor, dtype=np.float64)
+    thresholds = np.round(np.arange(-1.0, 1.0 + step / 2, step), 6)
+    far = np.zeros(len(thresholds))
+    frr = np.zeros(len(thresholds))
+    for i, t in enumerate(thresholds):
+        if len(genuine):
+            frr[i] = np.mean(_accepted_scores(genuine, t, margin) < t)
+        if len(impostor):
+            far[i] = np.mean(_accepted_scores(impostor, t, margin) >= t)
+    eer_index = int(np.argmin(np.abs(far - frr)))
+    return {
+        'thresholds': thresholds.tolist(),
+        'far': np.round(far, 6).tolist(),
+        'frr': np.round(frr, 6).tolist(),
+        'eer': float((far[eer_index] + frr[eer_index]) / 2),
+        'eer_threshold': float(thresholds[eer_index]),
+    }
+
+
+def threshold_for_far(curves, target_far):
+    """Lowest threshold whose FAR is <= target_far (lowest FRR at that FAR), or None"""
+    for t, far in zip(curves['thresholds'], curves['far']):
+        if far <= target_far:
+            return float(t)
+    return None
+
+
+def _frr_at(curves, threshold):
+    idx = int(np.searchsorted(np.asarray(curves['thresholds']), threshold - 1e-9))
+    return curves['frr'][min(idx, len(curves['frr']) - 1)]
+
+
+def load_calibration(folder=DEFAULT_FOLDER, path=None):
+    """Stored calibration dict, or None if missing/unreadable"""
+    path = path or os.path.join(folder, CALIBRATION_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠ Could not read threshold calibration {path}: {e}")
+        return None
+
+
+def load_threshold(target_far=None, default=0.85, folder=DEFAULT_FOLDER, path=None):
+    """
+    Cosine threshold for a target false accept rate
+
+    Args:
+        target_far: Wanted FAR (default: FACE_TARGET_FAR or 0.001)
+        default: Threshold used when no calibration exists or it cannot reach target_far
+        folder, path: Where the calibration file lives
+
+    Returns:
+        float threshold
+    """
+    target_far = default_target_far() if target_far is None else target_far
+    calibration = load_calibration(folder, path)
+    if calibration is None:
+        return default
+    threshold = threshold_for_far(calibration, target_far)
+    if threshold is None:
+        key = (folder, path, target_far)
+        if key not in _warned:
+            _warned.add(key)
+            print(f"⚠ Calibration cannot reach FAR {target_far:g}; using threshold {default}")
+        return default
+    return threshold
+
+
+def build_gallery(names, centroids, template_names=(), templates=None, margin=TEMPLATE_MARGIN, exclude=None):
+    """
+    FaceGallery as the recognizers build it (centroid rows + attached templates)
+
+    Args:
+        exclude: Identity left out (impostor scoring of its own probes)
+    """
+    keep = [i for i, name in enumerate(names) if name != exclude]
+    gallery = FaceGallery.from_matrix([names[i] for i in keep], np.asarray(centroids, dtype=np.float32)[keep])
+    t_keep = [i for i, name in enumerate(template_names) if name != exclude]
+    if t_keep:
+        gallery.attach_templates([template_names[i] for i in t_keep],
+                                 np.asarray(templates, dtype=np.float32)[t_keep], margin=margin)
+    else:
+        gallery.template_margin = margin
+    return gallery
+
+
+def runtime_matches(gallery, embeddings):
+    """
+    match_batch results of every probe without and with template refinement
+
+    Returns:
+        Tuple (plain results, refined results); the recognizers see the refined one
+        when the plain similarity is within gallery.template_margin of their threshold
+    """
+    plain = gallery.match_batch(embeddings)
+    margin = gallery.template_margin
+    gallery.template_margin = np.inf  # refine every query
+    try:
+        refined = gallery.match_batch(embeddings, threshold=0.0)
+    finally:
+        gallery.template_margin = margin
+    return plain, refined
+
+
+def genuine_rows(gallery, embeddings, labels):
+    """Score rows of probes of enrolled people: accepted only when matched to their own identity"""
+    if not len(embeddings) or not len(gallery):
+        return []
+    plain, refined = runtime_matches(gallery, embeddings)
+    return [(p.similarity,
+             p.similarity if p.name == label else -np.inf,
+             r.similarity if r.name == label else -np.inf)
+            for label, p, r in zip(labels, plain, refined)]
+
+
+def impostor_rows(gallery, embeddings):
+    """Score rows of probes whose identity is not in the gallery: any accept is a false accept"""
+    if not len(embeddings) or not len(gallery):
+        return []
+    plain, refined = runtime_matches(gallery, embeddings)
+    return [(p.similarity, p.similarity, r.similarity) for p, r in zip(plain, refined)]
+
+
+def gallery_scores(names, centroids, template_names, templates, margin=TEMPLATE_MARGIN):
+    """
+    Genuine/impostor score rows from the enrolled gallery alone
+
+    Genuine: each template vs a one-student gallery of the mean of its student's OTHER
+    templates with those templates attached (leave-one-out).
+    Impostor: each template (or centroid, for single-sample students) vs the gallery
+    without its student.
+    """
+    genuine, impostor = [], []
+    names = list(names)
+    centroids = np.asarray(centroids, dtype=np.float32)
+    template_names = list(template_names)
+    template_unit = _unit(templates) if template_names else np.zeros((0, centroids.shape[1]), dtype=np.float32)
+    raw_templates = np.asarray(templates, dtype=np.float32) if template_names else template_unit
+
+    by_name = {}
+    for row, name in enumerate(template_names):
+        by_name.setdefault(name, []).append(row)
+    for name, rows in by_name.items():
+        if len(rows) < 2:
+            continue
+        own = template_unit[rows]
+        total = own.sum(axis=0)
+        for k in range(len(rows)):
+            others = [r for j, r in enumerate(rows) if j != k]
+            gallery = build_gallery([name], _unit([total - own[k]]), [name] * len(others),
+                                    raw_templates[others], margin=margin)
+            genuine += genuine_rows(gallery, raw_templates[[rows[k]]], [name])
+
+    for name in dict.fromkeys(names):
+        if name in by_name:
+            probes = raw_templates[by_name[name]]
+        else:
+            probes = centroids[[i for i, n in enumerate(names) if n == name]]
+        # A name may own several rows (same name, other ID): all of them are left out
+        gallery = build_gallery(names, centroids, template_names, raw_templates, margin, exclude=name)
+        impostor += impostor_rows(gallery, probes)
+    return genuine, impostor
+
+
+def probe_scores(names, centroids, probes, template_names=(), templates=None, margin=TEMPLATE_MARGIN):
+    """
+    Score rows of labelled probe embeddings (label None = not enrolled)
+
+    Returns:
+        Tuple (genuine, impostor) lists
+    """
+    genuine, impostor = [], []
+    if not probes:
+        return genuine, impostor
+    names = list(names)
+    template_names = list(template_names)
+    by_label = {}
+    for label, embedding in probes:
+        by_label.setdefault(label, []).append(np.asarray(embedding, dtype=np.float32).ravel())
+    full = build_gallery(names, centroids, template_names, templates, margin)
+    for label, embeddings in by_label.items():
+        embeddings = np.stack(embeddings)
+        if label in names:
+            genuine += genuine_rows(full, embeddings, [label] * len(embeddings))
+            without = build_gallery(names, centroids, template_names, templates, margin, exclude=label)
+            impostor += impostor_rows(without, embeddings)
+        else:
+            impostor += impostor_rows(full, embeddings)
+    return genuine, impostor
+
+
+def _image_files(folder):
+    return [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+
+
+def embed_probe_folders(frames_dir=None, unknown_dir=None, model_name="Facenet", detector_backend=None):
+    """
+    Embed captured frames (frames_dir/<Name>/*.jpg) and unknown face crops (flat folder)
+    the way the live loops embed probes: live detector -> FaceAligner -> embed_batch
+    """
+    from face_alignment import FaceAligner, align_largest_face
+    from face_detector import create_detector
+    from facenet_embedder import get_embedder
+    embedder = get_embedder(model_name)
+    detector = create_detector(detector_backend, scale=0.5)
+    aligner = FaceAligner()
+
+    def embed(paths, whole_image=False):
+        crops = [align_largest_face(detector, aligner, cv2.imread(path), whole_image=whole_image)
+                 for path in paths]
+        crops = [crop for crop in crops if crop is not None]
+        return [emb for emb in (embedder.embed_batch(crops) if crops else []) if emb is not None]
+
+    probes = []
+    if frames_dir and os.path.isdir(frames_dir):
+        for name in sorted(os.listdir(frames_dir)):
+            person_dir = os.path.join(frames_dir, name)
+            if os.path.isdir(person_dir):
+                probes += [(name, emb) for emb in embed(_image_files(person_dir))]
+    if unknown_dir and os.path.isdir(unknown_dir):
+        # Snapshots are already face crops: align the whole crop when no face is re-detected
+        probes += [(None, emb) for emb in embed(_image_files(unknown_dir), whole_image=True)]
+    print(f"Alignment sources: {aligner.stats()}")
+    return probes
+
+
+def print_report(calibration):
+    print(f"Genuine scores: {calibration['genuine_count']}, impostor scores: {calibration['impostor_count']}")
+    print(f"EER {calibration['eer'] * 100:.2f}% at threshold {calibration['eer_threshold']:.3f}")
+    print(f"{'target FAR':>11} {'threshold':>10} {'FRR':>8}")
+    print("-" * 31)
+    for far, point in calibration['operating_points'].items():
+        if point['threshold'] is None:
+            print(f"{float(far) * 100:>10g}% {'n/a':>10} {'':>8}")
+        else:
+            print(f"{float(far) * 100:>10g}% {point['threshold']:>10.3f} {point['frr'] * 100:>7.1f}%")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Calibrate the recognition threshold from genuine/impostor scores")
+    p.add_argument("--store", default=DEFAULT_FOLDER, help="Folder of the packed embedding store")
+    p.add_argument("--frames", default=None, help="Captured frames, one sub-folder per student name")
+    p.add_argument("--unknown", default=None, help="Face crops of people who are not enrolled")
+    p.add_argument("--out", default=None, help=f"Output JSON (default: <store>/{CALIBRATION_FILE})")
+    p.add_argument("--target-far", type=float, default=None, help="FAR to report the threshold for")
+    p.add_argument("--detector", default=None,
+                   help="Live face detector for --frames/--unknown: haar/dnn/yunet (default: FACE_DETECTOR_BACKEND)")
+    p.add_argument("--show", action="store_true", help="Only print the stored calibration")
+    args = p.parse_args()
+
+    out = args.out or os.path.join(args.store, CALIBRATION_FILE)
+    target_far = default_target_far() if args.target_far is None else args.target_far
+    if args.show:
+        calibration = load_calibration(path=out)
+        if calibration is None:
+            print(f"✗ No calibration at {out}")
+            return
+        print_report(calibration)
+        print(f"Threshold for FAR {target_far:g}: {threshold_for_far(calibration, target_far)}")
+        return
+
+    from embedding_store import EmbeddingStore
+    store = EmbeddingStore(args.store)
+    store.ensure()
+    _, names, centroids = store.load()
+    if not names:
+        print(f"✗ No enrolled students in {store.matrix_path}")
+        return
+    _, template_names, templates = store.load_templates()
+
+    genuine, impostor = gallery_scores(names, centroids, template_names, templates)
+    if args.frames or args.unknown:
+        probes = embed_probe_folders(args.frames, args.unknown, detector_backend=args.detector)
+        probe_genuine, probe_impostor = probe_scores(names, centroids, probes, template_names, templates)
+        genuine += probe_genuine
+        impostor += probe_impostor
+    if not genuine or not impostor:
+        print(f"✗ Need both genuine ({len(genuine)}) and impostor ({len(impostor)}) scores: "
+              f"enrol several samples per student or pass --frames/--unknown")
+        return
+
+    curves = compute_curves(genuine, impostor)
+    points = {}
+    for far in sorted(set(REPORTED_FARS) | {target_far}, reverse=True):
+        threshold = threshold_for_far(curves, far)
+        points[f"{far:g}"] = {'threshold': threshold,
+                              'frr': _frr_at(curves, threshold) if threshold is not None else None}
+    calibration = {
+        'version': 1,
+        'metric': 'cosine',
+        'template_margin': TEMPLATE_MARGIN,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'students': len(names),
+        'genuine_count': len(genuine),
+        'impostor_count': len(impostor),
+        'operating_points': points,
+        **curves,
+    }
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    tmp_path = out + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f)
+    os.replace(tmp_path, out)
+
+    print_report(calibration)
+    if len(impostor) < 1.0 / min(REPORTED_FARS):
+        print(f"⚠ Only {len(impostor)} impostor scores: FAR below {1.0 / len(impostor):.2g} is not resolved; "
+              f"add --unknown crops for a tighter estimate")
+    print(f"✓ Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
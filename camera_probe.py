@@ -0,0 +1,201 @@
+"""
+Camera Probing (no GUI dependencies)
+Finds a working backend/codec/resolution combo for a webcam and verifies it
+delivers non-black frames (a common Windows MSMF/DSHOW problem). The winning
+combo is cached per camera index in camera_config_cache.json, so later opens
+try it first and only re-probe when it stops working.
+
+Used by both GUIs and the headless multi-camera server.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import cv2
+
+CAMERA_CONFIG_FILE = "camera_config_cache.json"  # winning probe combo per camera index
+
+
+def _fourcc_str(value: float) -> str:
+    try:
+        v = int(value)
+        return "".join([chr((v >> 8 * i) & 0xFF) for i in range(4)])
+    except Exception:
+        return ""  # unknown
+
+
+def try_open_camera(index: int,
+                    backend: int,
+                    codec: str | None,
+                    width: int,
+                    height: int,
+                    fps: int,
+                    warmup_frames: int,
+                    good_frames: int = 3,
+                    black_frames: int = 15,
+                    max_failed_reads: int = 8) -> tuple[cv2.VideoCapture | None, dict | None]:
+    """Attempt to open a camera with specific backend/codec/resolution and ensure frames aren't black.
+    Stops as soon as the verdict is clear: `good_frames` consecutive non-black frames accept the
+    combo; `black_frames` black frames or `max_failed_reads` failed reads in a row reject it.
+    Returns (cap, meta) on success, (None, {'failure': reason}) on failure.
+    meta contains backend_name, codec, width, height, fps, brightness.
+    """
+    backend_names = {
+        getattr(cv2, 'CAP_MSMF', -1): 'MSMF',
+        getattr(cv2, 'CAP_DSHOW', -1): 'DSHOW',
+        getattr(cv2, 'CAP_ANY', -1): 'ANY'
+    }
+
+    cap = cv2.VideoCapture(index, backend)
+    if not cap.isOpened():
+        return None, {'failure': 'open'}
+
+    # Apply settings
+    try:
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+    except Exception:
+        pass
+
+    if codec:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*codec))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+
+    # Warmup until the verdict is clear
+    failed_in_row = 0
+    black_in_row = 0
+    bright_in_row = 0
+    brightness_sum = 0.0
+    for _ in range(max(10, warmup_frames)):
+        ret, fr = cap.read()
+        if not ret or fr is None or fr.size == 0:
+            failed_in_row += 1
+            if failed_in_row >= max_failed_reads:
+                cap.release()
+                return None, {'failure': 'no frames'}
+            continue
+        failed_in_row = 0
+        # Heuristic: treat as black if average brightness is near 0 (subsampled: only the mean matters)
+        brightness = float(fr[::4, ::4].mean())
+        if brightness < 5.0:
+            bright_in_row = 0
+            brightness_sum = 0.0
+            black_in_row += 1
+            if black_in_row >= black_frames:
+                break
+            continue
+        black_in_row = 0
+        bright_in_row += 1
+        brightness_sum += brightness
+        if bright_in_row >= good_frames:
+            break
+    if bright_in_row == 0:
+        cap.release()
+        return None, {'failure': 'black'}
+
+    meta = {
+        'backend': backend_names.get(backend, str(backend)),
+        'codec': codec or 'DEFAULT',
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': int(cap.get(cv2.CAP_PROP_FPS) or 0),
+        'brightness': brightness_sum / bright_in_row,
+    }
+    return cap, meta
+
+
+def load_camera_config(index: int, path: str = CAMERA_CONFIG_FILE) -> dict | None:
+    """Cached winning combo for a camera index: {'backend', 'codec', 'width', 'height', 'fps'}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(str(index))
+    except Exception:
+        return None
+
+
+def save_camera_config(index: int, config: dict | None, path: str = CAMERA_CONFIG_FILE):
+    """Remember (or with config=None forget) the winning combo for a camera index"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except Exception:
+        cache = {}
+    if config is None:
+        cache.pop(str(index), None)
+    else:
+        cache[str(index)] = dict(config, saved_at=datetime.now().isoformat(timespec='seconds'))
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠ Could not save camera config: {e}")
+
+
+def open_best_camera(status_cb=None, index: int = 0) -> tuple[cv2.VideoCapture | None, dict | None]:
+    """Try several backend/codec/resolution combos and return the first non-black feed.
+    The combo that worked last time for this camera (camera_config_cache.json) is tried first;
+    the full probe only runs if it no longer works.
+    status_cb: optional callable(str) to report progress.
+    index: camera index to open (default 0).
+    """
+    def say(msg: str):
+        if status_cb:
+            status_cb(msg)
+        else:
+            print(msg)
+
+    start = time.time()
+    cached = load_camera_config(index)
+    if cached:
+        say(f"Trying cached camera {index} config {cached.get('codec') or 'DEFAULT'} "
+            f"{cached.get('width')}x{cached.get('height')}@{cached.get('fps')}...")
+        try:
+            cap, meta = try_open_camera(index, int(cached['backend']), cached.get('codec'), int(cached['width']),
+                                        int(cached['height']), int(cached['fps']), warmup_frames=30)
+        except Exception:
+            cap, meta = None, None
+        if cap is not None:
+            say(f"✓ Selected (cached, {time.time() - start:.2f}s): {meta}")
+            return cap, meta
+        say("⚠ Cached camera config failed, probing again...")
+        save_camera_config(index, None)
+
+    msmf = getattr(cv2, 'CAP_MSMF', 1400)
+    dshow = getattr(cv2, 'CAP_DSHOW', 700)
+    anyb = getattr(cv2, 'CAP_ANY', 0)
+
+    combos = [
+        # backend, codec, warmup_frames
+        (msmf, None, 60),         # MSMF default
+        (msmf, 'YUYV', 60),       # MSMF YUYV
+        (msmf, 'MJPG', 40),       # MSMF MJPEG
+        (dshow, 'MJPG', 30),      # DSHOW MJPEG (common fix on Windows)
+        (dshow, None, 30),        # DSHOW default
+        (anyb, None, 30),         # Any
+    ]
+    resolutions = [(1280, 720), (640, 480)]
+    fps_list = [30, 25]
+
+    # Probing stays sequential: most drivers refuse a second open of the same device
+    unavailable = set()
+    for backend, codec, warmup in combos:
+        for (w, h) in resolutions:
+            for fps in fps_list:
+                if backend in unavailable:
+                    break
+                say(f"Trying camera {index} backend={backend} codec={codec or 'DEFAULT'} {w}x{h}@{fps}...")
+                cap, meta = try_open_camera(index, backend, codec, w, h, fps, warmup)
+                if cap is not None:
+                    say(f"✓ Selected ({time.time() - start:.2f}s): {meta}")
+                    save_camera_config(index, {'backend': backend, 'codec': codec,
+                                               'width': w, 'height': h, 'fps': fps})
+                    return cap, meta
+                if meta and meta.get('failure') == 'open':
+                    # The backend cannot open this device at all; other modes will not help
+                    unavailable.add(backend)
+    say("✗ No working camera combination found (all black/failed)")
+    return None, None
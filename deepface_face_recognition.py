@@ -7,7 +7,13 @@ import numpy as np
 import os
 from datetime import datetime
 import pickle
+from attendance_store import get_ledger
+from embedding_cache import EmbeddingCache, CACHE_FILENAME
 from deepface import DeepFace
+from facenet_embedder import get_embedder, crop_faces
+from face_gallery import FaceGallery
+from adaptive_sampler import AdaptiveSampler
+from calibrate_threshold import load_threshold
 
 class DeepFaceRecognitionAttendance:
     def __init__(self):
@@ -30,31 +36,33 @@ class DeepFaceRecognitionAttendance:
 
         self.known_face_encodings = []
         self.known_face_names = []
+        cache = EmbeddingCache(os.path.join(images_folder, CACHE_FILENAME))
 
-        # Get all subdirectories (each student has their own folder)
-        for student_name in os.listdir(images_folder):
+        # Every image of every student folder; cache misses are embedded in a process pool
+        items = []
+        for student_name in sorted(os.listdir(images_folder)):
             student_path = os.path.join(images_folder, student_name)
-
             if os.path.isdir(student_path):
-                print(f"Processing: {student_name}")
-
-                # Process all images for this student
-                for image_file in os.listdir(student_path):
+                for image_file in sorted(os.listdir(student_path)):
                     if image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        image_path = os.path.join(student_path, image_file)
-
-                        try:
-                            # Use DeepFace to represent (encode) the face
-                            embedding = DeepFace.represent(img_path=image_path, model_name="Facenet", enforce_detection=False)
+                        items.append((student_name, image_file, os.path.join(student_path, image_file)))
+
+        if items:
+            from bulk_enroll import embed_images
+            embeddings = embed_images([path for _, _, path in items], cache=cache)
+            for (student_name, image_file, _), embedding in zip(items, embeddings):
+                if embedding is not None:
+                    self.known_face_encodings.append(embedding)
+                    self.known_face_names.append(student_name)
+                    print(f"  ✓ {student_name}: encoded face from {image_file}")
+                else:
+                    print(f"  ✗ {student_name}: no face found in {image_file}")
 
-                            if len(embedding) > 0:
-                                self.known_face_encodings.append(embedding[0]['embedding'])
-                                self.known_face_names.append(student_name)
-                                print(f"  ✓ Encoded face from {image_file}")
-                            else:
-                                print(f"  ✗ No face found in {image_file}")
-                        except Exception as e:
-                            print(f"  ✗ Error processing {image_file}: {str(e)}")
+        try:
+            cache.save()
+        except Exception as e:
+            print(f"⚠ Could not save embedding cache: {e}")
+        print(cache.report())
 
         if len(self.known_face_encodings) == 0:
             print(f"No faces found in {images_folder} folder!")
@@ -96,32 +104,21 @@ class DeepFaceRecognitionAttendance:
         return False
 
     def mark_attendance(self, name):
-        """Mark attendance in CSV file"""
-        # Create file with header if it doesn't exist
-        if not os.path.exists(self.attendance_file):
-            with open(self.attendance_file, 'w') as f:
-                f.write("Name,Date,Time\n")
-
-        # Check if already marked today
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        with open(self.attendance_file, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if name in line and today in line:
-                    return False  # Already marked
-
-        # Mark attendance
-        with open(self.attendance_file, 'a') as f:
-            now = datetime.now()
-            date_string = now.strftime("%Y-%m-%d")
-            time_string = now.strftime("%H:%M:%S")
-            f.write(f"{name},{date_string},{time_string}\n")
-
-        return True
-
-    def start_recognition(self):
-        """Start face recognition from webcam using DeepFace"""
+        """Mark attendance in CSV file (once per name per day)"""
+        # The whole file is indexed once; the duplicate check is an exact (Name, Date) lookup
+        ledger = get_ledger(self.attendance_file, header=["Name", "Date", "Time"], key_columns=(0, 1),
+                            lineterminator="\n")
+        now = datetime.now()
+        return ledger.mark([name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")])
+
+    def start_recognition(self, budget=5.0, threshold=None):
+        """
+        Start face recognition from webcam using DeepFace
+
+        Args:
+            budget: Embeddings per second the adaptive sampler may spend
+            threshold: Cosine similarity needed to mark (default: calibrated for FACE_TARGET_FAR, else 0.85)
+        """
         if not self.is_trained:
             print("❌ Model not trained! Please train first.")
             return
@@ -146,10 +143,12 @@ class DeepFaceRecognitionAttendance:
         print("✓ Camera opened successfully")
         print("Looking for faces...\n")
 
+        gallery = FaceGallery.from_lists(self.known_face_names, self.known_face_encodings)
+        threshold = load_threshold(default=0.85) if threshold is None else threshold
         marked_today = set()
-        frame_count = 0
-        process_every_n_frames = 30  # Process only every 30th frame to avoid lag
-        temp_image_path = "temp_frame.jpg"
+        # Recognize often while people move, almost never on a static scene
+        sampler = AdaptiveSampler(budget=budget)
+        embedder = get_embedder("Facenet", detector_backend="opencv")
 
         while True:
             ret, frame = video_capture.read()
@@ -158,63 +157,46 @@ class DeepFaceRecognitionAttendance:
                 print("Failed to grab frame")
                 continue
 
-            # Only process face recognition every N frames
-            frame_count += 1
-            should_process = (frame_count % process_every_n_frames == 0)
+            should_process = sampler.should_process(frame)
 
             if should_process:
-                # Save frame temporarily for DeepFace
-                temp_image_path = "temp_frame.jpg"
-                cv2.imwrite(temp_image_path, frame)
-
                 try:
-                    # Use DeepFace to find faces in the frame
-                    faces = DeepFace.extract_faces(img_path=temp_image_path, enforce_detection=False, detector_backend='opencv')
-
-                    for face_data in faces:
-                        facial_area = face_data['facial_area']
-                        x, y, w, h = facial_area['x'], facial_area['y'], facial_area['w'], facial_area['h']
-
-                        # Get face embedding
-                        embedding = DeepFace.represent(img_path=temp_image_path, model_name="Facenet", enforce_detection=False, detector_backend='opencv')
-
-                        if len(embedding) > 0:
-                            face_embedding = embedding[0]['embedding']
-
-                            # Compare with known faces
-                            min_distance = float('inf')
-                            best_match_name = "Unknown"
-
-                            for known_embedding, name in zip(self.known_face_encodings, self.known_face_names):
-                                # Calculate cosine distance
-                                distance = np.linalg.norm(np.array(known_embedding) - np.array(face_embedding))
-                                if distance < min_distance:
-                                    min_distance = distance
-                                    best_match_name = name
-
-                            # Threshold for recognition
-                            if min_distance < 0.8:  # Adjust threshold as needed
-                                name = best_match_name
-                                color = (0, 255, 0)  # Green for recognized
-
-                                # Mark attendance
-                                if name not in marked_today:
-                                    if self.mark_attendance(name):
-                                        print(f"✓ Attendance marked: {name} at {datetime.now().strftime('%H:%M:%S')}")
-                                        marked_today.add(name)
-                            else:
-                                name = "Unknown"
-                                color = (0, 0, 255)  # Red for unknown
-
-                            # Draw rectangle around face
-                            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-
-                            # Draw label with name
-                            confidence = max(0, int((1 - min_distance) * 100))
-                            label_text = f"{name} ({confidence}%)"
-                            cv2.rectangle(frame, (x, y + h - 35), (x + w, y + h), color, cv2.FILLED)
-                            cv2.putText(frame, label_text, (x + 6, y + h - 6),
-                                        cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
+                    # Detect once, then embed all face crops in one forward pass
+                    boxes = embedder.detect(frame)
+                    sampler.record(len(boxes))
+                    embeddings = embedder.embed_batch(crop_faces(frame, boxes)) if boxes else []
+                    found = [i for i, emb in enumerate(embeddings) if emb is not None]
+                    # Compare with known faces (one matrix product for every face)
+                    matches = gallery.match_batch([embeddings[i] for i in found]) if found else []
+
+                    for i, match in zip(found, matches):
+                        x, y, w, h = boxes[i]
+                        similarity = match.similarity
+                        best_match_name = match.name
+
+                        # Threshold for recognition
+                        if similarity >= threshold:
+                            name = best_match_name
+                            color = (0, 255, 0)  # Green for recognized
+
+                            # Mark attendance
+                            if name not in marked_today:
+                                if self.mark_attendance(name):
+                                    print(f"✓ Attendance marked: {name} at {datetime.now().strftime('%H:%M:%S')}")
+                                    marked_today.add(name)
+                        else:
+                            name = "Unknown"
+                            color = (0, 0, 255)  # Red for unknown
+
+                        # Draw rectangle around face
+                        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+
+                        # Draw label with name
+                        confidence = max(0, int(similarity * 100))
+                        label_text = f"{name} ({confidence}%)"
+                        cv2.rectangle(frame, (x, y + h - 35), (x + w, y + h), color, cv2.FILLED)
+                        cv2.putText(frame, label_text, (x + 6, y + h - 6),
+                                    cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
 
                 except Exception as e:
                     # Silently continue if face detection fails
@@ -236,17 +218,11 @@ class DeepFaceRecognitionAttendance:
         # Cleanup
         video_capture.release()
         cv2.destroyAllWindows()
-        
-        # Clean up temp file
-        try:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        except:
-            pass
 
         print("\n" + "="*50)
         print("Attendance Session Completed")
         print(f"Total people recognized: {len(marked_today)}")
+        print(f"Frames recognized: {sampler.processed}/{sampler.frames}")
         print(f"Attendance saved to: {self.attendance_file}")
         print("="*50)
 
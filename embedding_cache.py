@@ -0,0 +1,156 @@
+"""
+Persistent Embedding Cache for Enrolment Images
+Remembers the embedding of every known-face image keyed by
+(content sha1, model name, detector backend), so a restart only re-embeds
+new or modified images. Unchanged files are recognized from size + mtime
+without re-hashing; images deleted from disk are evicted on save.
+"""
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+
+CACHE_FILENAME = ".embedding_cache.pkl"
+CACHE_VERSION = 1
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk cache: {(sha1, model, detector): embedding} plus a per-path
+    (size, mtime) record for the no-hash fast path
+    """
+
+    def __init__(self, cache_path, model_name="Facenet", detector_backend="opencv"):
+        """
+        Args:
+            cache_path: Pickle file (e.g. images/.embedding_cache.pkl)
+            model_name: DeepFace model used for the embeddings
+            detector_backend: DeepFace detector used for the embeddings
+        """
+        self.cache_path = cache_path
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self._embeddings = {}   # (sha1, model, detector) -> float32 vector or None (no face)
+        self._files = {}        # abs path -> (size, mtime_ns, sha1)
+        self._seen = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'rb') as f:
+                state = pickle.load(f)
+            if state.get('version') == CACHE_VERSION:
+                self._embeddings = state['embeddings']
+                self._files = state['files']
+        except Exception as e:
+            print(f"⚠ Ignoring unreadable embedding cache {self.cache_path}: {e}")
+
+    def _key(self, sha1):
+        return (sha1, self.model_name, self.detector_backend)
+
+    def _content_hash(self, path):
+        st = os.stat(path)
+        record = self._files.get(path)
+        if record and record[0] == st.st_size and record[1] == st.st_mtime_ns:
+            return record[2]
+        sha1 = file_sha1(path)
+        self._files[path] = (st.st_size, st.st_mtime_ns, sha1)
+        return sha1
+
+    def get_or_compute(self, image_path, compute_fn):
+        """
+        Return the cached embedding for an image, computing it on a miss
+
+        Args:
+            image_path: Image file
+            compute_fn: Callable(image_path) -> embedding or None (no face found)
+
+        Returns:
+            float32 embedding or None
+        """
+        path = os.path.abspath(image_path)
+        self._seen.add(path)
+        key = self._key(self._content_hash(path))
+        if key in self._embeddings:
+            self.hits += 1
+            return self._embeddings[key]
+
+        self.misses += 1
+        embedding = compute_fn(image_path)  # exceptions propagate and are not cached
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        self._embeddings[key] = embedding
+        return embedding
+
+    def lookup(self, image_path):
+        """
+        Cache lookup without computing
+
+        Returns:
+            Tuple (found, embedding); embedding may be None for "no face" entries
+        """
+        path = os.path.abspath(image_path)
+        self._seen.add(path)
+        key = self._key(self._content_hash(path))
+        if key in self._embeddings:
+            self.hits += 1
+            return True, self._embeddings[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, image_path, embedding):
+        """Store an embedding computed elsewhere (e.g. by a worker process)"""
+        path = os.path.abspath(image_path)
+        self._seen.add(path)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        self._embeddings[self._key(self._content_hash(path))] = embedding
+
+    def prune(self):
+        """Evict files not seen in this run (deleted/moved) and embeddings nobody references"""
+        for path in list(self._files):
+            if path not in self._seen and not os.path.exists(path):
+                del self._files[path]
+        # Entries of other model/detector combos survive as long as their file exists
+        live = {record[2] for record in self._files.values()}
+        for key in list(self._embeddings):
+            if key[0] not in live:
+                del self._embeddings[key]
+                self.evicted += 1
+
+    def save(self):
+        """Prune and write the cache atomically"""
+        self.prune()
+        folder = os.path.dirname(self.cache_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'saved_at': time.time(),
+                         'embeddings': self._embeddings, 'files': self._files}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        """One-line summary for CLI output"""
+        return (f"Embedding cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate * 100:.1f}% hit rate), {self.evicted} evicted")
@@ -0,0 +1,439 @@
+"""
+Packed FaceNet Embedding Store
+Replaces one *_encoding.pkl per student with a single float32 matrix
+(memory-mapped on load) plus a JSON manifest (facenet_gallery.json) holding
+the format version, model, student IDs and names.
+
+Every write creates NEW data files named after a generation counter
+(facenet_gallery.<gen>.npy, facenet_gallery_templates.<gen>.npy) and then
+os.replace's the manifest that points at them. The manifest swap is the only
+commit point: a crash at any earlier moment leaves the previous manifest and
+the files it references untouched. Files older than the previous generation
+are deleted after the swap.
+
+Writers (extend/enroll/migration) hold an exclusive lock on
+facenet_gallery.lock for the whole load -> modify -> write sequence, so
+enrolments from different EmbeddingStore instances, threads or processes
+never overwrite each other's manifest. Readers take no lock.
+
+Version 2 added per-student templates: the matrix holds one robust centroid
+per student (what load() returns, as before) and the templates file the
+individual enrolment embeddings, grouped by student in row order
+('template_counts' in the manifest). Version 3 added the generation files;
+version 1/2 stores (fixed facenet_gallery.npy / facenet_gallery_templates.npy
+names) load unchanged and are rewritten as generations on the next write.
+
+Usage:
+  python embedding_store.py --migrate                 # merge student_images/*_encoding.pkl into the store
+  python embedding_store.py --info
+"""
+import argparse
+import json
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+
+from face_templates import DEFAULT_MAX_TEMPLATES, build_templates
+
+STORE_VERSION = 3
+STORE_PREFIX = "facenet_gallery"   # -> facenet_gallery.json + facenet_gallery.<gen>.npy
+TEMPLATES_SUFFIX = "_templates.npy"
+LOCK_SUFFIX = ".lock"
+
+_folder_locks = {}   # lock file path -> threading.Lock shared by every store of the folder
+_folder_locks_guard = threading.Lock()
+
+
+def parse_encoding_filename(filename):
+    """'ID_NAME_encoding.pkl' -> (id, name); names may contain spaces/underscores"""
+    base_name = filename.replace('_encoding.pkl', '')
+    parts = base_name.split('_', 1)  # split only on first underscore
+    if len(parts) >= 2:
+        return parts[0], parts[1]
+    return parts[0], parts[0]
+
+
+def _lock_file(fd):
+    if os.name == 'nt':
+        import msvcrt
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue  # LK_LOCK gives up after ~10 s; keep waiting for the other writer
+    else:
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock_file(fd):
+    if os.name == 'nt':
+        import msvcrt
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class StoreLock:
+    """
+    Exclusive writer lock of one store: a threading lock shared by every EmbeddingStore
+    of the folder in this process, plus an OS file lock for other processes
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with _folder_locks_guard:
+            self._thread_lock = _folder_locks.setdefault(os.path.abspath(path), threading.Lock())
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            _lock_file(self._fd)
+        except BaseException:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            _unlock_file(self._fd)
+            os.close(self._fd)
+        finally:
+            self._fd = None
+            self._thread_lock.release()
+
+
+class EmbeddingStore:
+    """
+    Single-file gallery of enrolled embeddings
+    """
+
+    def __init__(self, folder="student_images", prefix=STORE_PREFIX, model_name="Facenet"):
+        self.folder = folder
+        self.prefix = prefix
+        self.model_name = model_name
+        self.manifest_path = os.path.join(folder, prefix + ".json")
+        # Fixed data file names of version 1/2 stores (generation 0)
+        self.legacy_matrix_path = os.path.join(folder, prefix + ".npy")
+        self.legacy_templates_path = os.path.join(folder, prefix + TEMPLATES_SUFFIX)
+        self._generation_file = re.compile(re.escape(prefix) + r"(_templates)?\.(\d+)\.npy$")
+        self._lock = StoreLock(os.path.join(folder, prefix + LOCK_SUFFIX))
+
+    def _paths(self, manifest):
+        """(matrix, templates) files referenced by a manifest"""
+        if 'matrix_file' not in manifest:
+            return self.legacy_matrix_path, self.legacy_templates_path
+        templates_file = manifest.get('templates_file')
+        return (os.path.join(self.folder, manifest['matrix_file']),
+                os.path.join(self.folder, templates_file) if templates_file else None)
+
+    def _committed(self):
+        """Manifest of the committed store, or None when there is no store"""
+        if not os.path.exists(self.manifest_path):
+            return None
+        manifest = self._read_manifest()
+        return manifest if os.path.exists(self._paths(manifest)[0]) else None
+
+    @property
+    def matrix_path(self):
+        """Matrix file of the committed store (the legacy name before the first write)"""
+        manifest = self._committed()
+        return self._paths(manifest)[0] if manifest else self.legacy_matrix_path
+
+    def exists(self):
+        return self._committed() is not None
+
+    def load(self, mmap=True):
+        """
+        Load the gallery
+
+        Args:
+            mmap: Memory-map the matrix instead of reading it into RAM
+
+        Returns:
+            Tuple (ids, names, matrix (N, D) float32); empty lists/array if missing
+        """
+        manifest = self._committed()
+        if manifest is None:
+            return [], [], np.zeros((0, 0), dtype=np.float32)
+        matrix = np.load(self._paths(manifest)[0], mmap_mode='r' if mmap else None)
+        count = manifest['count']
+        if len(matrix) < count:
+            raise ValueError(f"Embedding store is truncated ({len(matrix)} rows, manifest says {count})")
+        return list(manifest['ids']), list(manifest['names']), matrix[:count]
+
+    def _read_manifest(self):
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version', 0) > STORE_VERSION:
+            raise ValueError(f"Embedding store version {manifest['version']} is newer than supported ({STORE_VERSION})")
+        return manifest
+
+    def load_templates(self, mmap=True):
+        """
+        Load the per-student templates (version 2 stores)
+
+        Returns:
+            Tuple (ids, names, templates (T, D) float32), one entry per template;
+            empty for version 1 stores or students enrolled from a single sample
+        """
+        empty = [], [], np.zeros((0, 0), dtype=np.float32)
+        manifest = self._committed()
+        if manifest is None:
+            return empty
+        counts = manifest.get('template_counts') or []
+        total = sum(counts)
+        templates_path = self._paths(manifest)[1]
+        if not total or templates_path is None or not os.path.exists(templates_path):
+            return empty
+        templates = np.load(templates_path, mmap_mode='r' if mmap else None)
+        if len(templates) < total:
+            raise ValueError(f"Template file is truncated ({len(templates)} rows, manifest says {total})")
+        ids, names = [], []
+        for student_id, name, count in zip(manifest['ids'], manifest['names'], counts):
+            ids += [student_id] * count
+            names += [name] * count
+        return ids, names, templates[:total]
+
+    def _templates_per_row(self, count):
+        """Current templates of each student row as a list of (k, D) arrays (k may be 0)"""
+        manifest = self._committed()
+        if manifest is None:
+            return [None] * count
+        counts = manifest.get('template_counts') or [0] * count
+        _, _, templates = self.load_templates(mmap=False)
+        rows, start = [], 0
+        for k in counts[:count]:
+            rows.append(np.array(templates[start:start + k], dtype=np.float32) if k else None)
+            start += k
+        return rows + [None] * (count - len(rows))
+
+    def as_dict(self, mmap=True):
+        """{name: embedding} in the shape the recognizers used to build from pkl files"""
+        _, names, matrix = self.load(mmap=mmap)
+        return {name: matrix[i] for i, name in enumerate(names)}
+
+    def _write(self, ids, names, matrix, templates=None):
+        os.makedirs(self.folder, exist_ok=True)
+        previous = self._committed()
+        generation = (previous or {}).get('generation', 0) + 1
+
+        # Data files of a new generation are invisible until the manifest points at them
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        matrix_file = f"{self.prefix}.{generation}.npy"
+        np.save(os.path.join(self.folder, matrix_file), matrix)
+
+        templates = templates or [None] * len(ids)
+        counts = [0 if t is None else len(t) for t in templates]
+        templates_file = None
+        if sum(counts):
+            stacked = np.concatenate([t for t in templates if t is not None]).astype(np.float32)
+            templates_file = f"{self.prefix}_templates.{generation}.npy"
+            np.save(os.path.join(self.folder, templates_file), stacked)
+
+        manifest = {
+            'version': STORE_VERSION,
+            'model': self.model_name,
+            'generation': generation,
+            'matrix_file': matrix_file,
+            'templates_file': templates_file,
+            'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'count': len(ids),
+            'ids': list(ids),
+            'names': list(names),
+            'template_counts': counts,
+        }
+        tmp_manifest = self.manifest_path + ".tmp"
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_manifest, self.manifest_path)   # commit point
+        self._remove_old_generations(generation)
+
+    def _remove_old_generations(self, generation):
+        """
+        Delete data files older than the previous generation (the previous one stays for
+        readers that loaded the old manifest just before the swap). Legacy fixed-name
+        files count as generation 0; files still mapped elsewhere are retried next write.
+        """
+        if not os.path.isdir(self.folder):
+            return
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            if path in (self.legacy_matrix_path, self.legacy_templates_path):
+                old = 0
+            else:
+                found = self._generation_file.match(filename)
+                if not found:
+                    continue
+                old = int(found.group(2))
+            if old < generation - 1:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def append(self, student_id, name, embedding):
+        """
+        Add (or replace, for the same ID + name) one student's embedding (see extend).
+        If the store does not exist yet, legacy pkl files are migrated first.
+
+        Returns:
+            Row number of the student
+        """
+        return self.extend([(student_id, name, embedding)])[0]
+
+    def extend(self, records):
+        """
+        Add/replace many (student_id, name, embedding[, templates]) records with ONE rewrite,
+        under the store lock. A replaced student keeps no old templates unless new ones are given.
+
+        Returns:
+            Row number of each record
+        """
+        records = [(str(r[0]), r[1], np.asarray(r[2], dtype=np.float32).ravel(),
+                    None if len(r) < 4 or r[3] is None else np.asarray(r[3], dtype=np.float32).reshape(-1, len(r[2])))
+                   for r in records]
+        if not records:
+            return []
+        dim = len(records[0][2])
+        with self._lock:
+            if not self.exists():
+                self._migrate_locked()
+            ids, names, rows, templates = self._rows_locked()
+            if rows and len(rows[0]) != dim:
+                raise ValueError(f"Embedding has {dim} dims, store holds {len(rows[0])}")
+
+            positions = {key: i for i, key in enumerate(zip(ids, names))}
+            result = []
+            for student_id, name, vector, student_templates in records:
+                if len(vector) != dim:
+                    raise ValueError(f"Embedding for {name} has {len(vector)} dims, expected {dim}")
+                row = positions.get((student_id, name))
+                if row is None:
+                    ids.append(student_id)
+                    names.append(name)
+                    rows.append(vector)
+                    templates.append(student_templates)
+                    row = positions[(student_id, name)] = len(ids) - 1
+                else:
+                    rows[row] = vector
+                    templates[row] = student_templates
+                result.append(row)
+            self._write(ids, names, np.stack(rows), templates)
+            return result
+
+    def enroll(self, student_id, name, embeddings, max_templates=DEFAULT_MAX_TEMPLATES, **options):
+        """
+        Enrol one student from several embeddings: robust centroid row + capped templates
+
+        Args:
+            embeddings: Raw embeddings of the student (None entries are ignored)
+            max_templates: Cap on stored templates (None = every inlier)
+            **options: outlier_k / min_similarity for build_templates
+
+        Returns:
+            StudentTemplates, or None if no embedding was usable
+        """
+        result = build_templates(embeddings, max_templates=max_templates, **options)
+        if result is None:
+            return None
+        templates = result.templates if len(result.templates) > 1 else None
+        self.extend([(student_id, name, result.centroid, templates)])
+        return result
+
+    def _rows_locked(self):
+        """Committed store as editable lists (ids, names, vectors, templates per row)"""
+        ids, names, matrix = self.load(mmap=False)
+        ids, names = [str(i) for i in ids], list(names)
+        rows = list(np.array(matrix, dtype=np.float32).reshape(len(ids), -1)) if ids else []
+        return ids, names, rows, self._templates_per_row(len(ids))
+
+    def _migrate_locked(self):
+        """
+        Merge *_encoding.pkl rows into the store. Rows already in the store (same ID + name)
+        are kept as they are, as are students enrolled without a pkl and all templates.
+
+        Returns:
+            Number of rows added
+        """
+        ids, names, vectors, templates = self._rows_locked()
+        known = set(zip(ids, names))
+        added = 0
+        if os.path.isdir(self.folder):
+            for filename in sorted(os.listdir(self.folder)):
+                if not filename.endswith('_encoding.pkl'):
+                    continue
+                try:
+                    with open(os.path.join(self.folder, filename), 'rb') as f:
+                        vector = np.asarray(pickle.load(f), dtype=np.float32).ravel()
+                except Exception as e:
+                    print(f"⚠ Could not load {filename}: {e}")
+                    continue
+                if vectors and len(vector) != len(vectors[0]):
+                    print(f"⚠ Skipping {filename}: {len(vector)} dims, expected {len(vectors[0])}")
+                    continue
+                student_id, name = parse_encoding_filename(filename)
+                if (student_id, name) in known:
+                    continue
+                known.add((student_id, name))
+                ids.append(student_id)
+                names.append(name)
+                vectors.append(vector)
+                templates.append(None)
+                added += 1
+        if added:
+            self._write(ids, names, np.stack(vectors), templates)
+        return added
+
+    def migrate_from_pickles(self):
+        """Merge every *_encoding.pkl in the folder into the store; returns the rows added"""
+        with self._lock:
+            return self._migrate_locked()
+
+    def ensure(self):
+        """Migrate legacy pkl files once if the packed store does not exist yet"""
+        if self.exists():
+            return 0
+        count = self.migrate_from_pickles()
+        if count:
+            print(f"✓ Migrated {count} *_encoding.pkl files into {self.matrix_path}")
+        return count
+
+
+def main():
+    p = argparse.ArgumentParser(description="Packed FaceNet embedding store")
+    p.add_argument("--folder", default="student_images", help="Folder with *_encoding.pkl files")
+    p.add_argument("--migrate", action="store_true",
+                   help="Add *_encoding.pkl students missing from the store (existing rows and templates are kept)")
+    p.add_argument("--info", action="store_true", help="Print store contents")
+    args = p.parse_args()
+
+    store = EmbeddingStore(args.folder)
+    if args.migrate:
+        count = store.migrate_from_pickles()
+        print(f"✓ Added {count} encodings from *_encoding.pkl files to {store.matrix_path}")
+    if args.info or not args.migrate:
+        ids, names, matrix = store.load()
+        _, template_names, _ = store.load_templates()
+        print(f"Store: {store.matrix_path} ({len(ids)} students, {len(template_names)} templates, "
+              f"dim {matrix.shape[1] if len(ids) else 0})")
+        for student_id, name in zip(ids, names):
+            print(f"  {student_id}: {name} ({template_names.count(name)} templates)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+FACE ALIGNMENT EVALUATION
+Measures what landmark alignment buys the live recognizer. Every enrolment
+photo (images/<Name>/*.jpg, student_images/*.jpg) is turned into a short
+"walk-up" sequence of frames with in-plane head tilt and scale changes; each
+frame is detected, cropped either the old way (box + 20px padding) or
+aligned to the FaceNet template, embedded and matched against a gallery
+built from the untouched photos with the SAME preprocessing (what the
+enrolment paths store for that mode: padded crops, or aligned crops).
+
+Reported per mode (raw / aligned):
+- first-try rate:   sequences marked correctly on their FIRST embedding
+- embeddings/mark:  embeddings spent until the correct mark (marked sequences)
+- missed:           sequences never marked at the threshold
+- false marks:      frames over the threshold for the WRONG person
+- genuine sim:      mean similarity to the true identity
+
+Usage:
+  python evaluate_alignment.py
+  python evaluate_alignment.py --detector yunet --threshold 0.85 --angles 20 -15 10 -5 0
+  python evaluate_alignment.py --folders my_photos --scales 1.0 0.8
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+from benchmark_detectors import sample_images
+from face_alignment import FaceAligner, align_largest_face
+from face_detector import DETECTOR_BACKENDS, create_detector
+from face_gallery import FaceGallery
+from facenet_embedder import get_embedder, crop_faces
+
+
+def identity_of(path, folders):
+    """images/<Name>/x.jpg -> Name; student_images/<id>_<Name>.jpg -> file stem"""
+    parent = os.path.basename(os.path.dirname(path))
+    if parent not in {os.path.basename(os.path.normpath(f)) for f in folders}:
+        return parent
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def walk_up_frames(img, angles, scales):
+    """Tilted/scaled copies of a photo (rotation about the image centre)"""
+    h, w = img.shape[:2]
+    frames = []
+    for i, angle in enumerate(angles):
+        scale = scales[i % len(scales)]
+        matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, scale)
+        frames.append(cv2.warpAffine(img, matrix, (w, h), borderMode=cv2.BORDER_REPLICATE))
+    return frames
+
+
+def largest_face(detector, frame):
+    detections = detector.detect_faces(frame)
+    if not detections:
+        return None
+    return max(detections, key=lambda d: d.box[2] * d.box[3])
+
+
+def face_crop(mode, detector, aligner, img):
+    """Crop of the largest face as the live loop cuts it in this mode, or None"""
+    if mode == "aligned":
+        return align_largest_face(detector, aligner, img)
+    det = largest_face(detector, img)
+    return crop_faces(img, [det.box], padding=20, min_size=50)[0] if det is not None else None
+
+
+def build_gallery(mode, embedder, detector, photos):
+    """One template per photo, cropped like the probes of this mode and embedded in one batch"""
+    aligner = FaceAligner()  # own instance: alignment stats below count probes only
+    found = [(name, face_crop(mode, detector, aligner, img)) for name, img in photos]
+    found = [(name, crop) for name, crop in found if crop is not None]
+    embeddings = embedder.embed_batch([crop for _, crop in found]) if found else []
+    names = [name for (name, _), emb in zip(found, embeddings) if emb is not None]
+    templates = [np.asarray(emb, dtype=np.float32) for emb in embeddings if emb is not None]
+    return names, (np.stack(templates) if templates else None)
+
+
+def evaluate(mode, sequences, detector, aligner, embedder, gallery, template_names, threshold):
+    template_names = np.asarray(template_names)
+    first_try, missed, false_marks, spent = 0, 0, 0, []
+    genuine = []
+    for name, frames in sequences:
+        embeddings = 0
+        marked = False
+        for frame in frames:
+            crop = face_crop(mode, detector, aligner, frame)
+            if crop is None:
+                continue
+            emb = embedder.embed_batch([crop])[0]
+            if emb is None:
+                continue
+            embeddings += 1
+            match = gallery.match_batch([emb])[0]
+            scores, _ = gallery.similarities(emb)
+            genuine.append(float(scores[0][template_names == name].max()))
+            if match.similarity >= threshold:
+                if match.name == name:
+                    marked = True
+                    break
+                false_marks += 1
+        if marked:
+            spent.append(embeddings)
+            first_try += embeddings == 1
+        else:
+            missed += 1
+    count = max(len(sequences), 1)
+    return {
+        'first_try': first_try / count,
+        'embeddings_per_mark': float(np.mean(spent)) if spent else float('nan'),
+        'missed': missed,
+        'false_marks': false_marks,
+        'genuine_similarity': float(np.mean(genuine)) if genuine else float('nan'),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="First-try match rate of raw vs landmark-aligned face crops")
+    p.add_argument("--folders", nargs="+", default=["images", "student_images"], help="Folders with one-face photos")
+    p.add_argument("--detector", choices=sorted(DETECTOR_BACKENDS), default=None,
+                   help="Live face detector (default: FACE_DETECTOR_BACKEND or haar)")
+    p.add_argument("--threshold", type=float, default=0.85, help="Cosine similarity needed to mark")
+    p.add_argument("--angles", type=float, nargs="+", default=[20, -15, 10, -5, 0],
+                   help="Head tilt (degrees) of each frame of a walk-up sequence")
+    p.add_argument("--scales", type=float, nargs="+", default=[0.8, 0.9, 1.0],
+                   help="Scale of each frame (cycled)")
+    args = p.parse_args()
+
+    photos = []
+    for path in sample_images(args.folders):
+        img = cv2.imread(path)
+        if img is not None:
+            photos.append((identity_of(path, args.folders), img))
+    if not photos:
+        print("✗ No sample images found")
+        return
+
+    embedder = get_embedder("Facenet")
+    detector = create_detector(args.detector, scale=0.5)
+    aligner = FaceAligner()
+    galleries = {mode: build_gallery(mode, embedder, detector, photos) for mode in ("raw", "aligned")}
+    # Only photos enrolled in both modes, so both modes replay the same sequences
+    enrolled = set(galleries["raw"][0]) & set(galleries["aligned"][0])
+    if not enrolled:
+        print("✗ No photo could be enrolled")
+        return
+    sequences = [(name, walk_up_frames(img, args.angles, args.scales)) for name, img in photos if name in enrolled]
+
+    print(f"{len(sequences)} sequences x {len(args.angles)} frames, {len(enrolled)} identities, "
+          f"detector={detector.name}, threshold={args.threshold}")
+    print(f"{'mode':<8} {'first-try':>10} {'emb/mark':>9} {'missed':>7} {'false':>6} {'genuine sim':>12}")
+    print("-" * 57)
+    for mode in ("raw", "aligned"):
+        names, matrix = galleries[mode]
+        gallery = FaceGallery.from_matrix(names, matrix)
+        r = evaluate(mode, sequences, detector, aligner, embedder, gallery, names, args.threshold)
+        print(f"{mode:<8} {r['first_try'] * 100:>9.0f}% {r['embeddings_per_mark']:>9.2f} {r['missed']:>7} "
+              f"{r['false_marks']:>6} {r['genuine_similarity']:>12.3f}")
+    print(f"Alignment sources: {aligner.stats()}")
+
+
+if __name__ == "__main__":
+    main()
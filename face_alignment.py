@@ -0,0 +1,184 @@
+"""
+Landmark-Based Face Alignment
+Warps a detected face to the canonical 160x160 FaceNet template with ONE
+cv2.warpAffine (rotation + uniform scale + translation), so the embedder
+always sees eyes, nose and mouth at the same place.
+
+Landmark sources, best first:
+- 5 points from the detector (YuNet: eyes, nose tip, mouth corners)
+- Eye centres from an eye cascade (haarcascade_eye.xml) inside the box
+- None: the padded box is scaled onto the template (no rotation)
+"""
+import os
+
+import cv2
+import numpy as np
+
+TEMPLATE_SIZE = 160
+
+# Reference positions of (right eye, left eye, nose, right mouth, left mouth) in the
+# widely used 112x112 ArcFace template, scaled to 160x160
+FACENET_TEMPLATE = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32) * (TEMPLATE_SIZE / 112.0)
+
+EYE_CASCADE_FILE = "haarcascade_eye.xml"
+
+
+def _load_eye_cascade():
+    data_dir = getattr(getattr(cv2, 'data', None), 'haarcascades', '')
+    for path in (os.path.join(data_dir, EYE_CASCADE_FILE), EYE_CASCADE_FILE):
+        if os.path.exists(path):
+            cascade = cv2.CascadeClassifier(path)
+            if not cascade.empty():
+                return cascade
+    return None
+
+
+def similarity_from_eyes(left_eye, right_eye, template=FACENET_TEMPLATE):
+    """2x3 similarity transform mapping the two eye centres onto the template eyes"""
+    src = np.array([left_eye, right_eye], dtype=np.float32)
+    dst = template[:2]
+    src_vec, dst_vec = src[1] - src[0], dst[1] - dst[0]
+    scale = np.linalg.norm(dst_vec) / max(np.linalg.norm(src_vec), 1e-6)
+    angle = np.arctan2(dst_vec[1], dst_vec[0]) - np.arctan2(src_vec[1], src_vec[0])
+    cos, sin = scale * np.cos(angle), scale * np.sin(angle)
+    rotation = np.array([[cos, -sin], [sin, cos]], dtype=np.float32)
+    shift = dst.mean(axis=0) - rotation @ src.mean(axis=0)
+    return np.hstack([rotation, shift[:, None]]).astype(np.float32)
+
+
+class FaceAligner:
+    """
+    Aligns face crops to the FaceNet template
+    """
+
+    def __init__(self, size=TEMPLATE_SIZE, use_eye_cascade=True, box_padding=0.15):
+        """
+        Args:
+            size: Output size (square); the template is scaled to it
+            use_eye_cascade: Look for eyes when the detector gave no landmarks
+            box_padding: Fraction of the box added on each side when no landmarks are found
+        """
+        self.size = size
+        self.template = FACENET_TEMPLATE * (size / float(TEMPLATE_SIZE))
+        self.box_padding = box_padding
+        self.eye_cascade = _load_eye_cascade() if use_eye_cascade else None
+
+        # Stats
+        self.by_landmarks = 0
+        self.by_eyes = 0
+        self.by_box = 0
+
+    def _find_eyes(self, frame, box):
+        """Eye centres (left-in-image first) from the upper half of the face box, or None"""
+        if self.eye_cascade is None:
+            return None
+        x, y, w, h = box
+        roi = frame[y:y + h // 2, x:x + w]
+        if roi.size == 0:
+            return None
+        gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        min_eye = max(8, w // 8)
+        eyes = self.eye_cascade.detectMultiScale(gray, 1.1, 5, minSize=(min_eye, min_eye))
+        if len(eyes) < 2:
+            return None
+        # Two largest detections, ordered left to right in the image
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        centres = sorted([(x + ex + ew / 2.0, y + ey + eh / 2.0) for ex, ey, ew, eh in eyes])
+        if abs(centres[1][0] - centres[0][0]) < w * 0.2:
+            return None  # both hits on the same eye
+        return centres
+
+    def transform(self, frame, box, landmarks=None):
+        """
+        2x3 matrix mapping the frame onto the aligned crop
+
+        Args:
+            frame: Full frame
+            box: (x, y, w, h) face box
+            landmarks: Optional (5, 2) detector landmarks in frame coordinates
+        """
+        if landmarks is not None and len(landmarks) == 5:
+            matrix, _ = cv2.estimateAffinePartial2D(np.asarray(landmarks, dtype=np.float32), self.template,
+                                                    method=cv2.LMEDS)
+            if matrix is not None:
+                self.by_landmarks += 1
+                return matrix.astype(np.float32)
+
+        eyes = self._find_eyes(frame, box)
+        if eyes is not None:
+            self.by_eyes += 1
+            return similarity_from_eyes(eyes[0], eyes[1], self.template)
+
+        # No landmarks: scale the padded box onto the output (same as a resized crop)
+        self.by_box += 1
+        x, y, w, h = box
+        side = max(w, h) * (1.0 + 2 * self.box_padding)
+        scale = self.size / max(side, 1.0)
+        cx, cy = x + w / 2.0, y + h / 2.0
+        return np.array([[scale, 0, self.size / 2.0 - scale * cx],
+                         [0, scale, self.size / 2.0 - scale * cy]], dtype=np.float32)
+
+    def align(self, frame, box, landmarks=None):
+        """
+        Aligned size x size crop of one face (one warpAffine)
+
+        Returns:
+            BGR crop, or None for empty boxes
+        """
+        if frame is None or frame.size == 0 or box[2] <= 0 or box[3] <= 0:
+            return None
+        box = tuple(int(v) for v in box)
+        matrix = self.transform(frame, box, landmarks)
+        return cv2.warpAffine(frame, matrix, (self.size, self.size), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
+
+    def align_many(self, frame, boxes, landmarks=None):
+        """
+        Align several faces of one frame
+
+        Args:
+            boxes: (x, y, w, h) boxes
+            landmarks: Optional {box: (5, 2) landmarks}
+
+        Returns:
+            List of crops aligned with boxes
+        """
+        landmarks = landmarks or {}
+        return [self.align(frame, box, landmarks.get(tuple(int(v) for v in box))) for box in boxes]
+
+    def stats(self):
+        """How many crops were aligned by landmarks, eyes or box only"""
+        return {'landmarks': self.by_landmarks, 'eyes': self.by_eyes, 'box_only': self.by_box}
+
+
+def align_largest_face(detector, aligner, image, whole_image=False):
+    """
+    Aligned crop of the largest face in a photo or captured frame, cut the way the
+    live loops cut probes (same detector, same template), so enrolment, calibration
+    and recognition embed the same kind of crop
+
+    Args:
+        detector: FaceDetector (face_detector.create_detector)
+        aligner: FaceAligner
+        image: BGR image
+        whole_image: Use the whole image as the face box when nothing is detected
+                     (tight face crops such as unknown_faces/ snapshots)
+
+    Returns:
+        BGR crop, or None when no face was found
+    """
+    if image is None or image.size == 0:
+        return None
+    detections = detector.detect_faces(image)
+    if detections:
+        best = max(detections, key=lambda d: d.box[2] * d.box[3])
+        return aligner.align(image, best.box, best.landmarks)
+    if whole_image:
+        return aligner.align(image, (0, 0, image.shape[1], image.shape[0]))
+    return None
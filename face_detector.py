@@ -0,0 +1,386 @@
+"""
+Pluggable Face Detection
+Interchangeable detector backends with one output format:
+  haar   - Haar cascade (repo default), run on a downscaled copy
+  dnn    - OpenCV DNN ResNet-10 SSD (Caffe), models/deploy.prototxt +
+           models/res10_300x300_ssd_iter_140000.caffemodel
+           (OpenCV samples/dnn/face_detector)
+  yunet  - YuNet via cv2.FaceDetectorYN (OpenCV >= 4.5.4),
+           models/face_detection_yunet_2023mar.onnx (opencv_zoo)
+
+Every backend returns Detection(box, score, landmarks) in full-resolution
+coordinates (landmarks: 5 (x, y) points for YuNet, None otherwise) and
+detect() keeps the plain (N, 4) box array the live loops already use.
+The backend is chosen per deployment with create_detector(backend) or the
+FACE_DETECTOR_BACKEND environment variable; missing model files fall back
+to Haar with a warning.
+
+Per-frame budget: create_detector(budget_ms=...) (live loops: the
+FACE_DETECTOR_BUDGET_MS environment variable) wraps the backend in a
+BudgetedDetector. When detection runs over the budget it lowers the
+detection scale step by step (haar, yunet) and raises it again once there
+is headroom; at the smallest scale, or for backends without one (dnn), the
+previous detections are reused for the frames the overrun took.
+"""
+import os
+import time
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+CASCADE_FILE = "haarcascade_frontalface_default.xml"
+HAAR_WINDOW = 24  # training window of the frontal-face cascade: nothing smaller is found
+
+MODELS_DIR = "models"
+SSD_PROTOTXT = "deploy.prototxt"
+SSD_WEIGHTS = "res10_300x300_ssd_iter_140000.caffemodel"
+YUNET_MODEL = "face_detection_yunet_2023mar.onnx"
+
+
+class Detection(NamedTuple):
+    """One detected face in full-resolution coordinates"""
+    box: tuple            # (x, y, w, h)
+    score: float
+    landmarks: object     # (5, 2) float array (eyes, nose, mouth corners) or None
+
+
+def _boxes(detections):
+    if not detections:
+        return np.zeros((0, 4), dtype=np.int32)
+    return np.array([d.box for d in detections], dtype=np.int32)
+
+
+def _clip_box(x, y, w, h, frame_w, frame_h):
+    x1, y1 = max(0, int(round(x))), max(0, int(round(y)))
+    x2, y2 = min(frame_w, int(round(x + w))), min(frame_h, int(round(y + h)))
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def load_cascade(path=None):
+    """Load the frontal-face cascade from OpenCV's data dir, falling back to the repo copy"""
+    candidates = [path] if path else []
+    data_dir = getattr(getattr(cv2, 'data', None), 'haarcascades', '')
+    candidates += [os.path.join(data_dir, CASCADE_FILE), CASCADE_FILE]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            cascade = cv2.CascadeClassifier(candidate)
+            if not cascade.empty():
+                return cascade
+    raise RuntimeError(f"Could not load {CASCADE_FILE}")
+
+
+class FaceDetector:
+    """
+    Base class: subclasses implement detect_faces()
+    """
+    name = "base"
+
+    def detect_faces(self, frame):
+        """
+        Detect faces
+
+        Returns:
+            List of Detection in full-resolution coordinates
+        """
+        raise NotImplementedError
+
+    def detect(self, frame):
+        """(N, 4) int array of (x, y, w, h) boxes in full-resolution coordinates"""
+        return _boxes(self.detect_faces(frame))
+
+
+class HaarFaceDetector(FaceDetector):
+    """
+    Haar cascade detector working on a downscaled copy of the frame
+    """
+    name = "haar"
+
+    def __init__(self, cascade=None, scale=0.5, scale_factor=1.3, min_neighbors=5,
+                 min_face=48, max_face=None):
+        """
+        Args:
+            cascade: cv2.CascadeClassifier or path (default: frontal-face cascade)
+            scale: Detection scale (0.5 = detect on a half-size copy); 1.0 disables downscaling
+            scale_factor, min_neighbors: detectMultiScale parameters (as before)
+            min_face: Smallest face to find, in full-resolution pixels. The scale is raised
+                      if needed so this face is still >= the cascade's 24px window
+            max_face: Largest face to find, in full-resolution pixels (None = no limit)
+        """
+        self.cascade = cascade if isinstance(cascade, cv2.CascadeClassifier) else load_cascade(cascade)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face = min_face
+        self.max_face = max_face
+        self.scale = min(1.0, max(scale, HAAR_WINDOW / float(min_face) if min_face else scale))
+
+    def _sizes(self):
+        min_size = max(HAAR_WINDOW, int(round((self.min_face or 0) * self.scale)))
+        max_size = int(round(self.max_face * self.scale)) if self.max_face else 0
+        return (min_size, min_size), (max_size, max_size)
+
+    def detect_faces(self, frame):
+        return [Detection(tuple(int(v) for v in box), 1.0, None) for box in self.detect(frame)]
+
+    def detect(self, frame):
+        """
+        Detect faces
+
+        Args:
+            frame: BGR or grayscale frame at full resolution
+
+        Returns:
+            (N, 4) int array of (x, y, w, h) boxes in full-resolution coordinates
+        """
+        if frame is None or frame.size == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        full_h, full_w = gray.shape[:2]
+        if self.scale < 1.0:
+            small = cv2.resize(gray, (max(1, int(full_w * self.scale)), max(1, int(full_h * self.scale))),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+
+        min_size, max_size = self._sizes()
+        boxes = self.cascade.detectMultiScale(small, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=min_size, maxSize=max_size)
+        if len(boxes) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        return self.to_full_resolution(boxes, (full_h, full_w))
+
+    def to_full_resolution(self, boxes, frame_shape):
+        """Map detection-scale boxes back to the full frame (clipped to its bounds)"""
+        boxes = np.asarray(boxes, dtype=np.float32) / self.scale
+        full_h, full_w = frame_shape[:2]
+        x1 = np.clip(np.round(boxes[:, 0]), 0, full_w - 1)
+        y1 = np.clip(np.round(boxes[:, 1]), 0, full_h - 1)
+        x2 = np.clip(np.round(boxes[:, 0] + boxes[:, 2]), 0, full_w)
+        y2 = np.clip(np.round(boxes[:, 1] + boxes[:, 3]), 0, full_h)
+        return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).astype(np.int32)
+
+
+class DnnSsdFaceDetector(FaceDetector):
+    """
+    OpenCV DNN ResNet-10 SSD face detector (300x300 input)
+    """
+    name = "dnn"
+
+    def __init__(self, prototxt=None, weights=None, confidence=0.5, input_size=(300, 300)):
+        """
+        Args:
+            prototxt, weights: Caffe model files (default: models/ folder)
+            confidence: Minimum detection score
+            input_size: Network input (the frame is resized to it)
+        """
+        prototxt = prototxt or os.path.join(MODELS_DIR, SSD_PROTOTXT)
+        weights = weights or os.path.join(MODELS_DIR, SSD_WEIGHTS)
+        for path in (prototxt, weights):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"DNN face detector file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect_faces(self, frame):
+        if frame is None or frame.size == 0:
+            return []
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        frame_h, frame_w = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, self.input_size), 1.0, self.input_size,
+                                     (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        out = self.net.forward().reshape(-1, 7)  # [_, class, score, x1, y1, x2, y2] (relative)
+        out = out[out[:, 2] >= self.confidence]
+        detections = []
+        for _, _, score, x1, y1, x2, y2 in out:
+            box = _clip_box(x1 * frame_w, y1 * frame_h, (x2 - x1) * frame_w, (y2 - y1) * frame_h, frame_w, frame_h)
+            if box[2] > 0 and box[3] > 0:
+                detections.append(Detection(box, float(score), None))
+        return detections
+
+
+class YuNetFaceDetector(FaceDetector):
+    """
+    YuNet (cv2.FaceDetectorYN): fast CNN detector with 5 facial landmarks
+    """
+    name = "yunet"
+
+    def __init__(self, model=None, score_threshold=0.8, nms_threshold=0.3, top_k=500, scale=1.0):
+        """
+        Args:
+            model: ONNX model file (default: models/face_detection_yunet_2023mar.onnx)
+            score_threshold: Minimum detection score
+            nms_threshold: Non-maximum suppression IoU
+            top_k: Candidates kept before NMS
+            scale: Detection scale (boxes/landmarks are mapped back to full resolution)
+        """
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            raise RuntimeError("cv2.FaceDetectorYN needs OpenCV >= 4.5.4")
+        model = model or os.path.join(MODELS_DIR, YUNET_MODEL)
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"YuNet model not found: {model}")
+        self.scale = scale
+        self.detector = cv2.FaceDetectorYN.create(model, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self._input_size = (320, 320)
+
+    def detect_faces(self, frame):
+        if frame is None or frame.size == 0:
+            return []
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        frame_h, frame_w = frame.shape[:2]
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, (max(1, int(frame_w * self.scale)), max(1, int(frame_h * self.scale))),
+                               interpolation=cv2.INTER_AREA)
+        size = (frame.shape[1], frame.shape[0])
+        if size != self._input_size:
+            self.detector.setInputSize(size)
+            self._input_size = size
+        _, faces = self.detector.detect(frame)
+        if faces is None:
+            return []
+        detections = []
+        for row in faces:  # [x, y, w, h, 5 x (lx, ly), score]
+            x, y, w, h = row[:4] / self.scale
+            box = _clip_box(x, y, w, h, frame_w, frame_h)
+            if box[2] > 0 and box[3] > 0:
+                landmarks = (row[4:14].reshape(5, 2) / self.scale).astype(np.float32)
+                detections.append(Detection(box, float(row[14]), landmarks))
+        return detections
+
+
+class BudgetedDetector(FaceDetector):
+    """
+    Per-frame time budget around any backend (adaptive scale, then frame skipping)
+    """
+
+    def __init__(self, detector, budget_ms, min_scale=0.25, step=0.8, headroom=0.6, smoothing=0.3):
+        """
+        Args:
+            detector: FaceDetector to run
+            budget_ms: Detection time allowed per frame (milliseconds)
+            min_scale: Lowest detection scale (haar: never below the 24px window for min_face)
+            step: Scale factor applied per adjustment
+            headroom: Scale is raised again when the average time is below this share of the budget
+            smoothing: Weight of the newest frame in the running average time
+        """
+        self.detector = detector
+        self.name = detector.name
+        self.budget_ms = float(budget_ms)
+        self.step = step
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.max_scale = getattr(detector, 'scale', None)
+        if self.max_scale is not None:
+            if isinstance(detector, HaarFaceDetector) and detector.min_face:
+                min_scale = max(min_scale, HAAR_WINDOW / float(detector.min_face))
+            min_scale = min(min_scale, self.max_scale)
+        self.min_scale = min_scale
+        self.avg_ms = None
+        self._last = []
+        self._skip = 0
+
+        # Stats
+        self.frames = 0
+        self.over_budget = 0
+        self.skipped = 0
+
+    def __getattr__(self, name):
+        # Backend attributes (cascade, scale, ...) stay reachable through the wrapper
+        return getattr(self.__dict__['detector'], name)
+
+    def detect_faces(self, frame):
+        self.frames += 1
+        if self._skip > 0:
+            self._skip -= 1
+            self.skipped += 1
+            return list(self._last)
+
+        start = time.perf_counter()
+        detections = self.detector.detect_faces(frame)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        self.avg_ms = elapsed if self.avg_ms is None else \
+            (1.0 - self.smoothing) * self.avg_ms + self.smoothing * elapsed
+        self._last = detections
+
+        scale = getattr(self.detector, 'scale', None)
+        if elapsed > self.budget_ms:
+            self.over_budget += 1
+        if self.avg_ms > self.budget_ms:
+            if scale is not None and scale > self.min_scale + 1e-6:
+                self.detector.scale = max(self.min_scale, scale * self.step)
+                self.avg_ms = None  # measure the new scale afresh
+            else:
+                # Nothing left to shrink: skip the frames the overrun took
+                self._skip = min(int(self.avg_ms // self.budget_ms), 5)
+        elif scale is not None and scale < self.max_scale and self.avg_ms < self.headroom * self.budget_ms:
+            self.detector.scale = min(self.max_scale, scale / self.step)
+            self.avg_ms = None
+        return detections
+
+    def stats(self):
+        """Frames, budget overruns, skipped frames, average ms and current scale"""
+        return {
+            'budget_ms': self.budget_ms,
+            'frames': self.frames,
+            'over_budget': self.over_budget,
+            'skipped': self.skipped,
+            'avg_ms': round(self.avg_ms, 1) if self.avg_ms is not None else None,
+            'scale': getattr(self.detector, 'scale', None),
+        }
+
+
+DETECTOR_BACKENDS = {
+    'haar': HaarFaceDetector,
+    'dnn': DnnSsdFaceDetector,
+    'yunet': YuNetFaceDetector,
+}
+
+
+def default_backend():
+    """Backend chosen for this deployment (FACE_DETECTOR_BACKEND, default 'haar')"""
+    return os.environ.get("FACE_DETECTOR_BACKEND", "haar").strip().lower() or "haar"
+
+
+def default_budget_ms():
+    """Per-frame detection budget of the live loops (FACE_DETECTOR_BUDGET_MS, default: none)"""
+    try:
+        value = float(os.environ.get("FACE_DETECTOR_BUDGET_MS", 0) or 0)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def create_detector(backend=None, scale=0.5, cascade=None, fallback=True, budget_ms=None, **options):
+    """
+    Build a face detector
+
+    Args:
+        backend: 'haar', 'dnn' or 'yunet' (default: default_backend())
+        scale: Detection scale for backends that support it (haar, yunet)
+        cascade: Existing CascadeClassifier for the haar backend
+        fallback: On missing model files / old OpenCV, warn and use Haar instead of raising
+        budget_ms: Per-frame detection budget in ms (None = unbounded; see BudgetedDetector)
+        **options: Extra backend constructor arguments
+
+    Returns:
+        FaceDetector
+    """
+    backend = (backend or default_backend()).lower()
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}' (use one of {sorted(DETECTOR_BACKENDS)})")
+    try:
+        if backend == 'haar':
+            detector = HaarFaceDetector(cascade, scale=scale, **options)
+        elif backend == 'yunet':
+            detector = YuNetFaceDetector(scale=scale, **options)
+        else:
+            detector = DnnSsdFaceDetector(**options)
+    except (FileNotFoundError, RuntimeError, cv2.error) as e:
+        if not fallback or backend == 'haar':
+            raise
+        print(f"⚠ {backend} face detector unavailable ({e}); using Haar cascade")
+        detector = HaarFaceDetector(cascade, scale=scale)
+    return BudgetedDetector(detector, budget_ms) if budget_ms else detector
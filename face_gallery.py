@@ -0,0 +1,397 @@
+"""
+Vectorized FaceNet Gallery Matcher
+Holds every enrolled embedding in one pre-L2-normalized float32 matrix so that
+matching a face (or a whole batch of faces) is one matrix product + argmax,
+instead of a Python loop over every student.
+
+With per-student templates attached (embedding store v2) the matrix holds
+one centroid per student; the individual templates of the best and
+runner-up identities are only scored for queries near the caller's
+threshold, so match cost stays one row per student.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from ann_index import create_index, load_index
+
+
+class MatchResult(NamedTuple):
+    name: str                    # Best matching identity ("Unknown" for an empty gallery)
+    similarity: float            # Cosine similarity of the best match (-1..1)
+    runner_up: str | None        # Second best *different* identity
+    runner_up_similarity: float  # Cosine similarity of the runner-up
+    distance: float              # Euclidean distance to the best template (raw, un-normalized)
+
+
+NO_MATCH = MatchResult("Unknown", -1.0, None, -1.0, float('inf'))
+
+
+def l2_normalize(vectors):
+    """Return float32 copies of vectors scaled to unit length (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1)
+    safe = np.where(norms > 0, norms, 1.0).astype(np.float32)
+    return vectors / safe[:, None], norms
+
+
+class FaceGallery:
+    """
+    Enrolled FaceNet embeddings stacked into a single matrix.
+    Several templates may share one name; scores are reduced per identity.
+    With an ANN index (see ann_index.py) matching scans only candidate rows.
+    """
+
+    def __init__(self, index=None, search_k=10):
+        """
+        Args:
+            index: None for the exact dense scan, a backend name ("exact", "ivf")
+                   or an index object from ann_index
+            search_k: Candidates fetched from the ANN index per query
+        """
+        self._names = []      # name per template, in insertion order
+        self._vectors = []    # raw embeddings per template, in insertion order
+        self._dirty = True
+        self._matrix = None   # (N, D) normalized templates, grouped by identity
+        self._norms = None    # (N,) raw template norms
+        self._identities = []
+        self._starts = None   # start row of each identity (None when one template per identity)
+        self._source = None   # contiguous matrix behind the first rows of _vectors (from_matrix)
+
+        # ANN mode: index rows follow insertion order and are appended incrementally
+        self.index = create_index(index) if isinstance(index, str) else index
+        self.search_k = search_k
+        self._identity_ids = {}
+        self._row_identity = []
+        self._row_norms = []
+        self._indexed = 0
+
+        # Near-threshold refinement against per-identity templates (attach_templates)
+        self._templates = {}      # name -> ((K, D) normalized templates, (K,) raw norms)
+        self.template_margin = 0.1
+        self.template_checks = 0
+
+    @classmethod
+    def from_dict(cls, encodings, index=None):
+        """Build from {name: embedding} as loaded from *_encoding.pkl files"""
+        gallery = cls(index=index)
+        for name, encoding in encodings.items():
+            gallery.add(name, encoding)
+        return gallery
+
+    @classmethod
+    def from_lists(cls, names, encodings, index=None):
+        """Build from parallel name/embedding lists (several images per person allowed)"""
+        gallery = cls(index=index)
+        for name, encoding in zip(names, encodings):
+            gallery.add(name, encoding)
+        return gallery
+
+    @classmethod
+    def from_matrix(cls, names, matrix, index=None):
+        """Build from names + an (N, D) matrix, e.g. the memory-mapped embedding store"""
+        gallery = cls(index=index)
+        matrix = np.array(matrix, dtype=np.float32)  # one sequential read of the mmap
+        gallery._names = list(names)
+        gallery._vectors = list(matrix)
+        gallery._source = matrix
+        return gallery
+
+    def attach_templates(self, names, templates, margin=0.1):
+        """
+        Attach individual enrolment templates (e.g. EmbeddingStore.load_templates())
+
+        Args:
+            names: Identity of each template row
+            templates: (T, D) raw template embeddings
+            margin: Queries whose best score is within this of the threshold are refined
+        """
+        self._templates = {}
+        self.template_margin = margin
+        if not len(names):
+            return
+        normalized, norms = l2_normalize(templates)
+        rows = {}
+        for i, name in enumerate(names):
+            rows.setdefault(name, []).append(i)
+        for name, idx in rows.items():
+            self._templates[name] = (np.ascontiguousarray(normalized[idx]), norms[idx])
+
+    def add(self, name, embedding):
+        """Enroll one template; the matrix is rebuilt lazily on the next match"""
+        self._names.append(name)
+        self._vectors.append(np.asarray(embedding, dtype=np.float32).ravel())
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def names(self):
+        """Distinct enrolled identities"""
+        self._ensure_built()
+        return list(self._identities)
+
+    def _ensure_built(self):
+        if self.index is not None:
+            self._sync_index()
+            return
+        if not self._dirty:
+            return
+        self._dirty = False
+        if not self._names:
+            self._matrix = None
+            self._identities = []
+            self._starts = None
+            return
+
+        # Group templates by identity so per-identity maxima are one reduceat
+        first_seen = {}
+        for name in self._names:
+            first_seen.setdefault(name, len(first_seen))
+        self._identities = list(first_seen)
+        if len(first_seen) == len(self._names):
+            # One template per identity: rows are already grouped
+            order = range(len(self._names))
+            if self._source is not None and len(self._source) == len(self._names):
+                raw = self._source
+            else:
+                raw = np.stack(self._vectors)
+        else:
+            order = sorted(range(len(self._names)), key=lambda i: first_seen[self._names[i]])
+            raw = np.stack([self._vectors[i] for i in order])
+        self._matrix, self._norms = l2_normalize(raw)
+        self._matrix = np.ascontiguousarray(self._matrix)
+
+        if len(self._identities) == len(order):
+            self._starts = None
+        else:
+            labels = np.array([first_seen[self._names[i]] for i in order])
+            self._starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+
+    def _sync_index(self):
+        """Record identities/norms for new rows and push them into the ANN index"""
+        for name, vector in zip(self._names[len(self._row_identity):], self._vectors[len(self._row_identity):]):
+            self._row_identity.append(self._identity_ids.setdefault(name, len(self._identity_ids)))
+            self._row_norms.append(float(np.linalg.norm(vector)))
+        self._identities = list(self._identity_ids)
+        if self._indexed < len(self._names):
+            pending, _ = l2_normalize(np.stack(self._vectors[self._indexed:]))
+            if len(self.index) == 0:
+                self.index.build(pending)
+            else:
+                self.index.add(pending)
+            self._indexed = len(self._names)
+
+    def attach_index_file(self, path):
+        """
+        Reuse a persisted ANN index if it still matches the enrolled embeddings,
+        insert any new enrolments incrementally, and save it back.
+
+        Returns:
+            "loaded" (unchanged), "updated" (incremental insert) or "built" (full rebuild)
+        """
+        if self.index is None:
+            raise ValueError("Gallery was created without an ANN index backend")
+        status = "built"
+        saved, keys = load_index(path)
+        if saved is not None and saved.name == self.index.name and self._adopt_index(saved, keys):
+            status = "loaded" if self._indexed == len(self._names) else "updated"
+        if status != "loaded":
+            self._sync_index()
+            self.index.save(path, self._names)
+        return status
+
+    def _adopt_index(self, saved, keys):
+        """Reorder templates to follow a saved index; False if the index is stale"""
+        positions = {}
+        for pos, name in enumerate(self._names):
+            positions.setdefault(name, []).append(pos)
+        order = []
+        for key in keys:
+            if not positions.get(key):
+                return False
+            order.append(positions[key].pop(0))
+        if len(order) != len(saved) or len(order) == 0:
+            return False
+        normalized, _ = l2_normalize(np.stack([self._vectors[i] for i in order]))
+        if normalized.shape != saved.data.shape or not np.allclose(normalized, saved.data, atol=1e-5):
+            return False
+
+        taken = set(order)
+        order += [i for i in range(len(self._names)) if i not in taken]
+        self._names = [self._names[i] for i in order]
+        self._vectors = [self._vectors[i] for i in order]
+        self._source = None
+        self.index = saved
+        self._identity_ids, self._row_identity, self._row_norms = {}, [], []
+        self._indexed = len(keys)
+        return True
+
+    def similarities(self, embeddings):
+        """
+        Cosine similarities of query embeddings against every template
+
+        Args:
+            embeddings: (D,) or (B, D) array-like
+
+        Returns:
+            Tuple (scores (B, N), raw query norms (B,))
+        """
+        self._ensure_built()
+        queries, query_norms = l2_normalize(embeddings)
+        return queries @ self._matrix.T, query_norms
+
+    def match(self, embedding):
+        """Match a single embedding; returns a MatchResult"""
+        return self.match_batch(embedding)[0]
+
+    def match_batch(self, embeddings, threshold=None):
+        """
+        Match a batch of embeddings with one matrix product
+
+        Args:
+            embeddings: (B, D) array-like (a single (D,) vector is accepted too)
+            threshold: Caller's accept threshold; with templates attached, queries scoring
+                       within template_margin of it are re-scored against the templates
+
+        Returns:
+            List of MatchResult, one per query
+        """
+        self._ensure_built()
+        if not self._names:
+            count = 1 if np.ndim(embeddings) == 1 else len(embeddings)
+            return [NO_MATCH] * count
+        if self.index is not None:
+            results = self._match_index(embeddings)
+        else:
+            results = self._match_dense(embeddings)
+        if threshold is not None and self._templates:
+            results = self._refine_with_templates(embeddings, results, threshold)
+        return results
+
+    def _refine_with_templates(self, embeddings, results, threshold):
+        """Re-score near-threshold queries: identity score = max(centroid, its templates)"""
+        near = [b for b, r in enumerate(results) if abs(r.similarity - threshold) <= self.template_margin]
+        if not near:
+            return results
+        queries, query_norms = l2_normalize(embeddings)
+        results = list(results)
+        for b in near:
+            r = results[b]
+            candidates = [(r.name, r.similarity, None), (r.runner_up, r.runner_up_similarity, None)]
+            rescored = []
+            for name, score, norm in candidates:
+                if name is None:
+                    continue
+                entry = self._templates.get(name)
+                if entry is not None:
+                    sims = entry[0] @ queries[b]
+                    best = int(np.argmax(sims))
+                    if sims[best] > score:
+                        score, norm = float(sims[best]), float(entry[1][best])
+                rescored.append((score, name, norm))
+            self.template_checks += 1
+            rescored.sort(key=lambda c: c[0], reverse=True)
+            score, name, norm = rescored[0]
+            if name == r.name and norm is None:
+                continue  # centroid still best: keep the original result
+            runner = rescored[1] if len(rescored) > 1 else (r.runner_up_similarity, r.runner_up, None)
+            distance = r.distance
+            if norm is not None:
+                q_norm = float(query_norms[b])
+                distance = float(np.sqrt(max(q_norm * q_norm + norm * norm - 2.0 * score * q_norm * norm, 0.0)))
+            results[b] = MatchResult(name, score, runner[1], runner[0], distance)
+        return results
+
+    def _match_dense(self, embeddings):
+        """Exact scan: one matrix product, per-identity maxima, best and runner-up"""
+
+        scores, query_norms = self.similarities(embeddings)
+        if self._starts is None:
+            id_scores = scores
+        else:
+            id_scores = np.maximum.reduceat(scores, self._starts, axis=1)
+
+        n_ids = id_scores.shape[1]
+        if n_ids >= 2:
+            top2 = np.argpartition(-id_scores, 1, axis=1)[:, :2]
+            rows = np.arange(len(id_scores))[:, None]
+            swap = id_scores[rows, top2][:, 0] < id_scores[rows, top2][:, 1]
+            top2[swap] = top2[swap][:, ::-1]
+        else:
+            top2 = np.zeros((len(id_scores), 1), dtype=np.intp)
+
+        results = []
+        for b in range(len(id_scores)):
+            best_id = int(top2[b, 0])
+            best_sim = float(id_scores[b, best_id])
+            if n_ids >= 2:
+                second_id = int(top2[b, 1])
+                runner_up = self._identities[second_id]
+                runner_up_sim = float(id_scores[b, second_id])
+            else:
+                runner_up, runner_up_sim = None, -1.0
+
+            # Row of the winning template (needed for the raw euclidean distance)
+            if self._starts is None:
+                row = best_id
+            else:
+                start = self._starts[best_id]
+                end = self._starts[best_id + 1] if best_id + 1 < n_ids else scores.shape[1]
+                row = start + int(np.argmax(scores[b, start:end]))
+            q_norm = float(query_norms[b])
+            g_norm = float(self._norms[row])
+            dist_sq = q_norm * q_norm + g_norm * g_norm - 2.0 * best_sim * q_norm * g_norm
+            distance = float(np.sqrt(max(dist_sq, 0.0)))
+
+            results.append(MatchResult(self._identities[best_id], best_sim, runner_up, runner_up_sim, distance))
+        return results
+
+    def _match_index(self, embeddings):
+        """Match via the ANN index: best and runner-up identities among the candidates"""
+        queries, query_norms = l2_normalize(embeddings)
+        ids, scores = self.index.search(queries, max(2, self.search_k))
+        results = []
+        for b in range(len(queries)):
+            best = runner = None
+            for row, score in zip(ids[b], scores[b]):
+                if row < 0:
+                    break
+                if best is None:
+                    best = (int(row), float(score))
+                elif self._row_identity[row] != self._row_identity[best[0]]:
+                    runner = (int(row), float(score))
+                    break
+            if best is None:
+                results.append(NO_MATCH)
+                continue
+            q_norm, g_norm = float(query_norms[b]), self._row_norms[best[0]]
+            dist_sq = q_norm * q_norm + g_norm * g_norm - 2.0 * best[1] * q_norm * g_norm
+            results.append(MatchResult(
+                self._names[best[0]], best[1],
+                self._names[runner[0]] if runner else None, runner[1] if runner else -1.0,
+                float(np.sqrt(max(dist_sq, 0.0)))))
+        return results
+
+    def top_k(self, embedding, k=5):
+        """Return [(name, similarity), ...] for the k best identities"""
+        self._ensure_built()
+        if not self._names:
+            return []
+        if self.index is not None:
+            queries, _ = l2_normalize(embedding)
+            ids, scores = self.index.search(queries, k * 4)
+            ranked = {}
+            for row, score in zip(ids[0], scores[0]):
+                if row >= 0:
+                    ranked.setdefault(self._names[row], float(score))
+            return list(ranked.items())[:k]
+        scores, _ = self.similarities(embedding)
+        id_scores = scores[0] if self._starts is None else np.maximum.reduceat(scores[0], self._starts)
+        k = min(k, len(id_scores))
+        best = np.argpartition(-id_scores, k - 1)[:k]
+        best = best[np.argsort(-id_scores[best])]
+        return [(self._identities[i], float(id_scores[i])) for i in best]
@@ -0,0 +1,229 @@
+"""
+Face Quality Gate
+Scores face crops BEFORE the embedding model sees them, so blurred,
+motion-smeared, over/under-exposed, tiny or strongly turned faces are
+skipped instead of being embedded and then rejected.
+
+All faces of a frame are scored together: each box is cut out of the
+grayscale frame and resized to a small fixed patch, and every metric is
+computed on the stacked (N, 64, 64) array with numpy:
+  sharpness   Laplacian variance (as in calculate_sharpness) relative to the
+              patch contrast, so dim faces are not mistaken for blurred ones
+  brightness  mean intensity
+  contrast    intensity standard deviation
+  size        shortest box side in full-resolution pixels
+  pose        off-angle proxy: nose offset between the eyes (landmarks)
+              or left/right mirror asymmetry of the patch (no landmarks)
+
+BestCropKeeper keeps the highest-scoring crop seen per track, used for
+enrolment photos and unknown-face snapshots.
+"""
+import time
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+PATCH_SIZE = 64
+
+
+class QualityReport(NamedTuple):
+    """Per-face metrics (arrays aligned with the scored boxes)"""
+    sharpness: np.ndarray
+    brightness: np.ndarray
+    contrast: np.ndarray
+    size: np.ndarray
+    pose: np.ndarray
+    score: np.ndarray     # 0..1 overall quality, for ranking crops
+    passed: np.ndarray    # bool
+    reasons: list         # None for passed faces, else the first failed check
+
+
+def _patches(gray, boxes, patch=PATCH_SIZE):
+    """Stack of (N, patch, patch) float32 grayscale face patches"""
+    frame_h, frame_w = gray.shape[:2]
+    stack = np.zeros((len(boxes), patch, patch), dtype=np.float32)
+    for i, (x, y, w, h) in enumerate(boxes):
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(frame_w, int(x + w)), min(frame_h, int(y + h))
+        if x2 > x1 and y2 > y1:
+            stack[i] = cv2.resize(gray[y1:y2, x1:x2], (patch, patch), interpolation=cv2.INTER_AREA)
+    return stack
+
+
+def _landmark_pose(landmarks):
+    """Yaw/roll proxy from 5 landmarks: 0 = frontal, ~1 = profile or strongly tilted"""
+    pts = np.asarray(landmarks, dtype=np.float32)
+    eye_vec = pts[1] - pts[0]
+    eye_dist = max(float(np.linalg.norm(eye_vec)), 1e-6)
+    eye_mid = (pts[0] + pts[1]) / 2.0
+    # Nose position along the eye line: 0 in the middle, +-0.5 over an eye
+    yaw = abs(float(np.dot(pts[2] - eye_mid, eye_vec)) / eye_dist ** 2)
+    roll = abs(float(np.arctan2(eye_vec[1], eye_vec[0]))) / (np.pi / 2)
+    return 2.0 * yaw + roll
+
+
+class QualityGate:
+    """
+    Vectorized face quality scoring with pass/fail thresholds
+    """
+
+    def __init__(self, min_sharpness=5.0, min_brightness=40.0, max_brightness=220.0,
+                 min_contrast=18.0, min_size=48, max_pose=0.6, patch_size=PATCH_SIZE):
+        """
+        Args:
+            min_sharpness: Minimum Laplacian variance / contrast^2 (x100) of the patch (blur / motion smear)
+            min_brightness, max_brightness: Accepted mean intensity range
+            min_contrast: Minimum intensity standard deviation (washed-out / flat crops)
+            min_size: Minimum face box side in full-resolution pixels
+            max_pose: Maximum off-angle proxy (0 = frontal)
+            patch_size: Side of the patch the metrics are computed on
+        """
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.min_size = min_size
+        self.max_pose = max_pose
+        self.patch_size = patch_size
+
+        # Stats
+        self.checked = 0
+        self.rejected = {}
+
+    def assess(self, frame, boxes, landmarks=None):
+        """
+        Score every face of one frame
+
+        Args:
+            frame: BGR or grayscale frame
+            boxes: (x, y, w, h) boxes
+            landmarks: Optional {box: (5, 2) landmarks} (YuNet), used for the pose proxy
+
+        Returns:
+            QualityReport
+        """
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        if not boxes:
+            empty = np.zeros(0, dtype=np.float32)
+            return QualityReport(empty, empty, empty, empty, empty, empty, np.zeros(0, dtype=bool), [])
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        stack = _patches(gray, boxes, self.patch_size)
+
+        # Laplacian (4-neighbour) of every patch at once
+        lap = (4.0 * stack[:, 1:-1, 1:-1] - stack[:, :-2, 1:-1] - stack[:, 2:, 1:-1]
+               - stack[:, 1:-1, :-2] - stack[:, 1:-1, 2:])
+        brightness = stack.mean(axis=(1, 2))
+        contrast = stack.std(axis=(1, 2))
+        sharpness = 100.0 * lap.var(axis=(1, 2)) / np.maximum(contrast, 1.0) ** 2
+        size = np.array([min(w, h) for _, _, w, h in boxes], dtype=np.float32)
+
+        # Mirror asymmetry relative to contrast: a turned or half-boxed head is far from
+        # symmetric. Side lighting raises it too, so only extreme values fail the gate
+        asymmetry = np.abs(stack - stack[:, :, ::-1]).mean(axis=(1, 2)) / np.maximum(contrast, 1.0)
+        pose = asymmetry / 3.0
+        landmarks = landmarks or {}
+        for i, box in enumerate(boxes):
+            if landmarks.get(box) is not None:
+                pose[i] = _landmark_pose(landmarks[box])
+
+        exposure = 1.0 - np.abs(brightness - 128.0) / 128.0
+        score = (np.clip(sharpness / (4.0 * self.min_sharpness), 0, 1)
+                 * np.clip(exposure, 0, 1)
+                 * np.clip(contrast / (3.0 * self.min_contrast), 0, 1)
+                 * np.clip(size / (3.0 * self.min_size), 0, 1)
+                 * np.clip(1.0 - pose, 0, 1)) ** 0.2
+
+        checks = [
+            ('too_small', size < self.min_size),
+            ('too_dark', brightness < self.min_brightness),
+            ('too_bright', brightness > self.max_brightness),
+            ('low_contrast', contrast < self.min_contrast),
+            ('blurry', sharpness < self.min_sharpness),
+            ('off_angle', pose > self.max_pose),
+        ]
+        reasons = [None] * len(boxes)
+        for reason, failed in checks:
+            for i in np.flatnonzero(failed):
+                if reasons[i] is None:
+                    reasons[i] = reason
+        passed = np.array([r is None for r in reasons], dtype=bool)
+
+        self.checked += len(boxes)
+        for reason in reasons:
+            if reason is not None:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return QualityReport(sharpness, brightness, contrast, size, pose, score, passed, reasons)
+
+    def check_crop(self, crop):
+        """Quality check of a single already-cropped face; returns (passed, score, reason)"""
+        if crop is None or crop.size == 0:
+            return False, 0.0, 'empty'
+        report = self.assess(crop, [(0, 0, crop.shape[1], crop.shape[0])])
+        return bool(report.passed[0]), float(report.score[0]), report.reasons[0]
+
+    def stats(self):
+        """Faces checked and rejections per reason"""
+        rejected = sum(self.rejected.values())
+        return {
+            'checked': self.checked,
+            'rejected': rejected,
+            'rejected_pct': f"{(rejected / self.checked * 100) if self.checked else 0.0:.1f}%",
+            'reasons': dict(self.rejected),
+        }
+
+
+class BestCropKeeper:
+    """
+    Highest-quality crop seen per key (track id)
+    """
+
+    def __init__(self, max_age=None):
+        """
+        Args:
+            max_age: Seconds after which a kept crop may be replaced by a worse one
+                     (None = keep the best for the whole life of the track)
+        """
+        self.max_age = max_age
+        self._best = {}   # key -> (score, crop, timestamp)
+
+    def offer(self, key, score, crop_fn, now=None):
+        """
+        Keep the crop if it beats the current best for key
+
+        Args:
+            key: Track id
+            score: Quality score of the candidate
+            crop_fn: Callable returning the crop; only called (and copied) when it is kept
+
+        Returns:
+            True if the candidate was kept
+        """
+        now = time.time() if now is None else now
+        current = self._best.get(key)
+        stale = current is not None and self.max_age is not None and now - current[2] > self.max_age
+        if current is not None and not stale and score <= current[0]:
+            return False
+        crop = crop_fn()
+        if crop is None or crop.size == 0:
+            return False
+        self._best[key] = (float(score), crop.copy(), now)
+        return True
+
+    def best(self, key):
+        """Best crop kept for key, or None"""
+        entry = self._best.get(key)
+        return entry[1] if entry else None
+
+    def best_score(self, key):
+        entry = self._best.get(key)
+        return entry[0] if entry else 0.0
+
+    def prune(self, active_keys):
+        """Forget keys that are no longer active (e.g. lost tracks)"""
+        for key in list(self._best):
+            if key not in active_keys:
+                del self._best[key]
+
+    def clear(self):
+        self._best.clear()
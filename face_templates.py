@@ -0,0 +1,104 @@
+"""
+Multi-Template Enrolment
+Turns several embeddings of one student (the best frames of an enrolment
+burst, the dataset photos, a folder of pictures) into:
+- a robust centroid: mean of the L2-normalized inliers, where outliers
+  (cosine similarity to the centroid below median - k * MAD, or below an
+  absolute floor) are dropped iteratively
+- a capped set of diverse templates (farthest-point selection among inliers)
+
+The centroid is the one gallery row every query is scored against; the
+templates are only consulted by FaceGallery for near-threshold queries.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+DEFAULT_MAX_TEMPLATES = 5
+
+
+class StudentTemplates(NamedTuple):
+    centroid: np.ndarray    # (D,) mean direction of the inliers, scaled to their mean norm
+    templates: np.ndarray   # (K, D) raw inlier embeddings kept as templates
+    inliers: int
+    rejected: int
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0), norms[:, 0]
+
+
+def robust_centroid(embeddings, outlier_k=3.0, min_similarity=0.3, iterations=3):
+    """
+    Centroid of the inlier embeddings
+
+    Args:
+        embeddings: (N, D) array-like of raw embeddings of ONE person
+        outlier_k: Drop samples more than k robust deviations (MAD) below the median similarity
+        min_similarity: Drop samples whose cosine similarity to the centroid is below this
+        iterations: Refinement rounds (the centroid is recomputed without the outliers)
+
+    Returns:
+        Tuple (unit centroid (D,), inlier mask (N,) bool)
+    """
+    unit, _ = _unit(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+    keep = np.ones(len(unit), dtype=bool)
+    centroid = unit.mean(axis=0)
+    for _ in range(iterations):
+        centroid = unit[keep].mean(axis=0)
+        centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+        sims = unit @ centroid
+        cutoff = min_similarity
+        if keep.sum() >= 3:
+            median = float(np.median(sims[keep]))
+            mad = float(np.median(np.abs(sims[keep] - median)))
+            cutoff = max(cutoff, median - outlier_k * max(1.4826 * mad, 0.02))
+        new_keep = sims >= cutoff
+        if not new_keep.any():
+            new_keep[int(np.argmax(sims))] = True  # never drop everything
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    centroid = unit[keep].mean(axis=0)
+    return centroid / max(float(np.linalg.norm(centroid)), 1e-12), keep
+
+
+def select_templates(unit_vectors, centroid, max_templates):
+    """
+    Indices of up to max_templates diverse vectors: start from the one closest to the
+    centroid, then repeatedly add the vector least similar to those already chosen
+    """
+    if max_templates is None or len(unit_vectors) <= max_templates:
+        return list(range(len(unit_vectors)))
+    chosen = [int(np.argmax(unit_vectors @ centroid))]
+    closest = unit_vectors @ unit_vectors[chosen[0]]
+    while len(chosen) < max_templates:
+        candidate = int(np.argmin(closest))
+        chosen.append(candidate)
+        closest = np.maximum(closest, unit_vectors @ unit_vectors[candidate])
+    return chosen
+
+
+def build_templates(embeddings, max_templates=DEFAULT_MAX_TEMPLATES, outlier_k=3.0, min_similarity=0.3):
+    """
+    Robust centroid + capped template set for one student
+
+    Args:
+        embeddings: List/array of raw embeddings (None entries are ignored)
+        max_templates: Cap on templates kept (None = keep every inlier)
+        outlier_k, min_similarity: Outlier rejection (see robust_centroid)
+
+    Returns:
+        StudentTemplates, or None when no embedding is usable
+    """
+    vectors = [np.asarray(e, dtype=np.float32).ravel() for e in embeddings if e is not None]
+    if not vectors:
+        return None
+    raw = np.stack(vectors)
+    centroid, keep = robust_centroid(raw, outlier_k=outlier_k, min_similarity=min_similarity)
+    inliers = raw[keep]
+    unit, norms = _unit(inliers)
+    chosen = select_templates(unit, centroid, max_templates)
+    # Scale to the inliers' mean norm so raw euclidean distances stay comparable
+    return StudentTemplates(centroid * float(norms.mean()), inliers[chosen], int(keep.sum()), int((~keep).sum()))
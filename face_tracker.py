@@ -0,0 +1,131 @@
+"""
+Lightweight IoU Face Tracker
+Associates Haar boxes across frames so a face is embedded when its track is
+created and then only every refresh_interval seconds; in between the cached
+identity of the track is reused.
+"""
+import time
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of (x, y, w, h) boxes -> (len(a), len(b)) array"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, 0:1], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, 1:2], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class Track:
+    """One tracked face"""
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = box
+        self.created_at = now
+        self.last_seen = now
+        self.last_embedded = None  # time of the last embedding (None = never)
+        self.missed = 0            # consecutive frames without a matching detection
+        self.hits = 1
+
+    def needs_embedding(self, now, refresh_interval):
+        return self.last_embedded is None or now - self.last_embedded >= refresh_interval
+
+
+class FaceTracker:
+    """
+    Greedy IoU association of detections to existing tracks
+    """
+
+    def __init__(self, iou_threshold=0.3, refresh_interval=2.0, max_missed=10):
+        """
+        Args:
+            iou_threshold: Minimum IoU to continue a track
+            refresh_interval: Seconds before a track's identity is re-embedded
+            max_missed: Frames a track survives without a detection
+        """
+        self.iou_threshold = iou_threshold
+        self.refresh_interval = refresh_interval
+        self.max_missed = max_missed
+        self.tracks = {}
+        self._next_id = 1
+
+        # Stats
+        self.faces_seen = 0
+        self.embeddings = 0
+
+    def update(self, boxes, now=None):
+        """
+        Associate this frame's detections with tracks
+
+        Args:
+            boxes: Iterable of (x, y, w, h)
+            now: Timestamp (defaults to time.time())
+
+        Returns:
+            List of Track aligned with boxes (track.box is the box of this frame)
+        """
+        now = time.time() if now is None else now
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        self.faces_seen += len(boxes)
+        assigned = [None] * len(boxes)
+
+        track_list = list(self.tracks.values())
+        if track_list and boxes:
+            ious = iou_matrix([t.box for t in track_list], boxes)
+            # Greedy: take the highest remaining IoU pair until below threshold
+            while True:
+                t_idx, b_idx = np.unravel_index(np.argmax(ious), ious.shape)
+                if ious[t_idx, b_idx] < self.iou_threshold:
+                    break
+                track = track_list[t_idx]
+                track.box = boxes[b_idx]
+                track.last_seen = now
+                track.missed = 0
+                track.hits += 1
+                assigned[b_idx] = track
+                ious[t_idx, :] = -1.0
+                ious[:, b_idx] = -1.0
+
+        matched_ids = {t.id for t in assigned if t is not None}
+        for track in track_list:
+            if track.id not in matched_ids:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    del self.tracks[track.id]
+
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                track = Track(self._next_id, box, now)
+                self._next_id += 1
+                self.tracks[track.id] = track
+                assigned[i] = track
+        return assigned
+
+    def due(self, tracks, now=None):
+        """Tracks among the given ones that should be (re-)embedded now"""
+        now = time.time() if now is None else now
+        return [t for t in tracks if t.needs_embedding(now, self.refresh_interval)]
+
+    def mark_embedded(self, track, now=None):
+        track.last_embedded = time.time() if now is None else now
+        self.embeddings += 1
+
+    def active_ids(self):
+        return set(self.tracks)
+
+    def stats(self):
+        """Faces seen vs embeddings actually computed"""
+        saved = 1.0 - self.embeddings / self.faces_seen if self.faces_seen else 0.0
+        return {
+            'active_tracks': len(self.tracks),
+            'faces_seen': self.faces_seen,
+            'embeddings': self.embeddings,
+            'embeddings_saved': f"{saved * 100:.1f}%",
+        }
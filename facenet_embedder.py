@@ -0,0 +1,185 @@
+"""
+In-Memory FaceNet Embedding Service
+Generates DeepFace/FaceNet embeddings directly from numpy BGR face crops,
+so recognition loops never have to write temp_face.jpg to disk and read it back.
+Several crops (from one frame or many) can be embedded in a single forward pass.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+def _load_deepface():
+    """Lazy import so modules can import this file without pulling in TensorFlow"""
+    from deepface import DeepFace
+    return DeepFace
+
+
+class FaceNetEmbedder:
+    """
+    Embedding service that accepts numpy images instead of file paths
+    """
+
+    def __init__(self, model_name="Facenet", detector_backend="opencv", enforce_detection=False):
+        """
+        Initialize the embedder
+
+        Args:
+            model_name: DeepFace model name (default FaceNet)
+            detector_backend: DeepFace detector run on the crop ('skip' to embed the crop as-is)
+            enforce_detection: Raise if DeepFace cannot find a face in the crop
+        """
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.enforce_detection = enforce_detection
+        self._deepface = None
+        self._model = None        # underlying Keras model for batched inference
+        self._input_size = None   # (height, width) expected by the model
+        self._model_lock = threading.Lock()
+
+    @property
+    def deepface(self):
+        if self._deepface is None:
+            self._deepface = _load_deepface()
+        return self._deepface
+
+    def embed(self, face_img, detector_backend=None):
+        """
+        Generate an embedding for a single face crop
+
+        Args:
+            face_img: BGR numpy image (as returned by cv2)
+            detector_backend: Override the detector for this call
+
+        Returns:
+            float32 embedding vector, or None if nothing could be embedded
+        """
+        if face_img is None or face_img.size == 0:
+            return None
+
+        result = self.deepface.represent(
+            img_path=face_img,
+            model_name=self.model_name,
+            enforce_detection=self.enforce_detection,
+            detector_backend=detector_backend or self.detector_backend
+        )
+        if not result:
+            return None
+        return np.asarray(result[0]['embedding'], dtype=np.float32)
+
+    def detect(self, frame):
+        """
+        Run the configured DeepFace detector once on a full frame
+
+        Returns:
+            List of (x, y, w, h) face boxes
+        """
+        faces = self.deepface.extract_faces(img_path=frame, enforce_detection=False,
+                                            detector_backend=self.detector_backend)
+        frame_h, frame_w = frame.shape[:2]
+        boxes = []
+        for face in faces:
+            area = face.get('facial_area') or {}
+            x, y, w, h = (int(area.get(k, 0)) for k in ('x', 'y', 'w', 'h'))
+            # With enforce_detection=False DeepFace reports "no face" as the whole frame
+            if w <= 0 or h <= 0 or (x == 0 and y == 0 and w >= frame_w and h >= frame_h):
+                continue
+            boxes.append((x, y, w, h))
+        return boxes
+
+    def _load_model(self):
+        """Build (once) the Keras model behind DeepFace for direct batched calls"""
+        with self._model_lock:
+            if self._model is None:
+                client = self.deepface.build_model(self.model_name)
+                # Newer DeepFace wraps the Keras model in a client object
+                model = getattr(client, 'model', client)
+                self._input_size = tuple(int(v) for v in model.input_shape[1:3])
+                self._model = model
+        return self._model
+
+    def preprocess(self, face_img):
+        """
+        Fit a BGR crop onto the model input the way DeepFace does
+        (aspect-preserving resize, zero padding, RGB, scaled to 0..1)
+        """
+        target_h, target_w = self._input_size
+        factor = min(target_h / face_img.shape[0], target_w / face_img.shape[1])
+        new_w = max(1, int(face_img.shape[1] * factor))
+        new_h = max(1, int(face_img.shape[0] * factor))
+        resized = cv2.resize(face_img, (new_w, new_h))
+
+        canvas = np.zeros((target_h, target_w, 3), dtype=np.float32)
+        top = (target_h - new_h) // 2
+        left = (target_w - new_w) // 2
+        canvas[top:top + new_h, left:left + new_w] = resized[:, :, ::-1]
+        return canvas / 255.0
+
+    def embed_batch(self, face_imgs):
+        """
+        Embed many face crops with ONE forward pass.
+        Crops are expected to already be face boxes (no re-detection is run).
+
+        Args:
+            face_imgs: List of BGR crops, from one frame or from several frames
+
+        Returns:
+            List aligned with face_imgs: float32 vector, or None for empty crops
+        """
+        results = [None] * len(face_imgs)
+        valid = [i for i, img in enumerate(face_imgs) if img is not None and img.size > 0]
+        if not valid:
+            return results
+
+        try:
+            model = self._load_model()
+            batch = np.stack([self.preprocess(face_imgs[i]) for i in valid])
+            output = np.asarray(model(batch, training=False), dtype=np.float32)
+        except Exception as e:
+            # Model internals differ between DeepFace versions; fall back to per-crop calls
+            print(f"⚠ Batched embedding unavailable ({e}), embedding crops one by one")
+            for i in valid:
+                results[i] = self.embed(face_imgs[i], detector_backend="skip")
+            return results
+
+        for i, vector in zip(valid, output):
+            results[i] = vector
+        return results
+
+
+def crop_faces(frame, boxes, padding=0, min_size=1):
+    """
+    Cut face boxes out of a frame (views, no copies)
+
+    Args:
+        frame: BGR frame
+        boxes: (x, y, w, h) boxes
+        padding: Extra pixels around each box, clipped to the frame
+        min_size: Crops smaller than this (either side) come back as None
+
+    Returns:
+        List aligned with boxes: BGR crop or None
+    """
+    frame_h, frame_w = frame.shape[:2]
+    crops = []
+    for (x, y, w, h) in boxes:
+        x1, y1 = max(0, x - padding), max(0, y - padding)
+        x2, y2 = min(frame_w, x + w + padding), min(frame_h, y + h + padding)
+        crop = frame[y1:y2, x1:x2]
+        crops.append(crop if crop.shape[0] >= min_size and crop.shape[1] >= min_size else None)
+    return crops
+
+
+# Shared instances so every window/camera reuses the same configuration
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name="Facenet", detector_backend="opencv"):
+    """Get or create a shared embedder for (model_name, detector_backend)"""
+    key = (model_name, detector_backend)
+    with _embedders_lock:
+        if key not in _embedders:
+            _embedders[key] = FaceNetEmbedder(model_name=model_name, detector_backend=detector_backend)
+        return _embedders[key]
@@ -23,8 +23,23 @@ try:
 except:
     AttendanceReport = None
 
+from facenet_embedder import get_embedder
+from face_gallery import FaceGallery
+from ann_index import INDEX_FILENAME
+from threaded_capture import ThreadedCamera
+from camera_probe import open_best_camera
+from recognition_pipeline import RecognitionWorker, FaceMatcher
+from face_tracker import FaceTracker
+from attendance_store import get_ledger
+from student_directory import get_student_directory
+from embedding_store import EmbeddingStore
+from face_alignment import FaceAligner, align_largest_face
+from face_quality import QualityGate, BestCropKeeper
+from face_detector import HaarFaceDetector, create_detector, default_budget_ms
+from calibrate_threshold import load_threshold
+
 try:
-    from optimized_camera import fix_camera_quality, OptimizedCameraCapture
+    from optimized_camera import fix_camera_quality, OptimizedCameraCapture, enhance_rois
     OPTIMIZED_CAMERA_AVAILABLE = True
 except:
     OPTIMIZED_CAMERA_AVAILABLE = False
@@ -710,6 +725,7 @@ class Student:
                         self.var_radio1.get()
                     ])
                     
+                get_student_directory().invalidate()
                 messagebox.showinfo("Success", "Student details has been added successfully", parent=self.root)
                 self.fetch_data()
             except Exception as es:
@@ -789,6 +805,7 @@ class Student:
                     writer = csv.writer(file)
                     writer.writerows(data)
                 
+                get_student_directory().invalidate()
                 messagebox.showinfo("Success", "Student details updated successfully", parent=self.root)
                 self.fetch_data()
             except Exception as es:
@@ -814,6 +831,7 @@ class Student:
                         writer = csv.writer(file)
                         writer.writerows(data)
                     
+                    get_student_directory().invalidate()
                     messagebox.showinfo("Delete", "Student details deleted successfully", parent=self.root)
                     self.fetch_data()
                 else:
@@ -856,6 +874,12 @@ class Student:
                     messagebox.showerror("Error", "Failed to load Haar Cascade file", parent=self.root)
                     return
                 
+                # Blurred/dark crops are not saved to the training set
+                quality_gate = QualityGate()
+                # FaceNet templates are cut like live probes: live detector + template alignment
+                enrol_detector = create_detector(cascade=face_classifier, scale=0.5)
+                enrol_aligner = FaceAligner()
+                
                 def face_cropped(img):
                     """Extract face from image with validation"""
                     if img is None or img.size == 0:
@@ -896,6 +920,7 @@ class Student:
                     parent=self.root)
                 
                 img_id = 0
+                enrol_crops = []  # aligned crops of the saved frames become FaceNet templates
                 
                 try:
                     while True:
@@ -907,6 +932,8 @@ class Student:
                             continue
                         
                         cropped_face = face_cropped(my_frame)
+                        if cropped_face is not None and not quality_gate.check_crop(cropped_face)[0]:
+                            cropped_face = None
                         
                         if cropped_face is not None:
                             img_id += 1
@@ -916,6 +943,7 @@ class Student:
                             # Save COLOR image (not grayscale)
                             file_name_path = f"data/user.{self.var_std_id.get()}.{img_id}.jpg"
                             cv2.imwrite(file_name_path, face)
+                            enrol_crops.append(align_largest_face(enrol_detector, enrol_aligner, my_frame))
                             
                             # Display the colored face with counter
                             display_face = face.copy()
@@ -942,6 +970,18 @@ class Student:
                     # Small delay before showing messagebox
                     time.sleep(0.2)
                 
+                # Several FaceNet embeddings per student: robust centroid + capped templates
+                if enrol_crops:
+                    try:
+                        embeddings = get_embedder("Facenet").embed_batch(enrol_crops)
+                        enrolled = EmbeddingStore("student_images").enroll(
+                            self.var_std_id.get(), self.var_std_name.get(), embeddings)
+                        if enrolled is not None:
+                            print(f"✓ FaceNet templates: {len(enrolled.templates)} kept, "
+                                  f"{enrolled.rejected} outliers dropped")
+                    except Exception as e:
+                        print(f"⚠ FaceNet enrolment skipped: {e}")
+                
                 messagebox.showinfo("Success", 
                     f"Successfully captured {img_id} COLOR photos!\n\n"
                     f"Images saved in 'data' folder\n"
@@ -1004,17 +1044,21 @@ class FaceRecognition:
         self.root = root
         self.root.geometry("1530x790+0+0")
         self.root.title("Face Recognition")
-        
-        # Lazy import to avoid circulars at module load
-        try:
-            from advanced_attendance_system import open_best_camera
-            self._open_best_camera = open_best_camera
-        except Exception:
-            self._open_best_camera = None
 
         # Initialize recognition components
         self.recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Live detector (FACE_DETECTOR_BACKEND: haar/dnn/yunet, FACE_DETECTOR_BUDGET_MS); boxes come back in full-resolution coordinates
+        self.face_detector = create_detector(cascade=self.face_cascade, scale=0.5, budget_ms=default_budget_ms())
+        # LBPH loop (face_recog): half-size Haar detection with its stricter settings, built once
+        self.lbph_detector = HaarFaceDetector(self.face_cascade, scale=0.5, scale_factor=1.1, min_neighbors=10)
+        # Warp each face to the FaceNet 160x160 template (eye/nose/mouth landmarks) before embedding
+        self.face_aligner = FaceAligner()
+        self.align_faces = True
+        self._frame_landmarks = {}
+        # Blurred/dark/tiny faces are skipped before embedding; best crop kept per track
+        self.quality_gate = QualityGate()
+        self.best_crops = BestCropKeeper()
         
         # Config compatible with provided start/stop snippet (enable FaceNet by default)
         self.use_facenet = True
@@ -1022,6 +1066,9 @@ class FaceRecognition:
         self.names_file = "face_names.pkl"  # Optional (may not exist)
         self.names = []
         self.current_video = None
+        self.pipeline = None  # RecognitionWorker while recognition is running
+        self.tracker = FaceTracker(refresh_interval=2.0)  # faces are re-embedded every 2s per track
+        self.matcher = None  # FaceMatcher (per-track match cache) while recognition is running
         self.recognition_active = False
         self.marked_today = set()
         # Advanced assets
@@ -1031,6 +1078,10 @@ class FaceRecognition:
         self.students_file = "students_database.csv"
         self.student_lookup_by_name = {}
         self.facenet_encodings = {}
+        self.gallery = FaceGallery()
+        self.gallery_index = None  # ANN backend for very large galleries ("ivf"); None = exact scan
+        self.match_threshold = load_threshold(default=0.5)  # Cosine similarity needed to mark (calibrated FAR)
+        self.embedder = get_embedder("Facenet")
         # Ensure folders
         for folder in [self.images_folder, self.unknown_faces_folder, self.attendance_folder]:
             if not os.path.exists(folder):
@@ -1073,28 +1124,29 @@ class FaceRecognition:
         self.update_info("Recognition window ready.")
     
     def mark_attendance(self, i, r, n, d):
-        with open("attendance.csv", "r+", newline="\n") as f:
-            myDataList = f.readlines()
-            name_list = []
-            for line in myDataList:
-                entry = line.split(",")
-                name_list.append(entry[0])
-            
-            if ((i not in name_list) and (r not in name_list) and (n not in name_list) and (d not in name_list)):
-                now = datetime.now()
-                d1 = now.strftime("%d/%m/%Y")
-                dtString = now.strftime("%H:%M:%S")
-                f.writelines(f"\n{i},{r},{n},{d},{dtString},{d1},Present")
+        # attendance.csv rows: id,roll,name,dept,time,date,status - one row per (id, date)
+        ledger = get_ledger("attendance.csv", key_columns=(0, 5), lineterminator="\n")
+        now = datetime.now()
+        d1 = now.strftime("%d/%m/%Y")
+        dtString = now.strftime("%H:%M:%S")
+        return ledger.mark([i, r, n, d, dtString, d1, "Present"])
     
     def face_recog(self):
-        def draw_boundary(img, classifier, scaleFactor, minNeighbors, color, text, clf):
+        students = get_student_directory()
+
+        def draw_boundary(img, detector, color, text, clf, enhance_profile="off"):
             """Draw boundary around detected faces with validation"""
             if img is None or img.size == 0:
                 return []
             
             try:
                 gray_image = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                features = classifier.detectMultiScale(gray_image, scaleFactor, minNeighbors)
+                # Detect on a half-size copy; LBPH still predicts on the full-resolution crop
+                features = detector.detect(gray_image)
+                if enhance_profile != "off" and len(features) > 0:
+                    # Enhance only the detected faces, then predict on the enhanced crops
+                    enhance_rois(img, features, enhance_profile)
+                    gray_image = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
                 
                 coord = []
                 
@@ -1103,29 +1155,23 @@ class FaceRecognition:
                     id, predict = clf.predict(gray_image[y:y+h, x:x+w])
                     confidence = int((100 * (1 - predict / 300)))
                     
-                    if not os.path.exists("data/student.csv"):
-                        return coord
-                    
-                    with open("data/student.csv", "r") as file:
-                        reader = csv.reader(file)
-                        for row in reader:
-                            if len(row) > 4 and row[4] == str(id):
-                                i = row[4]
-                                r = row[7]
-                                n = row[5]
-                                d = row[0]
-                                
-                                if confidence > 77:
-                                    cv2.putText(img, f"ID: {i}", (x, y-75), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
-                                    cv2.putText(img, f"Roll: {r}", (x, y-55), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
-                                    cv2.putText(img, f"Name: {n}", (x, y-30), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
-                                    cv2.putText(img, f"Department: {d}", (x, y-5), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
-                                    self.mark_attendance(i, r, n, d)
-                                else:
-                                    cv2.rectangle(img, (x, y), (x+w, y+h), (0, 0, 255), 3)
-                                    cv2.putText(img, "Unknown Face", (x, y-5), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
-                                
-                                break
+                    # ID -> student from the cached directory (reloaded only when the CSV changes)
+                    student = students.get(id)
+                    if student:
+                        i = student['id']
+                        r = student['roll']
+                        n = student['name']
+                        d = student['department']
+                        
+                        if confidence > 77:
+                            cv2.putText(img, f"ID: {i}", (x, y-75), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+                            cv2.putText(img, f"Roll: {r}", (x, y-55), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+                            cv2.putText(img, f"Name: {n}", (x, y-30), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+                            cv2.putText(img, f"Department: {d}", (x, y-5), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+                            self.mark_attendance(i, r, n, d)
+                        else:
+                            cv2.rectangle(img, (x, y), (x+w, y+h), (0, 0, 255), 3)
+                            cv2.putText(img, "Unknown Face", (x, y-5), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
                     
                     coord = [x, y, w, h]
                 
@@ -1134,9 +1180,9 @@ class FaceRecognition:
                 print(f"Draw boundary error: {str(e)}")
                 return []
         
-        def recognize(img, clf, faceCascade):
+        def recognize(img, clf, faceCascade, enhance_profile="off"):
             if img is not None and img.size > 0:
-                coord = draw_boundary(img, faceCascade, 1.1, 10, (255, 25, 255), "Face", clf)
+                coord = draw_boundary(img, self.lbph_detector, (255, 25, 255), "Face", clf, enhance_profile)
             return img
         
         try:
@@ -1172,7 +1218,7 @@ class FaceRecognition:
                                 time.sleep(0.1)
                                 continue
 
-                            img = recognize(img, clf, faceCascade)
+                            img = recognize(img, clf, faceCascade, camera.live_profile)
                             cv2.imshow("Welcome To Face Recognition", img)
 
                             key = cv2.waitKey(1) & 0xFF
@@ -1244,6 +1290,10 @@ class FaceRecognition:
             pass
 
     def update_info(self, message):
+        # Tk is not thread-safe: messages from the recognition worker go through its queue
+        if threading.current_thread() is not threading.main_thread() and self.pipeline is not None:
+            self.pipeline.post(self.update_info, message)
+            return
         try:
             ts = datetime.now().strftime("%H:%M:%S")
             self.info_text.insert(END, f"[{ts}] {message}\n")
@@ -1282,75 +1332,62 @@ class FaceRecognition:
         self.update_info("Starting face recognition...")
 
         # Use robust camera selector
-        cap = None
-        if self._open_best_camera is not None:
-            cap, meta = self._open_best_camera(lambda s: self.update_info(s))
-        else:
-            cap, meta = open_camera_with_backend()
+        cap, meta = open_best_camera(lambda s: self.update_info(s))
         if cap is None:
             messagebox.showerror("Error", "Camera opened but sent only black frames. Close other apps using camera and try again.")
             return
-        self.current_video = cap
+        # Background capture thread: recognize_faces always reads the newest frame and
+        # never waits for it (read_timeout=0), so the Tk thread is not blocked
+        self.current_video = ThreadedCamera(cap, read_timeout=0).start()
         print(f"Recognition camera selected: {meta}")
         self.update_info("Camera ready - recognizing faces...")
         self.recognition_active = True
         self.marked_today = set()
+        self.tracker = FaceTracker(refresh_interval=self.tracker.refresh_interval)
+        self.best_crops.clear()
+        self.matcher = FaceMatcher(self.embedder, self.tracker,
+                                   aligner=self.face_aligner if self.align_faces else None,
+                                   quality_gate=self.quality_gate, best_crops=self.best_crops)
+        # Detection/embedding/attendance on a worker thread; the Tk loop only renders
+        self.pipeline = RecognitionWorker(self._process_frame).start()
         self.recognize_faces()
 
-    def recognize_faces(self):
-        """Recognize faces from live video and render into Tkinter label"""
-        if not self.recognition_active or self.current_video is None:
-            return
-        ret, frame = self.current_video.read()
-        if not ret or frame is None or frame.size == 0:
-            # try once more before stopping
-            ret2, frame2 = (self.current_video.read() if self.current_video else (False, None))
-            if not ret2 or frame2 is None or frame2.size == 0:
-                self.stop_recognition()
-                return
-            frame = frame2
+    def _process_frame(self, frame):
+        """Recognition worker step (off the Tk thread): returns [(box, name, color), ...]"""
+        results = []
 
         # Detect faces
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        detections = self.face_detector.detect_faces(frame)
+        faces = [d.box for d in detections]
+        # Landmarks (YuNet) keyed by box for the alignment step
+        self._frame_landmarks = {d.box: d.landmarks for d in detections if d.landmarks is not None}
+
+        # New/refresh-due tracks are embedded in one batch; other faces reuse their track's match
+        face_matches = {}
+        if self.use_facenet and len(faces) > 0:
+            try:
+                face_matches = self.matcher.match_tracked_faces(frame, faces, self.gallery, self.match_threshold,
+                                                                self._frame_landmarks)
+            except ImportError as e:
+                # DeepFace itself is imported lazily by the embedder
+                self.update_info(f"DeepFace import error: {e}")
+            except Exception as e:
+                self.update_info(f"Recognition error: {e}")
 
         for (x, y, w, h) in faces:
             if self.use_facenet:
                 display_name = "Unknown"
                 disp_color = (0, 0, 255)
                 try:
-                    padding = 20
-                    y1 = max(0, y - padding)
-                    y2 = min(frame.shape[0], y + h + padding)
-                    x1 = max(0, x - padding)
-                    x2 = min(frame.shape[1], x + w + padding)
-                    face_img = frame[y1:y2, x1:x2]
-                    if face_img.shape[0] < 50 or face_img.shape[1] < 50:
+                    # No match (crop too small, not embeddable or waiting for a good frame): Unknown
+                    match = face_matches.get((int(x), int(y), int(w), int(h)))
+                    if match is None:
+                        results.append(((x, y, w, h), display_name, disp_color))
                         continue
-                    # Save temp as BGR; DeepFace will handle loading
-                    temp_face_path = "temp_face.jpg"
-                    cv2.imwrite(temp_face_path, face_img)
-                    # Lazy import to avoid heavy import on module load
-                    try:
-                        from deepface import DeepFace
-                    except Exception as e:
-                        self.update_info(f"DeepFace import error: {e}")
-                        continue
-                    embedding = DeepFace.represent(img_path=temp_face_path, model_name="Facenet", enforce_detection=False)
-                    detected_encoding = np.array(embedding[0]['embedding'])
-                    best_similarity = -1
-                    recognized_name = "Unknown"
-                    for student_name, stored_encoding in self.facenet_encodings.items():
-                        stored_enc_array = np.array(stored_encoding)
-                        # cosine similarity
-                        denom = (np.linalg.norm(detected_encoding) * np.linalg.norm(stored_enc_array))
-                        if denom == 0:
-                            continue
-                        cosine_similarity = float(np.dot(detected_encoding, stored_enc_array) / denom)
-                        if cosine_similarity > best_similarity:
-                            best_similarity = cosine_similarity
-                            recognized_name = student_name
-                    if best_similarity > 0.5:
+                    best_similarity = match.similarity
+                    recognized_name = match.name
+                    if best_similarity >= self.match_threshold:
                         display_name = recognized_name
                         disp_color = (0, 255, 0)
                         # attendance once per session by name
@@ -1358,18 +1395,9 @@ class FaceRecognition:
                             if self._mark_attendance_name(display_name):
                                 self.update_info(f"✓ Attendance marked for: {display_name} (Similarity: {best_similarity:.2f})")
                             self.marked_today.add(display_name)
-                    # cleanup temp
-                    try:
-                        if os.path.exists(temp_face_path):
-                            os.remove(temp_face_path)
-                    except Exception:
-                        pass
                 except Exception as e:
                     self.update_info(f"Recognition error: {e}")
-                # Draw overlay
-                cv2.rectangle(frame, (x, y), (x+w, y+h), disp_color, 2)
-                cv2.rectangle(frame, (x, y-30), (x+w, y), disp_color, cv2.FILLED)
-                cv2.putText(frame, display_name, (x+6, y-8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                results.append(((x, y, w, h), display_name, disp_color))
                 # Save unknown snapshots with throttling
                 if display_name == "Unknown":
                     self._maybe_save_unknown_face(frame, x, y, w, h)
@@ -1387,31 +1415,47 @@ class FaceRecognition:
                 display_name = "Unknown"
                 disp_color = (0, 0, 255)
                 if confidence < 70 and label != -1:
-                    student_id = str(label)
-                    i = r = n = d = None
-                    if os.path.exists("data/student.csv"):
-                        try:
-                            with open("data/student.csv", "r") as file:
-                                reader = csv.reader(file)
-                                for row in reader:
-                                    if len(row) > 4 and row[4] == student_id:
-                                        i = row[4]; r = row[7]; n = row[5]; d = row[0]
-                                        display_name = f"{n}"
-                                        disp_color = (0, 255, 0)
-                                        key = (i, r, n, d)
-                                        if key not in self.marked_today:
-                                            try:
-                                                self.mark_attendance(i, r, n, d)
-                                                self.marked_today.add(key)
-                                                self.update_info(f"✓ Attendance marked for: {n} ({i})")
-                                            except Exception as e:
-                                                self.update_info(f"Attendance mark error: {e}")
-                                        break
-                        except Exception as e:
-                            self.update_info(f"CSV read error: {e}")
-                cv2.rectangle(frame, (x, y), (x+w, y+h), disp_color, 2)
-                cv2.rectangle(frame, (x, y-30), (x+w, y), disp_color, cv2.FILLED)
-                cv2.putText(frame, display_name, (x+6, y-8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                    # Cached ID -> student lookup (no CSV read per face)
+                    student = get_student_directory().get(label)
+                    if student:
+                        i, r, n, d = student['id'], student['roll'], student['name'], student['department']
+                        display_name = f"{n}"
+                        disp_color = (0, 255, 0)
+                        key = (i, r, n, d)
+                        if key not in self.marked_today:
+                            try:
+                                self.mark_attendance(i, r, n, d)
+                                self.marked_today.add(key)
+                                self.update_info(f"✓ Attendance marked for: {n} ({i})")
+                            except Exception as e:
+                                self.update_info(f"Attendance mark error: {e}")
+                results.append(((x, y, w, h), display_name, disp_color))
+
+        return results
+
+    def recognize_faces(self):
+        """Render newest frame + latest recognition results into the Tkinter label"""
+        if not self.recognition_active or self.current_video is None:
+            return
+        ret, frame = self.current_video.read()
+        if not ret or frame is None or frame.size == 0:
+            if not self.current_video.isOpened():
+                self.stop_recognition()
+                return
+            # no new frame yet: keep the last one on screen and check again shortly
+            self.pipeline.drain_events()
+            self.root.after(10, self.recognize_faces)
+            return
+
+        # Recognition runs at its own pace on the worker; only draw here
+        self.pipeline.submit(frame)
+        self.pipeline.drain_events()
+        faces, _ = self.pipeline.latest()
+        frame = frame.copy()
+        for (x, y, w, h), display_name, disp_color in faces:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), disp_color, 2)
+            cv2.rectangle(frame, (x, y-30), (x+w, y), disp_color, cv2.FILLED)
+            cv2.putText(frame, display_name, (x+6, y-8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
         # Render to Tk Label
         try:
@@ -1431,8 +1475,14 @@ class FaceRecognition:
     def stop_recognition(self):
         """Stop face recognition"""
         self.recognition_active = False
+        if self.pipeline:
+            self.pipeline.stop()
+            print(f"Recognition stats: {self.pipeline.stats()}")
+            print(f"Tracker stats: {self.tracker.stats()}")
+            self.pipeline = None
         if self.current_video:
             try:
+                print(f"Capture stats: {self.current_video.stats()}")
                 self.current_video.release()
             except Exception:
                 pass
@@ -1465,42 +1515,39 @@ class FaceRecognition:
         if not os.path.exists(self.images_folder):
             messagebox.showerror("Error", "Student images folder not found!")
             return False
-        encoding_files = [f for f in os.listdir(self.images_folder) if f.endswith('_encoding.pkl')]
-        if len(encoding_files) == 0:
+        # Packed store (memory-mapped matrix + manifest); legacy pkl files are migrated once
+        store = EmbeddingStore(self.images_folder)
+        try:
+            migrated = store.ensure()
+            if migrated:
+                self.update_info(f"Migrated {migrated} encoding files into {store.matrix_path}")
+            ids, names, matrix = store.load()
+        except Exception as e:
+            self.update_info(f"Could not load embedding store: {e}")
+            return False
+        if len(names) == 0:
             messagebox.showerror("Error", "No FaceNet encodings found! Please capture student photos in Advanced System.")
             return False
-        self.update_info(f"Found {len(encoding_files)} encoding files")
-        for encoding_file in encoding_files:
-            try:
-                base_name = encoding_file.replace('_encoding.pkl', '')
-                parts = base_name.split('_', 1)
-                student_name = parts[1] if len(parts) >= 2 else parts[0]
-                with open(os.path.join(self.images_folder, encoding_file), 'rb') as f:
-                    encoding = pickle.load(f)
-                    self.facenet_encodings[student_name] = encoding
-                self.update_info(f"✓ Loaded encoding for: {student_name}")
-            except Exception as e:
-                self.update_info(f"Could not load {encoding_file}: {e}")
+        self.update_info(f"Loaded {len(names)} encodings from {store.matrix_path}")
+        self.facenet_encodings = {name: matrix[i] for i, name in enumerate(names)}
+        self.gallery = FaceGallery.from_matrix(names, matrix, index=self.gallery_index)
+        _, template_names, templates = store.load_templates()
+        self.gallery.attach_templates(template_names, templates)
+        if self.gallery_index and self.facenet_encodings:
+            status = self.gallery.attach_index_file(os.path.join(self.images_folder, INDEX_FILENAME))
+            self.update_info(f"ANN index ({self.gallery_index}) {status}")
         return len(self.facenet_encodings) > 0
 
     def _mark_attendance_name(self, name: str) -> bool:
         from datetime import date
         today = date.today().strftime("%Y-%m-%d")
         attendance_file = os.path.join(self.attendance_folder, f"attendance_{today}.csv")
-        is_new = not os.path.exists(attendance_file)
         try:
-            # create file with header if new
-            if is_new:
-                with open(attendance_file, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['ID', 'Name', 'Department', 'Date', 'Time', 'Status'])
-            else:
-                # prevent duplicates (by exact name)
-                with open(attendance_file, 'r') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        if len(row) > 1 and row[1] == name:
-                            return False
+            # day ledger: indexed once, duplicates (Date, Name) rejected in O(1)
+            ledger = get_ledger(attendance_file, header=['ID', 'Name', 'Department', 'Date', 'Time', 'Status'],
+                                key_columns=(3, 1))
+            if (today, name) in ledger:
+                return False
             # enrich from student DB
             sid = ''
             dept = ''
@@ -1508,10 +1555,7 @@ class FaceRecognition:
             if rec:
                 sid = rec.get('ID', '')
                 dept = rec.get('Department', '')
-            with open(attendance_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([sid, name, dept, today, datetime.now().strftime("%H:%M:%S"), "Present"])
-            return True
+            return ledger.mark([sid, name, dept, today, datetime.now().strftime("%H:%M:%S"), "Present"])
         except Exception as e:
             self.update_info(f"Attendance write error: {e}")
             return False
@@ -1526,7 +1570,10 @@ class FaceRecognition:
         try:
             y1 = max(0, y-20); y2 = min(frame.shape[0], y+h+20)
             x1 = max(0, x-20); x2 = min(frame.shape[1], x+w+20)
-            unknown_img = frame[y1:y2, x1:x2]
+            # Best-quality crop seen for this face's track, else the current one
+            unknown_img = self.matcher.best_crop((x, y, w, h))
+            if unknown_img is None:
+                unknown_img = frame[y1:y2, x1:x2]
             if unknown_img.size > 0:
                 ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
                 save_path = os.path.join(self.unknown_faces_folder, f"unknown_{ts}.jpg")
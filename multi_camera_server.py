@@ -0,0 +1,360 @@
+"""
+MULTI-CAMERA RECOGNITION SERVER
+Headless service feeding several cameras into one recognizer:
+- Any mix of webcam indices, RTSP/HTTP URLs and video files
+- One capture thread per source (ThreadedCamera, newest frame wins)
+- One shared FaceNet model and gallery (packed embedding store)
+- Fair round-robin scheduling: every pass takes at most one frame and a
+  bounded number of faces per camera, rotating which camera goes first;
+  the due faces of all cameras are embedded in ONE batch
+- Low-quality faces (blur, exposure, size) are skipped before embedding
+- Attendance is deduplicated across cameras in the shared daily ledger
+- Per-camera throughput metrics (printed periodically, optional JSON file)
+
+Usage:
+  python multi_camera_server.py --source 0 --source 1 --source rtsp://192.168.1.20/stream
+  python multi_camera_server.py --source entrance_a.mp4 --source entrance_b.mp4 --metrics metrics.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, date
+
+import cv2
+
+from facenet_embedder import get_embedder, crop_faces
+from face_gallery import FaceGallery
+from face_tracker import FaceTracker
+from threaded_capture import ThreadedCamera
+from camera_probe import open_best_camera
+from attendance_store import get_ledger
+from embedding_store import EmbeddingStore
+from face_detector import BudgetedDetector, create_detector, default_budget_ms, DETECTOR_BACKENDS
+from face_quality import QualityGate
+from calibrate_threshold import load_threshold
+from student_directory import get_student_directory
+
+# Same layout as the GUI's daily file, so both dedupe against each other
+DAILY_HEADER = ['ID', 'Name', 'Department', 'Date', 'Time', 'Status']
+
+
+class CameraSource:
+    """
+    One input stream with its own capture thread, tracker and counters
+    """
+
+    def __init__(self, name, src, refresh_interval=2.0):
+        """
+        Args:
+            name: Label used in logs and metrics
+            src: Webcam index (int), stream URL or video file path
+            refresh_interval: Seconds before a tracked face is re-embedded
+        """
+        self.name = name
+        self.src = src
+        self.capture = None
+        self.meta = None
+        self.active = False
+        self.tracker = FaceTracker(refresh_interval=refresh_interval)
+        self.results = {}   # track id -> MatchResult
+
+        # Metrics
+        self.started_at = None
+        self.frames = 0
+        self.faces = 0
+        self.embeddings = 0
+        self.marks = 0
+        self.embed_seconds = 0.0
+        self.detect_seconds = 0.0
+
+    def open(self):
+        cap = None
+        if isinstance(self.src, int):
+            cap, self.meta = open_best_camera(lambda s: None, index=self.src)
+            if cap is None:
+                cap = cv2.VideoCapture(self.src)
+        else:
+            cap = cv2.VideoCapture(self.src)
+        if cap is None or not cap.isOpened():
+            print(f"✗ [{self.name}] Cannot open source {self.src}")
+            return False
+
+        is_file = isinstance(self.src, str) and os.path.exists(self.src)
+        pace = (cap.get(cv2.CAP_PROP_FPS) or 25.0) if is_file else None  # play files in real time
+        self.capture = ThreadedCamera(cap, read_timeout=0, pace_fps=pace).start()
+        self.active = True
+        self.started_at = time.time()
+        print(f"✓ [{self.name}] Opened {self.src}")
+        return True
+
+    def forget_lost_tracks(self):
+        active = self.tracker.active_ids()
+        for track_id in list(self.results):
+            if track_id not in active:
+                del self.results[track_id]
+
+    def metrics(self):
+        elapsed = max(time.time() - self.started_at, 1e-6) if self.started_at else 0.0
+        data = {
+            'source': str(self.src),
+            'active': self.active,
+            'frames_processed': self.frames,
+            'processed_fps': round(self.frames / elapsed, 2) if elapsed else 0.0,
+            'faces': self.faces,
+            'embeddings': self.embeddings,
+            'embeddings_per_s': round(self.embeddings / elapsed, 2) if elapsed else 0.0,
+            'marks': self.marks,
+            'detect_ms_per_frame': round(self.detect_seconds / self.frames * 1000, 1) if self.frames else 0.0,
+            'embed_ms_per_face': round(self.embed_seconds / self.embeddings * 1000, 1) if self.embeddings else 0.0,
+            'tracker': self.tracker.stats(),
+        }
+        if self.capture is not None:
+            data['capture'] = self.capture.stats()
+        return data
+
+    def close(self):
+        self.active = False
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class MultiCameraServer:
+    """
+    Round-robin scheduler over many CameraSources sharing one model, gallery and ledger
+    """
+
+    def __init__(self, sources, images_folder="student_images", threshold=None,
+                 max_faces_per_camera=4, refresh_interval=2.0, attendance_folder="attendance_records",
+                 detect_scale=0.5, detector_backend=None, detect_budget_ms=None):
+        """
+        Args:
+            sources: List of (name, src)
+            images_folder: Folder with the packed embedding store
+            threshold: Cosine similarity needed to mark attendance
+                       (default: calibrated for FACE_TARGET_FAR, else 0.85)
+            max_faces_per_camera: Faces embedded per camera per pass (fairness cap)
+            refresh_interval: Seconds before a tracked face is re-embedded
+            attendance_folder: Folder of the daily attendance CSVs
+            detect_scale: Scale of the copy the face detector runs on
+            detector_backend: 'haar', 'dnn' or 'yunet' (default: FACE_DETECTOR_BACKEND or haar)
+            detect_budget_ms: Per-frame detection budget in ms (default: FACE_DETECTOR_BUDGET_MS, else none)
+        """
+        self.cameras = [CameraSource(name, src, refresh_interval) for name, src in sources]
+        self.images_folder = images_folder
+        self.threshold = load_threshold(default=0.85, folder=images_folder) if threshold is None else threshold
+        self.max_faces_per_camera = max_faces_per_camera
+        self.attendance_folder = attendance_folder
+        self.embedder = get_embedder("Facenet", detector_backend="opencv")
+        if detect_budget_ms is None:
+            detect_budget_ms = default_budget_ms()
+        self.face_detector = create_detector(detector_backend, scale=detect_scale, budget_ms=detect_budget_ms)
+        self.quality_gate = QualityGate()  # blurred/dark/tiny faces never reach the model
+        self.gallery = FaceGallery()
+        self.student_ids = {}
+        self.marked_today = set()
+        self._marked_day = date.today()   # marked_today is cleared when the date changes
+        self._turn = 0
+        self.passes = 0
+
+    def load_gallery(self):
+        store = EmbeddingStore(self.images_folder)
+        store.ensure()
+        ids, names, matrix = store.load()
+        if not names:
+            print(f"✗ No enrolled students in {store.matrix_path}")
+            return False
+        self.gallery = FaceGallery.from_matrix(names, matrix)
+        _, template_names, templates = store.load_templates()
+        self.gallery.attach_templates(template_names, templates)
+        self.student_ids = dict(zip(names, ids))
+        print(f"✓ Gallery: {len(names)} students, {len(template_names)} templates")
+        return True
+
+    def open(self):
+        opened = [cam.open() for cam in self.cameras]
+        return any(opened)
+
+    def mark_attendance(self, camera, name):
+        """Mark once per day across all cameras (shared ledger keyed by Date + Name)"""
+        today = date.today().strftime("%Y-%m-%d")
+        ledger = get_ledger(os.path.join(self.attendance_folder, f"attendance_{today}.csv"),
+                            header=DAILY_HEADER, key_columns=(3, 1))
+        student_id = self.student_ids.get(name, '')
+        # Department from the Student window's CSV (cached, reloaded only when it changes)
+        student = get_student_directory().get(student_id) if student_id else None
+        department = student['department'] if student else ''
+        if not ledger.mark([student_id, name, department, today,
+                            datetime.now().strftime("%H:%M:%S"), "Present"]):
+            return False
+        camera.marks += 1
+        print(f"✓ [{camera.name}] Attendance marked: {name}")
+        return True
+
+    def step(self):
+        """
+        One scheduling pass over all cameras
+
+        Returns:
+            Number of frames processed in this pass
+        """
+        count = len(self.cameras)
+        order = [self.cameras[(self._turn + i) % count] for i in range(count)]
+        self._turn = (self._turn + 1) % max(count, 1)
+
+        crops, owners = [], []
+        processed = 0
+        for cam in order:
+            if not cam.active:
+                continue
+            ret, frame = cam.capture.read()
+            if not ret:
+                if not cam.capture.isOpened():
+                    print(f"⚠ [{cam.name}] Source ended")
+                    cam.active = False
+                continue
+
+            start = time.perf_counter()
+            faces = self.face_detector.detect(frame)
+            cam.detect_seconds += time.perf_counter() - start
+            cam.frames += 1
+            cam.faces += len(faces)
+            processed += 1
+
+            tracks = cam.tracker.update([tuple(int(v) for v in f) for f in faces])
+            quality = self.quality_gate.assess(frame, [t.box for t in tracks])
+            due = cam.tracker.due([t for t, ok in zip(tracks, quality.passed) if ok])[:self.max_faces_per_camera]
+            for track, crop in zip(due, crop_faces(frame, [t.box for t in due], padding=20, min_size=50)):
+                if crop is not None:
+                    crops.append(crop)
+                    owners.append((cam, track))
+            cam.forget_lost_tracks()
+
+        if crops:
+            start = time.perf_counter()
+            embeddings = self.embedder.embed_batch(crops)
+            found = [i for i, emb in enumerate(embeddings) if emb is not None]
+            matches = self.gallery.match_batch([embeddings[i] for i in found], threshold=self.threshold) if found else []
+            per_face = (time.perf_counter() - start) / len(crops)
+
+            for cam, _ in owners:
+                cam.embeddings += 1
+                cam.embed_seconds += per_face
+            if date.today() != self._marked_day:
+                self.marked_today.clear()   # past midnight: everyone may be marked again
+                self._marked_day = date.today()
+            for i, match in zip(found, matches):
+                cam, track = owners[i]
+                cam.tracker.mark_embedded(track)
+                cam.results[track.id] = match
+                if match.similarity >= self.threshold and match.name not in self.marked_today:
+                    if self.mark_attendance(cam, match.name):
+                        self.marked_today.add(match.name)
+
+        self.passes += 1
+        return processed
+
+    def metrics(self):
+        """Per-camera throughput plus server totals"""
+        return {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'passes': self.passes,
+            'marked_today': len(self.marked_today),
+            'quality_gate': self.quality_gate.stats(),
+            'detector': self.face_detector.stats() if isinstance(self.face_detector, BudgetedDetector) else
+                        {'backend': self.face_detector.name},
+            'cameras': {cam.name: cam.metrics() for cam in self.cameras},
+        }
+
+    def print_metrics(self):
+        print("-" * 60)
+        for cam in self.cameras:
+            m = cam.metrics()
+            capture = m.get('capture', {})
+            print(f"[{cam.name}] {m['processed_fps']:5.1f} fps processed / "
+                  f"{capture.get('capture_fps', 0):5.1f} captured, {m['embeddings_per_s']:5.2f} emb/s, "
+                  f"{m['faces']} faces, {m['marks']} marked{'' if m['active'] else ' (ended)'}")
+        print("-" * 60)
+
+    def run(self, duration=None, stats_every=10.0, metrics_path=None):
+        """Serve until every source ended, the duration elapsed or Ctrl+C"""
+        start = last_stats = time.time()
+        try:
+            while any(cam.active for cam in self.cameras):
+                if not self.step():
+                    time.sleep(0.005)  # no camera had a new frame
+                now = time.time()
+                if now - last_stats >= stats_every:
+                    last_stats = now
+                    self.print_metrics()
+                    if metrics_path:
+                        self.write_metrics(metrics_path)
+                if duration and now - start >= duration:
+                    break
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            self.print_metrics()
+            if metrics_path:
+                self.write_metrics(metrics_path)
+            self.close()
+
+    def write_metrics(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metrics(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        for cam in self.cameras:
+            cam.close()
+
+
+def parse_source(value):
+    return int(value) if value.isdigit() else value
+
+
+def main():
+    p = argparse.ArgumentParser(description="Headless multi-camera face recognition attendance")
+    p.add_argument("--source", action="append", required=True,
+                   help="Webcam index, RTSP/HTTP URL or video file (repeat for more cameras)")
+    p.add_argument("--images", default="student_images", help="Folder with the packed embedding store")
+    p.add_argument("--threshold", type=float, default=None,
+                   help="Cosine similarity threshold (0.0-1.0; default: calibrated for --target-far, else 0.85)")
+    p.add_argument("--target-far", type=float, default=None,
+                   help="False accept rate to pick the calibrated threshold for (default: FACE_TARGET_FAR or 0.001)")
+    p.add_argument("--max-faces", type=int, default=4, help="Faces embedded per camera per pass")
+    p.add_argument("--refresh", type=float, default=2.0, help="Seconds before a tracked face is re-embedded")
+    p.add_argument("--detect-scale", type=float, default=0.5, help="Face detection runs on a copy scaled by this")
+    p.add_argument("--detector", choices=sorted(DETECTOR_BACKENDS), default=None,
+                   help="Face detector backend (default: FACE_DETECTOR_BACKEND or haar)")
+    p.add_argument("--detect-budget-ms", type=float, default=None,
+                   help="Per-frame detection budget; lowers the scale / skips frames when exceeded "
+                        "(default: FACE_DETECTOR_BUDGET_MS, else none)")
+    p.add_argument("--stats-every", type=float, default=10.0, help="Seconds between metric reports")
+    p.add_argument("--metrics", default=None, help="Write per-camera metrics to this JSON file")
+    p.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    args = p.parse_args()
+
+    sources = [(f"cam{i}", parse_source(s)) for i, s in enumerate(args.source)]
+    if args.threshold is None:
+        args.threshold = load_threshold(args.target_far, default=0.85, folder=args.images)
+    server = MultiCameraServer(sources, images_folder=args.images, threshold=args.threshold,
+                               max_faces_per_camera=args.max_faces, refresh_interval=args.refresh,
+                               detect_scale=args.detect_scale, detector_backend=args.detector,
+                               detect_budget_ms=args.detect_budget_ms)
+    if not server.load_gallery():
+        sys.exit(1)
+    if not server.open():
+        print("✗ No source could be opened")
+        sys.exit(1)
+
+    print(f"Serving {len(sources)} source(s), threshold {server.threshold:.3f}. Press Ctrl+C to stop.")
+    server.run(duration=args.duration, stats_every=args.stats_every, metrics_path=args.metrics)
+    print(f"Done. {len(server.marked_today)} students marked today.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,67 @@
 """
 Optimized Camera Capture for Face Recognition
 Fixes low quality camera issues with HD resolution and proper settings
+
+Enhancement profiles:
+  off      - frames are returned as captured
+  fast     - bilateral denoise + sharpen, applied to face ROIs only
+  quality  - Non-Local Means denoise + sharpen, used only for captured
+             enrolment stills (live frames fall back to 'fast' on ROIs)
 """
 import cv2
 import numpy as np
 import time
 
+ENHANCEMENT_PROFILES = ("off", "fast", "quality")
+
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1,  9, -1],
+                           [-1, -1, -1]], dtype=np.float32)
+
+
+def enhance_image(img, profile="fast"):
+    """
+    Enhance a small image (face ROI or enrolment still) with a profile
+
+    Args:
+        img: BGR image
+        profile: 'off', 'fast' or 'quality'
+
+    Returns:
+        Enhanced image (the input itself for 'off')
+    """
+    if profile == "off" or img is None or img.size == 0:
+        return img
+    if profile == "quality":
+        img = cv2.fastNlMeansDenoisingColored(img, None, 10, 10, 7, 21)
+    else:
+        img = cv2.bilateralFilter(img, 5, 40, 40)
+    return cv2.filter2D(img, -1, SHARPEN_KERNEL)
+
+
+def enhance_rois(frame, boxes, profile="fast", padding=10):
+    """
+    Enhance only the face regions of a frame, in place
+
+    Args:
+        frame: BGR frame (modified in place)
+        boxes: (x, y, w, h) face boxes
+        profile: 'off', 'fast' or 'quality'
+        padding: Extra pixels around each box
+
+    Returns:
+        The same frame
+    """
+    if profile == "off":
+        return frame
+    frame_h, frame_w = frame.shape[:2]
+    for (x, y, w, h) in boxes:
+        x1, y1 = max(0, int(x) - padding), max(0, int(y) - padding)
+        x2, y2 = min(frame_w, int(x + w) + padding), min(frame_h, int(y + h) + padding)
+        if x2 > x1 and y2 > y1:
+            frame[y1:y2, x1:x2] = enhance_image(frame[y1:y2, x1:x2], profile)
+    return frame
+
 
 def fix_camera_quality(camera_index=0):
     """
@@ -72,16 +128,22 @@ class OptimizedCameraCapture:
     Advanced camera capture class with quality optimization and face detection
     """
     
-    def __init__(self, camera_index=0, resolution=(1280, 720)):
+    def __init__(self, camera_index=0, resolution=(1280, 720), profile="fast"):
         """
         Initialize optimized camera capture
         
         Args:
             camera_index: Camera device index
             resolution: Tuple (width, height) for camera resolution
+            profile: Enhancement profile ('off', 'fast' or 'quality')
         """
+        if profile not in ENHANCEMENT_PROFILES:
+            raise ValueError(f"Unknown enhancement profile '{profile}' (use one of {ENHANCEMENT_PROFILES})")
         self.camera_index = camera_index
         self.resolution = resolution
+        self.profile = profile
+        # Live frames never pay for NLM; it is reserved for stills
+        self.live_profile = "off" if profile == "off" else "fast"
         self.cap = None
         self.initialize_camera()
     
@@ -155,24 +217,27 @@ class OptimizedCameraCapture:
             self.cap.read()
         print("✓ Camera ready\n")
     
-    def capture_frame(self):
+    def capture_frame(self, rois=None):
         """
-        Capture a single high-quality frame
+        Capture a single frame
+        
+        Args:
+            rois: Optional (x, y, w, h) face boxes to enhance; the rest of
+                  the frame is returned as captured
         
         Returns:
             Tuple (success, frame)
         """
         ret, frame = self.cap.read()
         
-        if ret and frame is not None:
-            # Apply additional processing for better quality
-            frame = self._enhance_frame(frame)
+        if ret and frame is not None and rois is not None and len(rois) > 0:
+            frame = enhance_rois(frame, rois, self.live_profile)
         
         return ret, frame
     
     def _enhance_frame(self, frame):
         """
-        Enhance frame quality with post-processing
+        Enhance a captured still (enrolment photo) with the configured profile
         
         Args:
             frame: Input frame
@@ -180,16 +245,7 @@ class OptimizedCameraCapture:
         Returns:
             Enhanced frame
         """
-        # Denoise
-        frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
-        
-        # Sharpen
-        kernel = np.array([[-1,-1,-1],
-                          [-1, 9,-1],
-                          [-1,-1,-1]])
-        frame = cv2.filter2D(frame, -1, kernel)
-        
-        return frame
+        return enhance_image(frame, self.profile)
     
     def calculate_sharpness(self, frame):
         """
@@ -319,8 +375,8 @@ class OptimizedCameraCapture:
                 (x, y, w, h) = faces[0]
                 face = frame[y:y+h, x:x+w]
                 
-                # Resize and save
-                face_resized = cv2.resize(face, (450, 450))
+                # Enhance only the saved face (a still, so 'quality' may use NLM), resize and save
+                face_resized = cv2.resize(self._enhance_frame(face), (450, 450))
                 filename = f"{output_folder}/user.{student_id}.{captured_count + 1}.jpg"
                 cv2.imwrite(filename, face_resized)
                 
@@ -10,117 +10,159 @@ Usage examples (PowerShell):
   python process_video_attendance.py --video 0            # webcam index
   python process_video_attendance.py --video "rtsp://..." # network stream
   python process_video_attendance.py --images images      # change known faces folder
+  python process_video_attendance.py --video lecture.mp4 --headless --workers 8 --log detections.jsonl
+  python process_video_attendance.py --video 0 --adaptive --budget 5   # motion-driven sampling
 
 Requirements: deepface, opencv-python, numpy
 """
 import os
 import sys
-import csv
+import json
 import time
+import queue
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date
 
 import cv2
 import numpy as np
 from deepface import DeepFace
 
+from facenet_embedder import FaceNetEmbedder, get_embedder, crop_faces
+from face_gallery import FaceGallery
+from attendance_store import get_ledger
+from adaptive_sampler import AdaptiveSampler
+from embedding_cache import EmbeddingCache, CACHE_FILENAME
+from calibrate_threshold import load_threshold
+
 KNOWN_FOLDERS = [
     "images",          # default repo folder (organized as images/Name/xxx.jpg)
     "student_images",  # GUI-captured faces folder
 ]
 
 ATTENDANCE_DIR = "attendance_records"
+DAILY_HEADER = ['ID', 'Name', 'Department', 'Date', 'Time', 'Status']
 
 def ensure_dirs():
     if not os.path.exists(ATTENDANCE_DIR):
         os.makedirs(ATTENDANCE_DIR, exist_ok=True)
 
 class Encoder:
-    def __init__(self, images_folder: str):
+    def __init__(self, images_folder: str, use_cache: bool = True, workers: int = 1):
         self.images_folder = images_folder
+        self.workers = workers
         self.known_names: list[str] = []
         self.known_encodings: list[np.ndarray] = []
+        self.gallery = FaceGallery()
+        # Embeddings keyed by image content; only new/changed images hit DeepFace
+        self.cache = EmbeddingCache(os.path.join(images_folder, CACHE_FILENAME)) if use_cache else None
 
-    def _load_from_folder(self) -> bool:
-        if not os.path.exists(self.images_folder):
-            return False
+    @staticmethod
+    def _represent(img_path):
+        emb = DeepFace.represent(img_path=img_path, model_name="Facenet", enforce_detection=False)
+        return emb[0]["embedding"] if emb else None
+
+    def _embed_file(self, person_name, img_path):
+        try:
+            if self.cache is not None:
+                emb = self.cache.get_or_compute(img_path, self._represent)
+            else:
+                emb = self._represent(img_path)
+            if emb is not None:
+                self.known_names.append(person_name)
+                self.known_encodings.append(np.asarray(emb, dtype=np.float32))
+        except Exception:
+            pass
+
+    def _list_images(self):
+        items = []
         for entry in os.listdir(self.images_folder):
             person_dir = os.path.join(self.images_folder, entry)
             if not os.path.isdir(person_dir):
                 # also allow single-file naming like ID_Name.jpg inside folder
                 if entry.lower().endswith((".jpg", ".jpeg", ".png")):
-                    person_name = os.path.splitext(entry)[0]
-                    img_path = person_dir
-                    try:
-                        emb = DeepFace.represent(img_path=img_path, model_name="Facenet", enforce_detection=False)
-                        if emb:
-                            self.known_names.append(person_name)
-                            self.known_encodings.append(np.array(emb[0]["embedding"]))
-                    except Exception:
-                        pass
+                    items.append((os.path.splitext(entry)[0], person_dir))
                 continue
             person_name = entry
             for img_name in os.listdir(person_dir):
                 if not img_name.lower().endswith((".jpg", ".jpeg", ".png")):
                     continue
-                img_path = os.path.join(person_dir, img_name)
-                try:
-                    emb = DeepFace.represent(img_path=img_path, model_name="Facenet", enforce_detection=False)
-                    if emb:
-                        self.known_names.append(person_name)
-                        self.known_encodings.append(np.array(emb[0]["embedding"]))
-                except Exception:
-                    pass
+                items.append((person_name, os.path.join(person_dir, img_name)))
+        return items
+
+    def _load_from_folder(self) -> bool:
+        if not os.path.exists(self.images_folder):
+            return False
+        items = self._list_images()
+        if self.workers > 1 and len(items) > 1:
+            # Large folders: embed cache misses in a process pool (results come back in order)
+            from bulk_enroll import embed_images
+            embeddings = embed_images([path for _, path in items], workers=self.workers, cache=self.cache)
+            for (person_name, _), emb in zip(items, embeddings):
+                if emb is not None:
+                    self.known_names.append(person_name)
+                    self.known_encodings.append(np.asarray(emb, dtype=np.float32))
+        else:
+            for person_name, img_path in items:
+                self._embed_file(person_name, img_path)
         return len(self.known_names) > 0
 
     def load(self) -> bool:
-        return self._load_from_folder()
+        loaded = self._load_from_folder()
+        if self.cache is not None:
+            try:
+                self.cache.save()
+            except Exception as e:
+                print(f"⚠ Could not save embedding cache: {e}")
+            print(self.cache.report())
+        self.gallery = FaceGallery.from_lists(self.known_names, self.known_encodings)
+        return loaded
 
 class AttendanceWriter:
     def __init__(self):
         ensure_dirs()
         self.today = date.today().strftime("%Y-%m-%d")
         self.path = os.path.join(ATTENDANCE_DIR, f"attendance_{self.today}.csv")
-        self._ensure_header()
-        self._marked = set(self._load_existing_names())
+        # Same day file and format as the GUIs (ID/Department left empty); indexed once,
+        # rows are buffered and flushed every 16 marks / at exit
+        self.ledger = get_ledger(self.path, header=DAILY_HEADER, key_columns=(3, 1), flush_every=16)
 
-    def _ensure_header(self):
-        if not os.path.exists(self.path):
-            with open(self.path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Name", "Date", "Time", "Status"])  # keep simple for CLI tool
+    def mark(self, name: str):
+        return self.ledger.mark(['', name, '', self.today, datetime.now().strftime("%H:%M:%S"), "Present"])
 
-    def _load_existing_names(self):
-        names = []
-        try:
-            with open(self.path, "r", newline="") as f:
-                r = csv.reader(f)
-                next(r, None)
-                for row in r:
-                    if row:
-                        names.append(row[0])
-        except Exception:
-            pass
-        return names
+    def close(self):
+        self.ledger.flush()
 
-    def mark(self, name: str):
-        if name in self._marked:
-            return False
-        with open(self.path, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([name, self.today, datetime.now().strftime("%H:%M:%S"), "Present"])
-        self._marked.add(name)
-        return True
 
+def match_faces(frame, boxes, embedder, gallery):
+    """
+    Embed each detected face crop (one forward pass for all of them) and match
+    every embedding against the gallery separately
 
-def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    if denom == 0:
-        return -1.0
-    return float(np.dot(a, b) / denom)
+    Returns:
+        List of ((x, y, w, h), MatchResult or None), one per box
+    """
+    if not boxes:
+        return []
+    try:
+        embeddings = embedder.embed_batch(crop_faces(frame, boxes))
+        found = [i for i, emb in enumerate(embeddings) if emb is not None]
+        matches = gallery.match_batch([embeddings[i] for i in found]) if found else []
+    except Exception:
+        return [(box, None) for box in boxes]
+    by_index = dict(zip(found, matches))
+    return [(box, by_index.get(i)) for i, box in enumerate(boxes)]
 
 
-def recognize_from_stream(src, encoder: Encoder, threshold: float = 0.5, process_every_n: int = 15):
+def is_live_source(src):
+    """Webcams and network streams run on wall-clock time; files on video time"""
+    return isinstance(src, int) or "://" in str(src)
+
+
+def recognize_from_stream(src, encoder: Encoder, threshold: float = 0.5, process_every_n: int = 15,
+                          sampler: AdaptiveSampler = None):
     cap: cv2.VideoCapture
     if isinstance(src, int):
         cap = cv2.VideoCapture(src, cv2.CAP_DSHOW)
@@ -134,8 +176,11 @@ def recognize_from_stream(src, encoder: Encoder, threshold: float = 0.5, process
     writer = AttendanceWriter()
     print(f"Attendance target: {writer.path}")
 
+    embedder = get_embedder("Facenet", detector_backend="opencv")
     frame_idx = 0
     marked_today = set()
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    live = is_live_source(src)
 
     while True:
         ret, frame = cap.read()
@@ -144,47 +189,40 @@ def recognize_from_stream(src, encoder: Encoder, threshold: float = 0.5, process
             break
 
         frame_idx += 1
-        if frame_idx % process_every_n != 0:
+        if sampler is not None:
+            should_process = sampler.should_process(frame, None if live else frame_idx / fps)
+        else:
+            should_process = frame_idx % process_every_n == 0
+        if not should_process:
             cv2.imshow("Video Attendance", frame)
         else:
-            # Save temp and get embedding for the whole frame faces
-            tmp = "_tmp_video_frame.jpg"
-            cv2.imwrite(tmp, frame)
+            # Detect once per processed frame, then embed every face crop in one batch
             try:
-                faces = DeepFace.extract_faces(img_path=tmp, enforce_detection=False, detector_backend='opencv')
+                boxes = embedder.detect(frame)
             except Exception:
-                faces = []
+                boxes = []
+
+            if sampler is not None:
+                sampler.record(len(boxes), None if live else frame_idx / fps)
 
-            for face in faces:
-                fa = face.get('facial_area') or {}
-                x, y, w, h = fa.get('x', 0), fa.get('y', 0), fa.get('w', 0), fa.get('h', 0)
+            for (x, y, w, h), match in match_faces(frame, boxes, embedder, encoder.gallery):
                 x2, y2 = x + w, y + h
                 color = (0, 0, 255)
                 label = "Unknown"
                 conf_pct = 0
 
-                try:
-                    emb_pack = DeepFace.represent(img_path=tmp, model_name="Facenet", enforce_detection=False, detector_backend='opencv')
-                    if emb_pack:
-                        det_emb = np.array(emb_pack[0]['embedding'])
-                        best_sim = -1.0
-                        best_name = "Unknown"
-                        for known_emb, name in zip(encoder.known_encodings, encoder.known_names):
-                            sim = cosine_similarity(det_emb, np.array(known_emb))
-                            if sim > best_sim:
-                                best_sim = sim
-                                best_name = name
-                        if best_sim >= threshold:
-                            label = best_name
-                            color = (0, 255, 0)
-                            conf_pct = int(best_sim * 100)
-                            if label not in marked_today and writer.mark(label):
-                                marked_today.add(label)
-                                print(f"✓ Marked: {label} @ {datetime.now().strftime('%H:%M:%S')} (sim {best_sim:.2f})")
-                        else:
-                            conf_pct = int(max(0.0, best_sim) * 100)
-                except Exception:
-                    pass
+                if match is not None:
+                    best_sim = match.similarity
+                    best_name = match.name
+                    if best_sim >= threshold:
+                        label = best_name
+                        color = (0, 255, 0)
+                        conf_pct = int(best_sim * 100)
+                        if label not in marked_today and writer.mark(label):
+                            marked_today.add(label)
+                            print(f"✓ Marked: {label} @ {datetime.now().strftime('%H:%M:%S')} (sim {best_sim:.2f})")
+                    else:
+                        conf_pct = int(max(0.0, best_sim) * 100)
 
                 # Draw box and label
                 cv2.rectangle(frame, (x, y), (x2, y2), color, 2)
@@ -192,26 +230,235 @@ def recognize_from_stream(src, encoder: Encoder, threshold: float = 0.5, process
                 cv2.putText(frame, f"{label} ({conf_pct}%)", (x + 4, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
 
             cv2.imshow("Video Attendance", frame)
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
             break
 
     cap.release()
+    writer.close()
     cv2.destroyAllWindows()
     print(f"Done. Recognized {len(marked_today)} unique people.")
+    if sampler is not None:
+        print(f"Adaptive sampling: {sampler.stats()}")
+
+
+# Per-process state for headless workers (set by _init_headless_worker)
+_headless = {}
+
+
+def _init_headless_worker(names, matrix, model_name="Facenet", detector_backend="opencv"):
+    """Pool initializer: build the embedder + gallery once per worker process"""
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+    embedder = FaceNetEmbedder(model_name=model_name, detector_backend=detector_backend)
+    try:
+        embedder.embed_batch([np.zeros((160, 160, 3), dtype=np.uint8)])  # build + warm up the model
+    except Exception:
+        pass
+    _headless['embedder'] = embedder
+    _headless['gallery'] = FaceGallery.from_matrix(names, matrix)
+
+
+def _recognize_chunk(chunk):
+    """
+    Worker task: detect faces in a few sampled frames, embed all their crops
+    in ONE batch and match them
+
+    Args:
+        chunk: List of (frame_idx, time_s, frame)
+
+    Returns:
+        List of (frame_idx, time_s, [(box, name or None, similarity)])
+    """
+    embedder, gallery = _headless['embedder'], _headless['gallery']
+    frame_boxes, crops, owners = [], [], []
+    for k, (_, _, frame) in enumerate(chunk):
+        try:
+            boxes = embedder.detect(frame)
+        except Exception:
+            boxes = []
+        frame_boxes.append(boxes)
+        for j, crop in enumerate(crop_faces(frame, boxes)):
+            crops.append(crop)
+            owners.append((k, j))
+
+    matched = {}
+    if crops:
+        try:
+            embeddings = embedder.embed_batch(crops)
+            found = [i for i, emb in enumerate(embeddings) if emb is not None]
+            matches = gallery.match_batch([embeddings[i] for i in found]) if found else []
+            matched = {owners[i]: match for i, match in zip(found, matches)}
+        except Exception:
+            pass
+
+    results = []
+    for k, (frame_idx, time_s, _) in enumerate(chunk):
+        faces = []
+        for j, box in enumerate(frame_boxes[k]):
+            match = matched.get((k, j))
+            faces.append((tuple(int(v) for v in box),
+                          match.name if match is not None else None,
+                          float(match.similarity) if match is not None else 0.0))
+        results.append((frame_idx, time_s, faces))
+    return results
+
+
+def _read_sampled_frames(cap, out, process_every_n, stop, sampler=None):
+    """
+    Reader thread: grab() every frame but retrieve() (decode + convert) only
+    the sampled ones; puts (frame_idx, time_s, frame) and finally None.
+    With a sampler, every Nth frame is only analyzed and forwarded on demand.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_idx = 0
+    try:
+        while not stop.is_set():
+            if not cap.grab():
+                break
+            if frame_idx % process_every_n == 0:
+                ok, frame = cap.retrieve()
+                if ok and frame is not None and (sampler is None or sampler.should_process(frame, frame_idx / fps)):
+                    out.put((frame_idx, frame_idx / fps, frame))
+            frame_idx += 1
+    finally:
+        out.put(None)
+        _headless['frames_read'] = frame_idx
+
+
+def process_video_headless(src, encoder: Encoder, threshold: float = 0.5, process_every_n: int = 15,
+                           workers: int = None, chunk_frames: int = 4, log_path: str = None,
+                           sampler: AdaptiveSampler = None):
+    """
+    Offline batch mode for recorded videos: no window, decoding on a reader
+    thread, recognition across a process pool (results handled in frame order)
+
+    Args:
+        src: Video path/URL (or camera index)
+        encoder: Loaded Encoder (its gallery is shipped to every worker once)
+        threshold: Cosine similarity threshold
+        process_every_n: Sample every Nth frame
+        workers: Worker processes (default: CPU count)
+        chunk_frames: Sampled frames per worker task (their crops share one batch)
+        log_path: Per-frame JSONL detections log (default: next to the attendance CSV)
+        sampler: Optional AdaptiveSampler; every Nth frame is then analyzed for motion only
+    """
+    cap = cv2.VideoCapture(src, cv2.CAP_DSHOW) if isinstance(src, int) else cv2.VideoCapture(src)
+    if not cap.isOpened():
+        print("Error: cannot open video source")
+        return
+
+    writer = AttendanceWriter()
+    log_path = log_path or os.path.join(ATTENDANCE_DIR, f"detections_{writer.today}.jsonl")
+    workers = max(1, workers or os.cpu_count() or 1)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    print(f"Attendance target: {writer.path}")
+    print(f"Detections log: {log_path}")
+    print(f"Headless mode: {workers} worker(s), every {process_every_n}th frame"
+          + (f" of {total} ({total / fps / 60:.1f} min of video)" if total else ""))
+
+    names = list(encoder.known_names)
+    matrix = np.stack(encoder.known_encodings).astype(np.float32)
+
+    # Bounded queue = back-pressure: the reader never runs far ahead of the workers
+    frames = queue.Queue(maxsize=workers * chunk_frames * 2)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_sampled_frames, args=(cap, frames, process_every_n, stop, sampler),
+                              name="VideoReader", daemon=True)
+
+    marked_today = set()
+    stats = {'sampled': 0, 'faces': 0}
+    start = time.time()
+
+    def handle(results, log):
+        for frame_idx, time_s, faces in results:
+            stats['sampled'] += 1
+            stats['faces'] += len(faces)
+            if sampler is not None:
+                sampler.record(len(faces), time_s)
+            record = []
+            for box, name, similarity in faces:
+                label = name if name is not None and similarity >= threshold else "Unknown"
+                if label != "Unknown" and label not in marked_today and writer.mark(label):
+                    marked_today.add(label)
+                    print(f"✓ Marked: {label} @ {time_s:.1f}s (sim {similarity:.2f})")
+                record.append({'box': list(box), 'name': label, 'similarity': round(similarity, 4)})
+            log.write(json.dumps({'frame': frame_idx, 'time_s': round(time_s, 3), 'faces': record}) + "\n")
+
+    def chunks():
+        chunk = []
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            chunk.append(item)
+            if len(chunk) >= chunk_frames:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    pool = None
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            reader.start()
+            if workers == 1:
+                _init_headless_worker(names, matrix)
+                for chunk in chunks():
+                    handle(_recognize_chunk(chunk), log)
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_headless_worker,
+                                           initargs=(names, matrix))
+                pending = deque()
+                for chunk in chunks():
+                    pending.append(pool.submit(_recognize_chunk, chunk))
+                    # Keep every worker busy, consume in submission (= frame) order
+                    while len(pending) > workers * 2 or (pending and pending[0].done()):
+                        handle(pending.popleft().result(), log)
+                while pending:
+                    handle(pending.popleft().result(), log)
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+    finally:
+        stop.set()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        reader.join(timeout=2.0)
+        cap.release()
+        writer.close()
+
+    elapsed = max(time.time() - start, 1e-6)
+    frames_read = _headless.get('frames_read', 0)
+    video_s = frames_read / fps
+    print("=" * 60)
+    print(f"Done. Recognized {len(marked_today)} unique people.")
+    print(f"  {frames_read} frames read, {stats['sampled']} processed, {stats['faces']} faces")
+    print(f"  {elapsed:.1f}s wall for {video_s:.1f}s of video ({video_s / elapsed:.1f}x real time)")
+    if sampler is not None:
+        print(f"  Adaptive sampling: {sampler.stats()}")
+    print("=" * 60)
 
 
 def parse_args():
     p = argparse.ArgumentParser(description="Process attendance from a video/stream using DeepFace")
     p.add_argument("--video", required=True, help="Path/URL to video, or integer index for webcam (e.g., 0)")
     p.add_argument("--images", default=None, help="Folder with known faces; defaults to images or student_images")
-    p.add_argument("--threshold", type=float, default=0.5, help="Cosine similarity threshold (0.0-1.0)")
-    p.add_argument("--every", type=int, default=15, help="Process every Nth frame")
+    p.add_argument("--threshold", type=float, default=None,
+                   help="Cosine similarity threshold (0.0-1.0; default: calibrated for --target-far, else 0.5)")
+    p.add_argument("--target-far", type=float, default=None,
+                   help="False accept rate to pick the calibrated threshold for (default: FACE_TARGET_FAR or 0.001)")
+    p.add_argument("--every", type=int, default=15,
+                   help="Process every Nth frame (with --adaptive --headless: analyze every Nth frame for motion)")
+    p.add_argument("--adaptive", action="store_true", help="Motion-driven sampling instead of a fixed stride")
+    p.add_argument("--budget", type=float, default=5.0, help="Embeddings per second allowed with --adaptive")
+    p.add_argument("--idle", type=float, default=5.0, help="Seconds between checks of a static scene with --adaptive")
+    p.add_argument("--no-cache", action="store_true", help="Re-embed every known image (ignore the embedding cache)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Worker processes for embedding the known-faces folder and for --headless (default: CPU count)")
+    p.add_argument("--headless", action="store_true", help="Offline batch mode: no window, parallel recognition")
+    p.add_argument("--log", default=None, help="JSONL detections log for --headless")
+    p.add_argument("--chunk", type=int, default=4, help="Sampled frames per worker task in --headless mode")
     return p.parse_args()
 
 
@@ -235,13 +482,21 @@ def main():
 
     print(f"Using known faces from: {images_folder}")
 
-    encoder = Encoder(images_folder)
+    encoder = Encoder(images_folder, use_cache=not args.no_cache, workers=args.workers or os.cpu_count() or 1)
     if not encoder.load():
         print("No known faces found. Please add folders as images/Name/*.jpg or use the GUI to capture.")
         sys.exit(1)
 
     print(f"Loaded {len(encoder.known_names)} known people.")
-    recognize_from_stream(src, encoder, threshold=args.threshold, process_every_n=args.every)
+    if args.threshold is None:
+        args.threshold = load_threshold(args.target_far, default=0.5)
+    print(f"Match threshold: {args.threshold:.3f}")
+    sampler = AdaptiveSampler(budget=args.budget, idle_interval=args.idle) if args.adaptive else None
+    if args.headless:
+        process_video_headless(src, encoder, threshold=args.threshold, process_every_n=args.every,
+                               workers=args.workers, chunk_frames=args.chunk, log_path=args.log, sampler=sampler)
+    else:
+        recognize_from_stream(src, encoder, threshold=args.threshold, process_every_n=args.every, sampler=sampler)
 
 
 if __name__ == "__main__":
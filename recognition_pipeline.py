@@ -0,0 +1,246 @@
+"""
+Recognition Pipeline (capture -> recognition worker -> render)
+The Tk loop only submits the newest frame and draws whatever results the worker
+published last, so a slow DeepFace call never blocks the window. Tk widgets must
+only be touched from the main thread: worker-side code posts UI callbacks, and
+the render loop runs them via drain_events().
+
+FaceMatcher is the embed-and-match step both GUIs run inside process_frame.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from facenet_embedder import crop_faces
+
+
+class RecognitionWorker:
+    """
+    Background thread that runs process_fn(frame) on the most recently submitted
+    frame. Frames submitted while it is busy replace each other (only the newest
+    is processed), so recognition naturally runs at its own rate.
+    """
+
+    def __init__(self, process_fn, name="recognition-worker"):
+        """
+        Args:
+            process_fn: Callable(frame) -> results (any object, e.g. list of face dicts)
+            name: Thread name
+        """
+        self.process_fn = process_fn
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending = None          # newest frame waiting for the worker
+        self._results = []
+        self._results_time = 0.0
+        self._running = False
+        self._thread = None
+        self._events = queue.Queue()  # UI callbacks for the main thread
+
+        # Stats
+        self._submitted = 0
+        self._processed = 0
+        self._skipped = 0
+        self._last_duration = 0.0
+        self._finish_times = deque(maxlen=30)
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, frame):
+        """Hand the newest frame to the worker (replaces a frame it has not picked up yet)"""
+        with self._cond:
+            if self._pending is not None:
+                self._skipped += 1
+            self._pending = frame
+            self._submitted += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, self._pending = self._pending, None
+
+            start = time.time()
+            try:
+                results = self.process_fn(frame)
+            except Exception as e:
+                print(f"⚠ Recognition worker error: {e}")
+                results = []
+            finished = time.time()
+
+            with self._cond:
+                self._results = results
+                self._results_time = finished
+                self._processed += 1
+                self._last_duration = finished - start
+                self._finish_times.append(finished)
+
+    def latest(self):
+        """Return (results, age in seconds) of the most recent recognition pass"""
+        with self._cond:
+            age = time.time() - self._results_time if self._results_time else float('inf')
+            return self._results, age
+
+    def post(self, callback, *args, **kwargs):
+        """Queue a UI call (update_info, messagebox, ...) to run on the Tk thread"""
+        self._events.put((callback, args, kwargs))
+
+    def drain_events(self, limit=20):
+        """Run queued UI callbacks; call from the render loop (main thread)"""
+        for _ in range(limit):
+            try:
+                callback, args, kwargs = self._events.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠ UI callback error: {e}")
+
+    def stats(self):
+        """Recognition fps, per-pass latency and how many frames were never processed"""
+        with self._cond:
+            fps = 0.0
+            if len(self._finish_times) > 1:
+                span = self._finish_times[-1] - self._finish_times[0]
+                if span > 0:
+                    fps = (len(self._finish_times) - 1) / span
+            return {
+                'recognition_fps': round(fps, 1),
+                'last_pass_ms': round(self._last_duration * 1000.0, 1),
+                'submitted': self._submitted,
+                'processed': self._processed,
+                'skipped': self._skipped,
+            }
+
+    def stop(self):
+        """Stop the worker thread (waits for the current pass to finish)"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.drain_events(limit=1000)
+
+
+class FaceMatcher:
+    """
+    Embed-and-match step of the live recognizers: faces are aligned to the
+    FaceNet template (padded crop when no aligner is given), embedded in one
+    forward pass and matched against the gallery in one matrix product.
+    With a tracker, a face reuses its track's last match and only new or
+    refresh-due tracks that pass the quality gate are embedded.
+    """
+
+    def __init__(self, embedder, tracker=None, aligner=None, quality_gate=None, best_crops=None,
+                 padding=20, min_size=50):
+        """
+        Args:
+            embedder: FaceNetEmbedder (embed_batch)
+            tracker: FaceTracker for match_tracked_faces
+            aligner: FaceAligner, or None for padded box crops
+            quality_gate: Optional QualityGate; faces failing it wait for a better frame
+            best_crops: Optional BestCropKeeper fed with each track's best crop
+            padding: Pixels around the box for padded crops and kept best crops
+            min_size: Faces whose padded crop is smaller than this are not embedded
+        """
+        self.embedder = embedder
+        self.tracker = tracker
+        self.aligner = aligner
+        self.quality_gate = quality_gate
+        self.best_crops = best_crops
+        self.padding = padding
+        self.min_size = min_size
+        self.track_matches = {}   # {track_id: MatchResult}
+        self.frame_tracks = {}    # {(x, y, w, h): track_id} of the last tracked frame
+
+    def crops(self, frame, faces, landmarks=None):
+        """
+        Crops the embedder sees for the given faces
+
+        Args:
+            faces: (x, y, w, h) boxes
+            landmarks: Optional {box: (5, 2) landmarks} for the aligner
+
+        Returns:
+            List aligned with faces: BGR crop, or None for faces too small to embed
+        """
+        landmarks = landmarks or {}
+        crops = []
+        for box in faces:
+            box = tuple(int(v) for v in box)
+            padded = crop_faces(frame, [box], padding=self.padding, min_size=self.min_size)[0]
+            if padded is not None and self.aligner is not None:
+                padded = self.aligner.align(frame, box, landmarks.get(box))
+            crops.append(padded)
+        return crops
+
+    def match_faces(self, frame, faces, gallery, threshold, landmarks=None):
+        """
+        Embed every face in one batch and match it against the gallery
+
+        Returns:
+            {(x, y, w, h): MatchResult} - faces too small or not embeddable are left out
+        """
+        boxes = [tuple(int(v) for v in box) for box in faces]
+        found = [(box, crop) for box, crop in zip(boxes, self.crops(frame, boxes, landmarks)) if crop is not None]
+        if not found:
+            return {}
+        embeddings = self.embedder.embed_batch([crop for _, crop in found])
+        found = [(box, emb) for (box, _), emb in zip(found, embeddings) if emb is not None]
+        if not found:
+            return {}
+        matches = gallery.match_batch([emb for _, emb in found], threshold=threshold)
+        return {box: match for (box, _), match in zip(found, matches)}
+
+    def match_tracked_faces(self, frame, faces, gallery, threshold, landmarks=None):
+        """
+        Reuse the cached match of tracked faces; embed only new tracks and
+        tracks whose refresh interval expired
+
+        Returns:
+            {(x, y, w, h): MatchResult} for faces with a known result
+        """
+        tracks = self.tracker.update(faces)
+        passed = [True] * len(tracks)
+        if self.quality_gate is not None:
+            # One vectorized quality pass: low-quality faces wait for a better frame
+            quality = self.quality_gate.assess(frame, [t.box for t in tracks], landmarks)
+            passed = quality.passed
+            if self.best_crops is not None:
+                for track, score in zip(tracks, quality.score):
+                    self.best_crops.offer(track.id, score,
+                                          lambda box=track.box: crop_faces(frame, [box], padding=self.padding)[0])
+        self.frame_tracks = {t.box: t.id for t in tracks}
+
+        due = self.tracker.due([t for t, ok in zip(tracks, passed) if ok])
+        if due:
+            fresh = self.match_faces(frame, [t.box for t in due], gallery, threshold, landmarks)
+            for track in due:
+                if track.box in fresh:
+                    self.track_matches[track.id] = fresh[track.box]
+                    self.tracker.mark_embedded(track)
+
+        # Forget results of tracks that disappeared
+        active = self.tracker.active_ids()
+        self.track_matches = {tid: m for tid, m in self.track_matches.items() if tid in active}
+        if self.best_crops is not None:
+            self.best_crops.prune(active)
+        return {t.box: self.track_matches[t.id] for t in tracks if t.id in self.track_matches}
+
+    def best_crop(self, box):
+        """Best crop kept for the track of a box from the last tracked frame, or None"""
+        if self.best_crops is None:
+            return None
+        return self.best_crops.best(self.frame_tracks.get(tuple(int(v) for v in box)))
@@ -8,6 +8,7 @@ import numpy as np
 import os
 from datetime import datetime
 import pickle
+from attendance_store import get_ledger
 
 class SimpleFaceAttendance:
     def __init__(self):
@@ -102,29 +103,12 @@ class SimpleFaceAttendance:
         return False
     
     def mark_attendance(self, name):
-        """Mark attendance in CSV file"""
-        # Create file with header if it doesn't exist
-        if not os.path.exists(self.attendance_file):
-            with open(self.attendance_file, 'w') as f:
-                f.write("Name,Date,Time\n")
-        
-        # Check if already marked today
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        with open(self.attendance_file, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if name in line and today in line:
-                    return False  # Already marked
-        
-        # Mark attendance
-        with open(self.attendance_file, 'a') as f:
-            now = datetime.now()
-            date_string = now.strftime("%Y-%m-%d")
-            time_string = now.strftime("%H:%M:%S")
-            f.write(f"{name},{date_string},{time_string}\n")
-        
-        return True
+        """Mark attendance in CSV file (once per name per day)"""
+        # The whole file is indexed once; the duplicate check is an exact (Name, Date) lookup
+        ledger = get_ledger(self.attendance_file, header=["Name", "Date", "Time"], key_columns=(0, 1),
+                            lineterminator="\n")
+        now = datetime.now()
+        return ledger.mark([name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")])
     
     def start_recognition(self):
         """Start face recognition from webcam"""
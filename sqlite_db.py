@@ -0,0 +1,385 @@
+"""
+SQLite Database Backend for Face Recognition Attendance System
+Offline drop-in for SupabaseDB (same methods, same row fields), stored in a
+local WAL-mode database with indexes on student_id, name and date.
+Also imports the existing CSV files (students + all attendance formats).
+
+Usage:
+  python sqlite_db.py --import            # import CSVs into attendance.db
+  python sqlite_db.py --db other.db --import
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_DB_PATH = "attendance.db"
+
+
+def _iso_date(value):
+    """Normalize d/m/Y (attendance.csv) or Y-m-d dates to Y-m-d"""
+    value = (value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+class SQLiteDB:
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """Open (or create) the local database"""
+        self.db_path = db_path
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # One shared connection; the lock serializes access from camera/worker threads
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.init_database()
+        print(f"✅ SQLite database ready: {db_path}")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def init_database(self):
+        """Create tables and indexes if they don't exist"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS students (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_id TEXT UNIQUE NOT NULL,
+                        name TEXT NOT NULL,
+                        department TEXT,
+                        year TEXT,
+                        email TEXT,
+                        phone TEXT,
+                        photo_path TEXT,
+                        encoding_path TEXT,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS attendance (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_id TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        department TEXT,
+                        date TEXT NOT NULL,
+                        time TEXT NOT NULL,
+                        status TEXT DEFAULT 'Present',
+                        match_confidence REAL,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                # student_id on students is covered by its UNIQUE constraint
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_students_name ON students(name)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance(student_id, date)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_name ON attendance(name)")
+            return True
+        except Exception as e:
+            print(f"❌ Error creating tables: {e}")
+            return False
+
+    def add_student(self, student_id, name, department, year, email, phone, photo_path=None, encoding_path=None):
+        """Add a new student to the database"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO students (student_id, name, department, year, email, phone, photo_path, "
+                    "encoding_path, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (student_id, name, department, year, email, phone, photo_path, encoding_path,
+                     datetime.now().isoformat()))
+            print(f"✅ Student added: {name}")
+            return True
+        except Exception as e:
+            print(f"❌ Error adding student: {e}")
+            return False
+
+    def get_all_students(self):
+        """Get all students from database"""
+        try:
+            return self._query("SELECT * FROM students ORDER BY id")
+        except Exception as e:
+            print(f"❌ Error fetching students: {e}")
+            return []
+
+    def get_student(self, student_id):
+        """Get a specific student by ID"""
+        try:
+            rows = self._query("SELECT * FROM students WHERE student_id = ?", (student_id,))
+            return rows[0] if rows else None
+        except Exception as e:
+            print(f"❌ Error fetching student: {e}")
+            return None
+
+    def get_student_by_name(self, name):
+        """Get a student by (case-insensitive) name"""
+        try:
+            rows = self._query("SELECT * FROM students WHERE name = ? COLLATE NOCASE LIMIT 1", (name,))
+            return rows[0] if rows else None
+        except Exception as e:
+            print(f"❌ Error fetching student: {e}")
+            return None
+
+    def update_student(self, student_id, **kwargs):
+        """Update student information"""
+        allowed = {"name", "department", "year", "email", "phone", "photo_path", "encoding_path"}
+        fields = {k: v for k, v in kwargs.items() if k in allowed}
+        try:
+            fields["updated_at"] = datetime.now().isoformat()
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            with self._lock, self.conn:
+                self.conn.execute(f"UPDATE students SET {assignments} WHERE student_id = ?",
+                                  (*fields.values(), student_id))
+            print(f"✅ Student updated: {student_id}")
+            return True
+        except Exception as e:
+            print(f"❌ Error updating student: {e}")
+            return False
+
+    def delete_student(self, student_id):
+        """Delete a student (and their attendance, like ON DELETE CASCADE on Supabase)"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute("DELETE FROM attendance WHERE student_id = ?", (student_id,))
+                self.conn.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
+            print(f"✅ Student deleted: {student_id}")
+            return True
+        except Exception as e:
+            print(f"❌ Error deleting student: {e}")
+            return False
+
+    def mark_attendance(self, student_id, name, department, date, time, confidence=None):
+        """Mark attendance for a student"""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO attendance (student_id, name, department, date, time, status, match_confidence) "
+                    "VALUES (?, ?, ?, ?, ?, 'Present', ?)",
+                    (student_id, name, department, date, time, confidence))
+            print(f"✅ Attendance marked: {name} at {time}")
+            return True
+        except Exception as e:
+            print(f"❌ Error marking attendance: {e}")
+            return False
+
+    def get_attendance_by_date(self, date):
+        """Get attendance records for a specific date"""
+        try:
+            return self._query("SELECT * FROM attendance WHERE date = ? ORDER BY time", (date,))
+        except Exception as e:
+            print(f"❌ Error fetching attendance: {e}")
+            return []
+
+    def get_attendance_by_student(self, student_id, start_date=None, end_date=None):
+        """Get attendance records for a specific student"""
+        try:
+            sql = "SELECT * FROM attendance WHERE student_id = ?"
+            params = [student_id]
+            if start_date:
+                sql += " AND date >= ?"
+                params.append(start_date)
+            if end_date:
+                sql += " AND date <= ?"
+                params.append(end_date)
+            return self._query(sql + " ORDER BY date DESC", params)
+        except Exception as e:
+            print(f"❌ Error fetching student attendance: {e}")
+            return []
+
+    def get_all_attendance(self, limit=100):
+        """Get all attendance records"""
+        try:
+            return self._query("SELECT * FROM attendance ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
+        except Exception as e:
+            print(f"❌ Error fetching all attendance: {e}")
+            return []
+
+    def check_duplicate_attendance(self, student_id, date):
+        """Check if attendance already marked for student on this date"""
+        try:
+            return bool(self._query("SELECT 1 FROM attendance WHERE student_id = ? AND date = ? LIMIT 1",
+                                    (student_id, date)))
+        except Exception as e:
+            print(f"❌ Error checking duplicate: {e}")
+            return False
+
+    def get_attendance_statistics(self, start_date=None, end_date=None):
+        """Get attendance statistics"""
+        try:
+            query = """
+                SELECT
+                    s.student_id,
+                    s.name,
+                    s.department,
+                    COUNT(a.id) as total_days_present,
+                    AVG(a.match_confidence) as avg_confidence
+                FROM students s
+                LEFT JOIN attendance a ON s.student_id = a.student_id
+            """
+            # Date range in the ON clause: students without attendance in it still get a 0 row
+            params = []
+            if start_date:
+                query += " AND a.date >= ?"
+                params.append(start_date)
+            if end_date:
+                query += " AND a.date <= ?"
+                params.append(end_date)
+            query += " GROUP BY s.student_id, s.name, s.department ORDER BY total_days_present DESC"
+            return self._query(query, params)
+        except Exception as e:
+            print(f"❌ Error fetching statistics: {e}")
+            return []
+
+    def test_connection(self):
+        """Test database connection"""
+        try:
+            version = self._query("SELECT sqlite_version() AS version")[0]["version"]
+            print(f"✅ SQLite connection successful! (SQLite {version}, {self.db_path})")
+            return True
+        except Exception as e:
+            print(f"❌ Connection test failed: {e}")
+            return False
+
+    # ==================== CSV Import ====================
+
+    def _upsert_student(self, student_id, name, department="", year="", email="", phone="", photo_path=None):
+        self.conn.execute(
+            "INSERT INTO students (student_id, name, department, year, email, phone, photo_path) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(student_id) DO UPDATE SET name = excluded.name, department = excluded.department, "
+            "year = excluded.year, email = excluded.email, phone = excluded.phone, "
+            "photo_path = COALESCE(excluded.photo_path, students.photo_path)",
+            (student_id, name, department, year, email, phone, photo_path))
+
+    def _insert_attendance(self, student_id, name, department, date, time, status="Present"):
+        """Insert unless (student_id, date) already exists; returns True if inserted"""
+        cur = self.conn.execute(
+            "INSERT INTO attendance (student_id, name, department, date, time, status) "
+            "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+            "(SELECT 1 FROM attendance WHERE student_id = ? AND date = ?)",
+            (student_id, name, department, date, time, status or "Present", student_id, date))
+        return cur.rowcount > 0
+
+    def import_csv_data(self, students_file="students_database.csv", student_csv="data/student.csv",
+                        attendance_files=None):
+        """
+        Import existing CSV data (safe to run repeatedly)
+
+        Args:
+            students_file: ID,Name,Department,Year,Email,Phone,Photo,Date_Added
+            student_csv: Student window format (dept,course,year,sem,id,name,div,roll,...)
+            attendance_files: CSVs to import; default attendance.csv, attendance_deepface.csv
+                              and attendance_records/attendance_*.csv
+
+        Returns:
+            dict with counts of imported students and attendance rows
+        """
+        if attendance_files is None:
+            attendance_files = ["attendance.csv", "attendance_deepface.csv"] + \
+                sorted(glob.glob(os.path.join("attendance_records", "attendance_*.csv")))
+        counts = {"students": 0, "attendance": 0, "skipped": 0}
+
+        with self._lock, self.conn:
+            if os.path.exists(students_file):
+                with open(students_file, "r", newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        if row.get("ID") and row.get("Name"):
+                            self._upsert_student(row["ID"].strip(), row["Name"].strip(), row.get("Department", ""),
+                                                 row.get("Year", ""), row.get("Email", ""), row.get("Phone", ""),
+                                                 row.get("Photo") or None)
+                            counts["students"] += 1
+
+            if os.path.exists(student_csv):
+                with open(student_csv, "r", newline="", encoding="utf-8") as f:
+                    for row in csv.reader(f):
+                        if len(row) > 11 and row[4].strip():
+                            self._upsert_student(row[4].strip(), row[5].strip(), row[0], row[2], row[10], row[11])
+                            counts["students"] += 1
+
+            by_name = {r["name"].strip().lower(): (r["student_id"], r["department"])
+                       for r in self.conn.execute("SELECT student_id, name, department FROM students")}
+
+            def resolve(name, student_id="", department=""):
+                known = by_name.get(name.strip().lower())
+                if not student_id:
+                    student_id = known[0] if known else name.strip()
+                if not department and known:
+                    department = known[1] or ""
+                return student_id, department
+
+            for path in attendance_files:
+                if not os.path.exists(path):
+                    continue
+                with open(path, "r", newline="", encoding="utf-8") as f:
+                    rows = [r for r in csv.reader(f) if r and any(c.strip() for c in r)]
+                if not rows:
+                    continue
+                header = [c.strip().lower() for c in rows[0]]
+                for row in rows:
+                    row = [c.strip() for c in row]
+                    if [c.lower() for c in row] == header and "name" in header:
+                        continue
+                    if "name" in header and len(row) >= len(header):
+                        # Headed formats: ID,Name,Department,Date,Time,Status / Name,Date,Time[,Status]
+                        rec = dict(zip(header, row))
+                        sid, dept = resolve(rec["name"], rec.get("id", ""), rec.get("department", ""))
+                        inserted = self._insert_attendance(sid, rec["name"], dept, _iso_date(rec.get("date")),
+                                                           rec.get("time", ""), rec.get("status", "Present"))
+                    elif len(row) >= 6:
+                        # main.py attendance.csv: id,roll,name,dept,time,date(d/m/Y),status
+                        inserted = self._insert_attendance(row[0], row[2], row[3], _iso_date(row[5]), row[4],
+                                                           row[6] if len(row) > 6 else "Present")
+                    else:
+                        inserted = False
+                    counts["attendance" if inserted else "skipped"] += 1
+
+        print(f"✅ Imported {counts['students']} student rows, {counts['attendance']} attendance rows "
+              f"({counts['skipped']} duplicates/unreadable skipped)")
+        return counts
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# Singleton instance
+_db_instance = None
+
+
+def get_db(db_path=DEFAULT_DB_PATH):
+    """Get or create database instance"""
+    global _db_instance
+    if _db_instance is None:
+        _db_instance = SQLiteDB(db_path)
+    return _db_instance
+
+
+def main():
+    p = argparse.ArgumentParser(description="Local SQLite storage for students and attendance")
+    p.add_argument("--db", default=DEFAULT_DB_PATH, help="Database file")
+    p.add_argument("--import", dest="do_import", action="store_true", help="Import the existing CSV files")
+    args = p.parse_args()
+
+    db = SQLiteDB(args.db)
+    if args.do_import:
+        db.import_csv_data()
+    db.test_connection()
+    print(f"   Students: {len(db.get_all_students())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Student Directory Cache
+Maps LBPH labels (student IDs) to data/student.csv records without touching
+the file on every recognized face. The CSV is parsed once and re-read only
+when its size/mtime changes (checked at most every check_interval seconds)
+or when the Student window calls invalidate() after saving.
+"""
+import csv
+import os
+import threading
+import time
+
+STUDENT_CSV = "data/student.csv"
+
+
+class StudentDirectory:
+    """ID-keyed, lazily refreshed view of the Student window's CSV"""
+
+    def __init__(self, path=STUDENT_CSV, check_interval=2.0):
+        """
+        Args:
+            path: Student CSV (dept,course,year,sem,id,name,div,roll,...)
+            check_interval: Seconds between stat() checks for external edits
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._by_id = {}
+        self._signature = None   # (mtime_ns, size) of the loaded file
+        self._checked_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a reload on the next lookup (call after writing the CSV)"""
+        self._stale = True
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _refresh(self):
+        now = time.time()
+        if not self._stale and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        signature = self._file_signature()
+        if not self._stale and signature == self._signature:
+            return
+
+        by_id = {}
+        if signature is not None:
+            try:
+                with open(self.path, "r", newline="") as f:
+                    for row in csv.reader(f):
+                        if len(row) > 7 and row[4]:
+                            # First row wins, like the old scan that stopped at the first match
+                            by_id.setdefault(row[4], {'id': row[4], 'roll': row[7], 'name': row[5],
+                                                      'department': row[0], 'row': row})
+            except Exception as e:
+                print(f"⚠ Could not read {self.path}: {e}")
+                return
+        self._by_id = by_id
+        self._signature = signature
+        self._stale = False
+
+    def get(self, student_id):
+        """Return the student dict (id, roll, name, department, row) for an ID (LBPH label) or None"""
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(str(student_id))
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._by_id)
+
+
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+def get_student_directory(path=STUDENT_CSV):
+    """Shared directory per CSV path, so the Student window can invalidate it for everyone"""
+    with _directories_lock:
+        if path not in _directories:
+            _directories[path] = StudentDirectory(path)
+        return _directories[path]
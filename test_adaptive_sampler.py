@@ -0,0 +1,69 @@
+"""
+Tests for the motion-driven frame sampler (adaptive_sampler.py)
+
+Run: python -m pytest -q test_adaptive_sampler.py
+"""
+import numpy as np
+
+from adaptive_sampler import AdaptiveSampler
+
+FPS = 30.0
+
+
+def _frame(value):
+    return np.full((120, 160, 3), value, dtype=np.uint8)
+
+
+def _run(sampler, frames, faces=0):
+    """Feed frames at FPS; returns the timestamps that were recognized"""
+    processed = []
+    for i, frame in enumerate(frames):
+        now = i / FPS
+        if sampler.should_process(frame, now=now):
+            sampler.record(faces, now=now)
+            processed.append(now)
+    return processed
+
+
+def test_static_scene_drops_to_the_heartbeat():
+    sampler = AdaptiveSampler(idle_interval=2.0, hot_seconds=0.5)
+    processed = _run(sampler, [_frame(100)] * int(10 * FPS))
+    assert processed[0] == 0.0
+    assert len(processed) <= 6
+    assert np.all(np.diff(processed) >= 2.0 - 1e-9)
+
+
+def test_motion_raises_the_rate_within_budget():
+    sampler = AdaptiveSampler(budget=5.0, min_interval=0.1)
+    frames = [_frame(int(i * 37) % 256) for i in range(int(4 * FPS))]   # every frame changes
+    processed = _run(sampler, frames)
+    assert sampler.motion_triggers >= 1
+    assert np.all(np.diff(processed) >= 0.1 - 1e-9)
+    assert 15 <= len(processed) <= 5 * 4 + 5   # budget refill over 4s + the initial tokens
+
+
+def test_budget_caps_embeddings_per_second():
+    sampler = AdaptiveSampler(budget=4.0, min_interval=0.0)
+    frames = [_frame(int(i * 37) % 256) for i in range(int(5 * FPS))]
+    processed = _run(sampler, frames, faces=4)
+    # 4 embeddings/s with 4 faces per pass: about one pass per second plus the initial tokens
+    assert len(processed) <= 5 + 2
+    assert sampler.budget_skips > 0
+
+
+def test_new_face_keeps_the_rate_high():
+    sampler = AdaptiveSampler(min_interval=0.1, idle_interval=5.0, hot_seconds=1.0, budget=100.0)
+    frame = _frame(80)
+    assert sampler.should_process(frame, now=0.0)
+    sampler.record(2, now=0.0)   # more faces than before
+    assert sampler.should_process(frame, now=0.2)
+    sampler.record(2, now=0.2)
+    assert not sampler.should_process(frame, now=1.5)   # cooled down, static scene
+
+
+def test_stats():
+    sampler = AdaptiveSampler()
+    _run(sampler, [_frame(50)] * 10)
+    stats = sampler.stats()
+    assert stats['frames'] == 10
+    assert stats['processed'] == 1
@@ -0,0 +1,97 @@
+"""
+Tests for the approximate nearest-neighbour index (ann_index.py)
+
+Run: python -m pytest -q test_ann_index.py
+"""
+import numpy as np
+import pytest
+
+from ann_index import ExactIndex, IVFIndex, create_index, insert_into_saved_index, load_index
+from face_gallery import FaceGallery, l2_normalize
+
+
+def _unit_vectors(count, dim=64, seed=0):
+    vectors, _ = l2_normalize(np.random.default_rng(seed).normal(size=(count, dim)))
+    return vectors
+
+
+def test_exact_search_returns_best_first():
+    data = _unit_vectors(50)
+    index = ExactIndex()
+    index.build(data)
+    ids, scores = index.search(data[:3], k=4)
+    assert ids[:, 0].tolist() == [0, 1, 2]
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+
+def test_ivf_probing_every_list_is_exact():
+    data = _unit_vectors(300)
+    queries = _unit_vectors(20, seed=1)
+    exact = ExactIndex()
+    exact.build(data)
+    ivf = IVFIndex(n_lists=8, n_probe=8)
+    ivf.build(data)
+    exact_ids, _ = exact.search(queries, k=5)
+    ivf_ids, _ = ivf.search(queries, k=5)
+    assert np.array_equal(exact_ids, ivf_ids)
+
+
+def test_ivf_recall_with_few_probes():
+    data = _unit_vectors(1000)
+    queries = data[:100] + 0.05 * _unit_vectors(100, seed=2)
+    ivf = IVFIndex(n_lists=32, n_probe=4)
+    ivf.build(data)
+    ids, _ = ivf.search(queries, k=1)
+    assert np.mean(ids[:, 0] == np.arange(100)) >= 0.9
+
+
+def test_incremental_add_is_searchable():
+    data = _unit_vectors(101)
+    ivf = IVFIndex(n_lists=4)
+    ivf.build(data[:100])
+    rows = ivf.add(data[100:])
+    assert rows.tolist() == [100]
+    ids, _ = ivf.search(data[100:], k=1)
+    assert ids[0, 0] == 100
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "index.npz")
+    data = _unit_vectors(64)
+    keys = [f"s{i}" for i in range(64)]
+    ivf = IVFIndex(n_lists=4, n_probe=2)
+    ivf.build(data)
+    ivf.save(path, keys)
+
+    loaded, loaded_keys = load_index(path)
+    assert isinstance(loaded, IVFIndex)
+    assert loaded_keys == keys
+    assert np.array_equal(loaded.search(data[:5], k=3)[0], ivf.search(data[:5], k=3)[0])
+
+    new = _unit_vectors(1, seed=3)[0]
+    assert insert_into_saved_index(path, "new", new)
+    reloaded, reloaded_keys = load_index(path)
+    assert reloaded_keys[-1] == "new"
+    assert reloaded.search(new[None, :], k=1)[0][0, 0] == 64
+
+
+def test_missing_index_file(tmp_path):
+    assert load_index(str(tmp_path / "missing.npz")) == (None, None)
+    assert not insert_into_saved_index(str(tmp_path / "missing.npz"), "x", np.ones(4))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_index("hnsw")
+
+
+def test_gallery_with_index_matches_dense_scan():
+    data = _unit_vectors(200)
+    names = [f"s{i}" for i in range(200)]
+    queries = data[:10] + 0.1 * _unit_vectors(10, seed=4)
+    dense = FaceGallery.from_lists(names, data)
+    indexed = FaceGallery.from_lists(names, data, index="exact")
+    for a, b in zip(dense.match_batch(queries), indexed.match_batch(queries)):
+        assert a.name == b.name
+        assert a.runner_up == b.runner_up
+        assert np.isclose(a.similarity, b.similarity, atol=1e-5)
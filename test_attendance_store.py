@@ -0,0 +1,78 @@
+"""
+Tests for the append-only attendance ledger (attendance_store.py)
+
+Run: python -m pytest -q test_attendance_store.py
+"""
+import csv
+import datetime
+
+import pytest
+
+import attendance_store
+from attendance_store import AttendanceLedger, get_ledger
+
+HEADER = ['ID', 'Name', 'Department', 'Date', 'Time', 'Status']
+
+
+def _rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_duplicates_are_suppressed(tmp_path):
+    path = str(tmp_path / "attendance.csv")
+    ledger = AttendanceLedger(path, header=HEADER, key_columns=(3, 1))
+    assert ledger.mark(['1', 'Alice', 'CS', '2026-10-17', '09:00:00', 'Present'])
+    assert not ledger.mark(['1', 'Alice', 'CS', '2026-10-17', '09:05:00', 'Present'])
+    assert ledger.mark(['2', 'Bob', 'CS', '2026-10-17', '09:01:00', 'Present'])
+    ledger.close()
+
+    rows = _rows(path)
+    assert rows[0] == HEADER
+    assert [row[1] for row in rows[1:]] == ['Alice', 'Bob']
+    assert ('2026-10-17', 'Alice') in ledger
+
+
+def test_duplicates_are_suppressed_across_reopen(tmp_path):
+    path = str(tmp_path / "attendance.csv")
+    first = AttendanceLedger(path, header=HEADER, key_columns=(3, 1))
+    first.mark(['1', 'Alice', 'CS', '2026-10-17', '09:00:00', 'Present'])
+    first.close()
+
+    reopened = AttendanceLedger(path, header=HEADER, key_columns=(3, 1))
+    assert len(reopened) == 1
+    assert not reopened.mark(['1', 'Alice', 'CS', '2026-10-17', '10:00:00', 'Present'])
+    assert reopened.mark(['1', 'Alice', 'CS', '2026-10-18', '09:00:00', 'Present'])
+    reopened.close()
+    assert len(_rows(path)) == 3   # header written once
+
+
+def test_unterminated_last_row_is_not_merged(tmp_path):
+    path = tmp_path / "attendance.csv"
+    path.write_text("Name,Date,Time\nAlice,2026-10-17,09:00:00")
+    ledger = AttendanceLedger(str(path), header=["Name", "Date", "Time"], key_columns=(0, 1), lineterminator="\n")
+    assert ledger.mark(["Bob", "2026-10-17", "09:01:00"])
+    ledger.close()
+    assert _rows(str(path))[1:] == [["Alice", "2026-10-17", "09:00:00"], ["Bob", "2026-10-17", "09:01:00"]]
+
+
+def test_get_ledger_shares_one_instance_and_rejects_other_settings(tmp_path):
+    path = str(tmp_path / "attendance.csv")
+    ledger = get_ledger(path, header=HEADER, key_columns=(3, 1))
+    assert get_ledger(path, header=tuple(HEADER), key_columns=[3, 1]) is ledger
+    with pytest.raises(ValueError):
+        get_ledger(path, header=["Name", "Date", "Time", "Status"], key_columns=(0,))
+    with pytest.raises(ValueError):
+        get_ledger(path, header=HEADER, key_columns=(1,))
+
+
+def test_get_ledger_drops_past_day_ledgers(tmp_path, monkeypatch):
+    path = str(tmp_path / "attendance.csv")
+    ledger = get_ledger(path, header=HEADER, key_columns=(3, 1))
+    ledger.mark(['1', 'Alice', 'CS', '2026-10-17', '09:00:00', 'Present'])
+
+    monkeypatch.setattr(attendance_store, "_ledgers_day", datetime.date(2000, 1, 1))
+    fresh = get_ledger(path, header=HEADER, key_columns=(3, 1))
+    assert fresh is not ledger
+    assert ledger._file is None   # the old day's file handle was closed
+    assert ('2026-10-17', 'Alice') in fresh
@@ -0,0 +1,95 @@
+"""
+Tests for threshold calibration (calibrate_threshold.py)
+
+Run: python -m pytest -q test_calibrate_threshold.py
+"""
+import json
+
+import numpy as np
+
+from calibrate_threshold import (build_gallery, compute_curves, gallery_scores, genuine_rows, impostor_rows,
+                                 load_threshold, threshold_for_far)
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def _enrolled(students=6, per_student=4, dim=32, noise=0.6, seed=0):
+    """Centroids + templates of synthetic students, and a few probes of each"""
+    rng = np.random.default_rng(seed)
+    bases = _unit(rng.normal(size=(students, dim)))
+    names = [f"s{i}" for i in range(students)]
+
+    def around(base, count):
+        return _unit(base + noise * rng.normal(size=(count, dim)) / np.sqrt(dim))
+
+    templates = np.vstack([around(base, per_student) for base in bases])
+    template_names = [name for name in names for _ in range(per_student)]
+    centroids = _unit(templates.reshape(students, per_student, dim).mean(axis=1))
+    probes = [(name, around(base, 3)) for name, base in zip(names, bases)]
+    return names, centroids, template_names, templates, probes
+
+
+def test_far_and_frr_are_monotonic():
+    rng = np.random.default_rng(1)
+    curves = compute_curves(rng.normal(0.8, 0.1, 500), rng.normal(0.3, 0.15, 500))
+    far, frr = np.array(curves['far']), np.array(curves['frr'])
+    assert np.all(np.diff(far) <= 0)
+    assert np.all(np.diff(frr) >= 0)
+    assert far[0] == 1.0 and frr[0] == 0.0
+    assert 0.3 < curves['eer_threshold'] < 0.8
+
+
+def test_threshold_for_far():
+    curves = {'thresholds': [0.5, 0.6, 0.7, 0.8], 'far': [0.2, 0.05, 0.01, 0.0], 'frr': [0.0, 0.01, 0.1, 0.3]}
+    assert threshold_for_far(curves, 0.05) == 0.6
+    assert threshold_for_far(curves, 0.001) == 0.8
+    assert threshold_for_far({'thresholds': [0.5], 'far': [0.2], 'frr': [0.0]}, 0.1) is None
+
+
+def test_load_threshold_falls_back_to_default(tmp_path):
+    path = tmp_path / "threshold_calibration.json"
+    assert load_threshold(0.01, default=0.77, path=str(path)) == 0.77
+    path.write_text(json.dumps({'thresholds': [0.5, 0.6], 'far': [0.2, 0.0], 'frr': [0.0, 0.1]}))
+    assert load_threshold(0.01, default=0.77, path=str(path)) == 0.6
+    assert load_threshold(0.0, default=0.77, path=str(path)) == 0.6
+
+
+def test_curves_follow_the_runtime_template_refinement():
+    """At every threshold the curve FAR/FRR equal the accept decisions of match_batch"""
+    names, centroids, template_names, templates, probes = _enrolled()
+    margin = 0.1
+    genuine, impostor, cases = [], [], []
+    full = build_gallery(names, centroids, template_names, templates, margin)
+    for name, embeddings in probes:
+        genuine += genuine_rows(full, embeddings, [name] * len(embeddings))
+        without = build_gallery(names, centroids, template_names, templates, margin, exclude=name)
+        impostor += impostor_rows(without, embeddings)
+        cases.append((name, embeddings, without))
+    assert any(row[1] != row[2] for row in genuine + impostor)   # templates change some scores
+    curves = compute_curves(genuine, impostor, step=0.05, margin=margin)
+
+    for t, far, frr in zip(curves['thresholds'], curves['far'], curves['frr']):
+        if not 0.0 <= t <= 1.0:
+            continue
+        false_accepts = rejects = total = 0
+        for name, embeddings, without in cases:
+            for own, other in zip(full.match_batch(embeddings, threshold=t),
+                                  without.match_batch(embeddings, threshold=t)):
+                rejects += not (own.name == name and own.similarity >= t)
+                false_accepts += other.similarity >= t
+                total += 1
+        assert np.isclose(frr, rejects / total, atol=1e-6), t
+        assert np.isclose(far, false_accepts / total, atol=1e-6), t
+
+
+def test_gallery_scores_separate_genuine_from_impostor():
+    names, centroids, template_names, templates, _ = _enrolled(noise=0.4)
+    genuine, impostor = gallery_scores(names, centroids, template_names, templates)
+    assert len(genuine) == len(template_names)      # leave-one-out per template
+    assert len(impostor) == len(template_names)     # every template against the others
+    genuine_scores = np.array([row[1] for row in genuine])
+    impostor_scores = np.array([row[1] for row in impostor])
+    assert genuine_scores.mean() > impostor_scores.mean() + 0.3
@@ -0,0 +1,161 @@
+"""
+Tests for the packed embedding store (embedding_store.py)
+
+Run: python -m pytest -q test_embedding_store.py
+"""
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore, parse_encoding_filename
+
+
+def _vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_parse_encoding_filename():
+    assert parse_encoding_filename("2306096_AMAN SINHA_encoding.pkl") == ("2306096", "AMAN SINHA")
+    assert parse_encoding_filename("alice_encoding.pkl") == ("alice", "alice")
+
+
+def test_append_round_trip_and_replace(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = _vectors(3)
+    assert store.append("1", "Alice", vectors[0]) == 0
+    assert store.extend([("2", "Bob", vectors[1]), ("1", "Alice", vectors[2])]) == [1, 0]
+
+    ids, names, matrix = store.load()
+    assert ids == ["1", "2"]
+    assert names == ["Alice", "Bob"]
+    assert np.array_equal(matrix, np.stack([vectors[2], vectors[1]]))
+    assert isinstance(matrix, np.memmap)
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append("1", "Alice", _vectors(1)[0])
+    with pytest.raises(ValueError):
+        store.append("2", "Bob", np.ones(4))
+
+
+def test_migration_from_pickles(tmp_path):
+    vectors = _vectors(2)
+    for filename, vector in (("1_Alice_encoding.pkl", vectors[0]), ("2_Bob Smith_encoding.pkl", vectors[1])):
+        with open(tmp_path / filename, "wb") as f:
+            pickle.dump(vector, f)
+    store = EmbeddingStore(str(tmp_path))
+    assert store.ensure() == 2
+    assert store.ensure() == 0   # only once
+
+    ids, names, matrix = store.load()
+    assert (ids, names) == (["1", "2"], ["Alice", "Bob Smith"])
+    assert np.array_equal(matrix, vectors)
+
+
+def test_enroll_stores_centroid_and_templates(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    base = _vectors(1)[0]
+    samples = base + 0.05 * _vectors(4, seed=1)
+    store.enroll("1", "Alice", samples, max_templates=3)
+    store.append("2", "Bob", _vectors(1, seed=2)[0])
+
+    _, names, matrix = store.load()
+    assert names == ["Alice", "Bob"]
+    t_ids, t_names, templates = store.load_templates()
+    assert t_names == ["Alice"] * 3
+    assert t_ids == ["1"] * 3
+    assert templates.shape == (3, 8)
+
+    # Replacing a student without templates drops its old ones
+    store.append("1", "Alice", base)
+    assert store.load_templates()[1] == []
+
+
+def test_uncommitted_write_is_invisible(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.enroll("1", "Alice", _vectors(3))
+    before = store.load(mmap=False)
+    manifest = json.loads((tmp_path / "facenet_gallery.json").read_text())
+
+    # A crash after the data files of the next generation were written, before the manifest swap
+    generation = manifest['generation'] + 1
+    np.save(tmp_path / f"facenet_gallery.{generation}.npy", _vectors(1, seed=5))
+    np.save(tmp_path / f"facenet_gallery_templates.{generation}.npy", _vectors(1, seed=6))
+
+    after = store.load(mmap=False)
+    assert after[:2] == before[:2]
+    assert np.array_equal(after[2], before[2])
+    assert store.load_templates()[1] == ["Alice"] * 3
+
+
+def test_old_generations_are_removed(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    for i in range(4):
+        store.append(str(i), f"s{i}", _vectors(1, seed=i)[0])
+    files = sorted(f for f in os.listdir(tmp_path) if f.endswith(".npy"))
+    assert files == ["facenet_gallery.3.npy", "facenet_gallery.4.npy"]   # current + previous
+
+
+def test_version_2_store_loads_and_upgrades(tmp_path):
+    matrix, templates = _vectors(2), _vectors(3, seed=1)
+    np.save(tmp_path / "facenet_gallery.npy", matrix)
+    np.save(tmp_path / "facenet_gallery_templates.npy", templates)
+    (tmp_path / "facenet_gallery.json").write_text(json.dumps({
+        'version': 2, 'model': 'Facenet', 'dim': 8, 'count': 2,
+        'ids': ['1', '2'], 'names': ['Alice', 'Bob'], 'template_counts': [3, 0]}))
+
+    store = EmbeddingStore(str(tmp_path))
+    assert store.load()[1] == ['Alice', 'Bob']
+    assert np.array_equal(store.load_templates()[2], templates)
+
+    store.append("3", "Carol", _vectors(1, seed=2)[0])
+    assert store.load()[1] == ['Alice', 'Bob', 'Carol']
+    assert store.load_templates()[1] == ['Alice'] * 3
+    assert json.loads((tmp_path / "facenet_gallery.json").read_text())['generation'] == 1
+
+
+def test_newer_version_is_rejected(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.append("1", "Alice", _vectors(1)[0])
+    manifest = json.loads((tmp_path / "facenet_gallery.json").read_text())
+    manifest['version'] = 99
+    (tmp_path / "facenet_gallery.json").write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        store.load()
+
+
+def test_migration_merges_into_an_existing_store(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.enroll("1", "Alice", _vectors(3))                 # store-only student with templates
+    vectors = _vectors(2, seed=1)
+    for filename, vector in (("1_Alice_encoding.pkl", vectors[0]), ("2_Bob_encoding.pkl", vectors[1])):
+        with open(tmp_path / filename, "wb") as f:
+            pickle.dump(vector, f)
+    alice = store.load(mmap=False)[2][0].copy()
+
+    assert store.migrate_from_pickles() == 1                # only Bob is new
+    ids, names, matrix = store.load()
+    assert names == ["Alice", "Bob"]
+    assert np.array_equal(matrix[0], alice)
+    assert np.array_equal(matrix[1], vectors[1])
+    assert store.load_templates()[1] == ["Alice"] * 3
+    assert store.migrate_from_pickles() == 0
+
+
+def test_concurrent_enrolments_from_separate_instances(tmp_path):
+    vectors = _vectors(16)
+
+    def enrol(i):
+        EmbeddingStore(str(tmp_path)).append(str(i), f"s{i}", vectors[i])
+
+    threads = [threading.Thread(target=enrol, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(EmbeddingStore(str(tmp_path)).load()[0], key=int) == [str(i) for i in range(16)]
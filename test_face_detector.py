@@ -0,0 +1,61 @@
+"""
+Tests for the per-frame detection budget (face_detector.BudgetedDetector)
+
+Run: python -m pytest -q test_face_detector.py
+"""
+import time
+
+import numpy as np
+
+from face_detector import BudgetedDetector, Detection, FaceDetector, create_detector
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+class SlowDetector(FaceDetector):
+    """Takes ms * scale milliseconds per frame (scale=None: a fixed ms)"""
+    name = "slow"
+
+    def __init__(self, ms, scale=None):
+        self.ms = ms
+        self.scale = scale
+        self.calls = 0
+
+    def detect_faces(self, frame):
+        self.calls += 1
+        time.sleep(self.ms * (self.scale or 1.0) / 1000.0)
+        return [Detection((10, 10, 50, 50), 1.0, None)]
+
+
+def test_over_budget_lowers_the_scale_and_recovers():
+    backend = SlowDetector(40.0, scale=1.0)
+    detector = BudgetedDetector(backend, budget_ms=25.0, min_scale=0.25)
+    for _ in range(12):
+        detector.detect_faces(FRAME)
+    assert backend.scale < 1.0
+    assert detector.over_budget >= 1
+    assert backend.calls == 12   # scaling came first, no frame was skipped
+
+    backend.ms = 1.0   # the scene got cheap: the scale climbs back, never past the original
+    for _ in range(30):
+        detector.detect_faces(FRAME)
+    assert backend.scale == 1.0
+
+
+def test_backend_without_scale_skips_frames():
+    backend = SlowDetector(30.0)
+    detector = BudgetedDetector(backend, budget_ms=10.0)
+    results = [detector.detect_faces(FRAME) for _ in range(10)]
+    assert detector.skipped > 0
+    assert backend.calls + detector.skipped == 10
+    assert all(len(r) == 1 for r in results)   # skipped frames reuse the last detections
+    assert detector.stats()['frames'] == 10
+
+
+def test_create_detector_wraps_only_with_a_budget():
+    assert not isinstance(create_detector('haar'), BudgetedDetector)
+    detector = create_detector('haar', scale=0.5, budget_ms=30)
+    assert isinstance(detector, BudgetedDetector)
+    assert detector.name == 'haar'
+    assert detector.min_scale <= detector.scale == 0.5
+    assert detector.detect(FRAME).shape == (0, 4)
@@ -0,0 +1,78 @@
+"""
+Tests for the vectorized gallery matcher (face_gallery.py)
+
+Run: python -m pytest -q test_face_gallery.py
+"""
+import numpy as np
+
+from face_gallery import NO_MATCH, FaceGallery
+
+
+def _random_embeddings(count, dim=128, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def _brute_force(names, vectors, query):
+    """Per-identity best cosine similarity, the way the old per-student loop scored"""
+    q = query / np.linalg.norm(query)
+    best = {}
+    for name, vector in zip(names, vectors):
+        sim = float(q @ (vector / np.linalg.norm(vector)))
+        best[name] = max(best.get(name, -1.0), sim)
+    return sorted(best.items(), key=lambda item: item[1], reverse=True)
+
+
+def test_match_batch_equals_brute_force():
+    names = [f"student_{i}" for i in range(20)]
+    vectors = _random_embeddings(20)
+    gallery = FaceGallery.from_lists(names, vectors)
+    queries = vectors[:5] + 0.3 * _random_embeddings(5, seed=1)
+
+    for query, result in zip(queries, gallery.match_batch(queries)):
+        ranked = _brute_force(names, vectors, query)
+        assert result.name == ranked[0][0]
+        assert np.isclose(result.similarity, ranked[0][1], atol=1e-5)
+        assert result.runner_up == ranked[1][0]
+        assert np.isclose(result.runner_up_similarity, ranked[1][1], atol=1e-5)
+
+
+def test_several_templates_per_identity_reduce_to_one_score():
+    vectors = _random_embeddings(4)
+    gallery = FaceGallery.from_lists(["A", "B", "A", "C"], vectors)
+    result = gallery.match(vectors[2])
+    assert result.name == "A"
+    assert np.isclose(result.similarity, 1.0, atol=1e-5)
+    assert result.runner_up in ("B", "C")   # never the same identity again
+    assert sorted(gallery.names) == ["A", "B", "C"]
+
+
+def test_distance_is_raw_euclidean_to_the_winning_template():
+    vectors = _random_embeddings(3) * 5.0
+    gallery = FaceGallery.from_matrix(["A", "B", "C"], vectors)
+    query = vectors[1] * 0.9
+    result = gallery.match(query)
+    assert result.name == "B"
+    assert np.isclose(result.distance, np.linalg.norm(query - vectors[1]), rtol=1e-4)
+
+
+def test_empty_gallery_returns_no_match():
+    gallery = FaceGallery()
+    assert gallery.match_batch(_random_embeddings(3)) == [NO_MATCH] * 3
+    assert gallery.top_k(_random_embeddings(1)[0]) == []
+
+
+def test_top_k_is_sorted_and_distinct():
+    vectors = _random_embeddings(10)
+    gallery = FaceGallery.from_lists([f"s{i % 5}" for i in range(10)], vectors)
+    ranked = gallery.top_k(vectors[3], k=3)
+    assert ranked[0][0] == "s3"
+    assert len({name for name, _ in ranked}) == 3
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+
+
+def test_add_after_match_rebuilds_the_matrix():
+    vectors = _random_embeddings(3)
+    gallery = FaceGallery.from_lists(["A", "B"], vectors[:2])
+    assert gallery.match(vectors[2]).name in ("A", "B")
+    gallery.add("C", vectors[2])
+    assert gallery.match(vectors[2]).name == "C"
@@ -0,0 +1,89 @@
+"""
+Tests for multi-template enrolment (face_templates.py) and the gallery's
+near-threshold template refinement
+
+Run: python -m pytest -q test_face_templates.py
+"""
+import numpy as np
+
+from face_gallery import FaceGallery
+from face_templates import build_templates, robust_centroid, select_templates
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def _samples(count, dim=64, noise=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    base = _unit(rng.normal(size=dim))
+    return base, base + noise * rng.normal(size=(count, dim)).astype(np.float32) / np.sqrt(dim)
+
+
+def test_outlier_is_rejected():
+    base, samples = _samples(8)
+    outlier = _unit(np.random.default_rng(9).normal(size=64))
+    centroid, keep = robust_centroid(np.vstack([samples, outlier]))
+    assert keep[:8].all()
+    assert not keep[8]
+    assert float(centroid @ base) > 0.99
+
+
+def test_never_drops_every_sample():
+    _, keep = robust_centroid(_unit(np.random.default_rng(1).normal(size=(3, 64))), min_similarity=0.99)
+    assert keep.sum() >= 1
+
+
+def test_select_templates_is_capped_and_diverse():
+    unit = _unit(np.eye(4, 8) + 0.01)
+    centroid = _unit(unit.mean(axis=0))
+    chosen = select_templates(unit, centroid, 2)
+    assert len(chosen) == 2
+    assert len(set(chosen)) == 2
+    assert select_templates(unit, centroid, None) == [0, 1, 2, 3]
+
+
+def test_build_templates():
+    _, samples = _samples(6)
+    samples = samples * 7.0
+    result = build_templates(list(samples) + [None], max_templates=3)
+    assert result.inliers == 6
+    assert result.rejected == 0
+    assert result.templates.shape == (3, 64)
+    # The centroid keeps the raw embedding scale
+    assert np.isclose(np.linalg.norm(result.centroid), np.linalg.norm(samples, axis=1).mean(), rtol=1e-4)
+    assert build_templates([None]) is None
+
+
+def _gallery(margin=0.1):
+    """Two students: A's centroid along e0 with one template along e1, B's centroid along e1 + e2"""
+    centroids = np.stack([np.eye(8)[0], _unit(np.eye(8)[1] + np.eye(8)[2])]).astype(np.float32) * 5.0
+    gallery = FaceGallery.from_matrix(["A", "B"], centroids)
+    gallery.attach_templates(["A", "A"], np.eye(8, dtype=np.float32)[[0, 1]] * 5.0, margin=margin)
+    return gallery
+
+
+def test_templates_refine_only_near_the_threshold():
+    query = _unit(np.eye(8)[1] + 0.2 * np.eye(8)[2])   # close to A's second template, nearer to B's centroid
+    plain = _gallery().match(query)
+    assert plain.name == "B"
+
+    near = _gallery().match_batch([query], threshold=plain.similarity + 0.05)[0]
+    assert near.name == "A"
+    assert near.similarity > plain.similarity
+    assert near.runner_up == "B"
+
+    gallery = _gallery()
+    far = gallery.match_batch([query], threshold=plain.similarity + 0.5)[0]
+    assert far == plain
+    assert gallery.template_checks == 0
+
+
+def test_refinement_keeps_the_centroid_result_when_it_wins():
+    gallery = _gallery()
+    query = _unit(np.eye(8)[0] + 0.05 * np.eye(8)[3])
+    plain = gallery.match(query)
+    refined = gallery.match_batch([query], threshold=plain.similarity)[0]
+    assert refined == plain
+    assert gallery.template_checks == 1
@@ -0,0 +1,57 @@
+"""
+Tests for the IoU face tracker (face_tracker.py)
+
+Run: python -m pytest -q test_face_tracker.py
+"""
+import numpy as np
+
+from face_tracker import FaceTracker, iou_matrix
+
+
+def test_iou_matrix():
+    ious = iou_matrix([(0, 0, 10, 10)], [(0, 0, 10, 10), (5, 0, 10, 10), (20, 20, 5, 5)])
+    assert np.allclose(ious, [[1.0, 50 / 150, 0.0]])
+
+
+def test_moving_face_keeps_its_track():
+    tracker = FaceTracker(iou_threshold=0.3)
+    first = tracker.update([(100, 100, 80, 80)], now=0.0)
+    second = tracker.update([(110, 105, 80, 80)], now=0.1)
+    assert second[0] is first[0]
+    assert second[0].box == (110, 105, 80, 80)
+    assert second[0].hits == 2
+
+
+def test_two_faces_are_not_swapped():
+    tracker = FaceTracker()
+    left, right = tracker.update([(0, 0, 50, 50), (200, 0, 50, 50)], now=0.0)
+    tracks = tracker.update([(205, 0, 50, 50), (5, 0, 50, 50)], now=0.1)
+    assert tracks[0] is right
+    assert tracks[1] is left
+
+
+def test_embedding_is_due_on_creation_and_after_the_refresh_interval():
+    tracker = FaceTracker(refresh_interval=2.0)
+    tracks = tracker.update([(0, 0, 50, 50)], now=0.0)
+    assert tracker.due(tracks, now=0.0) == tracks
+    tracker.mark_embedded(tracks[0], now=0.0)
+
+    tracks = tracker.update([(2, 0, 50, 50)], now=1.0)
+    assert tracker.due(tracks, now=1.0) == []
+    tracks = tracker.update([(4, 0, 50, 50)], now=2.5)
+    assert tracker.due(tracks, now=2.5) == tracks
+    assert tracker.stats()['embeddings'] == 1
+
+
+def test_lost_track_is_dropped_after_max_missed():
+    tracker = FaceTracker(max_missed=2)
+    track = tracker.update([(0, 0, 50, 50)], now=0.0)[0]
+    for i in range(2):
+        tracker.update([], now=0.1 * (i + 1))
+        assert track.id in tracker.active_ids()
+    tracker.update([], now=0.3)
+    assert track.id not in tracker.active_ids()
+
+    new = tracker.update([(0, 0, 50, 50)], now=0.4)[0]
+    assert new.id != track.id
+    assert tracker.due([new], now=0.4) == [new]
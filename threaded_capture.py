@@ -0,0 +1,140 @@
+"""
+Threaded Camera Capture
+Grabs frames on a background thread into a small ring buffer so the Tk loop
+never waits on camera I/O. read() always hands out the newest frame; frames
+that were overwritten (or skipped) before anyone read them count as dropped.
+"""
+import threading
+import time
+from collections import deque
+
+
+class ThreadedCamera:
+    """
+    Drop-in wrapper around an opened cv2.VideoCapture (e.g. from camera_probe.open_best_camera)
+    exposing read() / isOpened() / release() like the capture itself.
+    """
+
+    def __init__(self, cap, buffer_size=2, read_timeout=1.0, pace_fps=None):
+        """
+        Args:
+            cap: Opened cv2.VideoCapture
+            buffer_size: Frames kept in the ring buffer (older ones are dropped)
+            read_timeout: Seconds read() waits for a new frame before giving up (0 = never wait)
+            pace_fps: Cap the capture rate (video files would otherwise decode as fast as possible)
+        """
+        self.cap = cap
+        self.read_timeout = read_timeout
+        self.pace_interval = 1.0 / pace_fps if pace_fps else 0.0
+        self._buffer = deque(maxlen=max(1, buffer_size))  # (seq, timestamp, frame)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Stats
+        self._captured = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._failures = 0
+        self._last_seq = 0           # sequence number of the last frame handed out
+        self._last_age = 0.0         # age (s) of the last frame handed out
+        self._fps = 0.0
+        self._fps_window = deque(maxlen=60)
+
+    def start(self):
+        """Start the capture thread; returns self so it can wrap open_best_camera() inline"""
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="camera-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        next_due = time.time()
+        while self._running:
+            if self.pace_interval:
+                delay = next_due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                next_due = max(next_due + self.pace_interval, time.time() - self.pace_interval)
+            ret, frame = self.cap.read()
+            now = time.time()
+            if not ret or frame is None:
+                self._failures += 1
+                if self._failures > 30:  # camera gone; let read() report it
+                    break
+                time.sleep(0.01)
+                continue
+            self._failures = 0
+
+            with self._cond:
+                self._captured += 1
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._dropped += 1  # oldest unread frame falls off the ring
+                self._buffer.append((self._captured, now, frame))
+                self._fps_window.append(now)
+                if len(self._fps_window) > 1:
+                    span = self._fps_window[-1] - self._fps_window[0]
+                    if span > 0:
+                        self._fps = (len(self._fps_window) - 1) / span
+                self._cond.notify_all()
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def read(self):
+        """
+        Return the newest frame not yet handed out, like VideoCapture.read()
+
+        Returns:
+            Tuple (ret, frame); (False, None) if no new frame arrived in time
+        """
+        deadline = time.time() + self.read_timeout
+        with self._cond:
+            while not self._buffer:
+                remaining = deadline - time.time()
+                if not self._running or remaining <= 0:
+                    return False, None
+                self._cond.wait(remaining)
+
+            seq, stamp, frame = self._buffer[-1]
+            # Everything older in the ring is stale now
+            self._dropped += len(self._buffer) - 1
+            self._buffer.clear()
+            self._last_seq = seq
+            self._last_age = time.time() - stamp
+            self._delivered += 1
+        return True, frame
+
+    def isOpened(self):
+        return self._running and self.cap is not None and self.cap.isOpened()
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def set(self, prop_id, value):
+        return self.cap.set(prop_id, value)
+
+    def stats(self):
+        """Capture fps, dropped frames and age of the last delivered frame"""
+        with self._cond:
+            return {
+                'capture_fps': round(self._fps, 1),
+                'captured': self._captured,
+                'delivered': self._delivered,
+                'dropped': self._dropped,
+                'queue_age_ms': round(self._last_age * 1000.0, 1),
+                'buffered': len(self._buffer),
+            }
+
+    def release(self):
+        """Stop the capture thread and release the camera"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.cap is not None:
+            self.cap.release()